@@ -1,8 +1,25 @@
+import heapq
+import itertools
+
+REMOVED = '<removed-event>'
+
+PRIORITY_FIRST = 0
+PRIORITY_CHRONOLOGICAL = 1
+
+
 class Queue:
+    """
+    Events ordered by execution_date, events with the same execution_date keep the order they were added in.
+    Heap entries are lists: [priority, sort_key, counter, event]. Removed events stay on the heap
+    marked as REMOVED and are skipped when they reach the top.
+    """
 
     def __init__(self):
-        self.events_list = []
+        self.events_heap = []
+        self.events_by_id = {}
         self.events_list_added_order = []
+        self.counter = itertools.count()
+        self.length = 0
 
     def add(self, event, first=False):
         if first:
@@ -16,53 +33,73 @@ class Queue:
             self.add(event)
 
     def get(self):
-        return self.events_list[0] if self.events_list else None
+        self.remove_removed_from_top()
+        return self.events_heap[0][-1] if self.events_heap else None
 
     def pop(self):
-        if self.events_list:
-            last = self.events_list[0]
-            del(self.events_list[0])
-            return last
+        self.remove_removed_from_top()
+        if self.events_heap:
+            entry = heapq.heappop(self.events_heap)
+            event = entry[-1]
+            self.remove_entry_from_index(event.event_id, entry)
+            self.length -= 1
+            return event
         else:
             return None
 
     def append_as_first(self, event):
-        self.events_list.insert(0, event)
+        """ event is placed before all events that are currently in queue """
+        count = next(self.counter)
+        self.push_entry([PRIORITY_FIRST, -count, count, event])
 
     def append_chronologically(self, event):
-        if not self.events_list:  # queue empty, add first item
-            self.events_list.append(event)
-        else:
-            for order, existing_event in enumerate(self.events_list):
-                if event.execution_date > self.events_list[-1].execution_date:
-                    self.events_list.append(event)
-                    break
-                if event.execution_date < existing_event.execution_date:
-                    self.events_list.insert(order, event)
-                    break
+        count = next(self.counter)
+        self.push_entry([PRIORITY_CHRONOLOGICAL, event.execution_date, count, event])
+
+    def push_entry(self, entry):
+        heapq.heappush(self.events_heap, entry)
+        self.events_by_id.setdefault(entry[-1].event_id, []).append(entry)
+        self.length += 1
+
+    def remove_removed_from_top(self):
+        while self.events_heap and self.events_heap[0][-1] is REMOVED:
+            heapq.heappop(self.events_heap)
+
+    def remove_entry_from_index(self, event_id, entry):
+        entries = self.events_by_id.get(event_id)
+        if entries is None:
+            return
+        entries.remove(entry)
+        if not entries:
+            del self.events_by_id[event_id]
 
     def append_added_order(self, event):
         self.events_list_added_order.append(event)
 
     def __len__(self):
-        return len(self.events_list)
+        return self.length
 
     def get_length(self):
-        return len(self.events_list)
+        return self.length
+
+    def get_events_ordered(self):
+        return [entry[-1] for entry in sorted(self.events_heap) if entry[-1] is not REMOVED]
 
     def is_event_in_queue(self, event):
-        return event in self.events_list
+        return any(entry[-1] is event for entry in self.events_by_id.get(event.event_id, []))
 
     def get_index_order_of_event(self, event):
         try:
-            return self.events_list.index(event)
+            return self.get_events_ordered().index(event)
         except ValueError:
             return -1
 
     def remove_event_by_id(self, id):
-        for event in self.events_list:
-            if event.event_id == id:
-                try:
-                    return self.events_list.remove(event)
-                except (ValueError, TypeError):
-                    raise
\ No newline at end of file
+        """ removes the earliest queued event with given id """
+        entries = self.events_by_id.get(id)
+        if not entries:
+            return None
+        entry = min(entries)
+        self.remove_entry_from_index(id, entry)
+        entry[-1] = REMOVED
+        self.length -= 1
@@ -7,14 +7,18 @@ from typing import Union
 
 from app.backtest.events import EventSignal, EventTakeProfit, EventStopLoss
 from app.exceptions.backtest import InsufficientFundsException
-from app.exceptions.process import IncorrectDecisionSignalTradeLevels
+from app.exceptions.process import IncorrectDecisionSignalTradeLevels, DecisionSignalPairNotFound
 from app.models import choices
 from app.models.choices import MessageFillTypeChoices
 from app.models.messages import Message
 from app.models.backtest import Backtest as BacktestModel
+from app.processing.process_signal import MAPPING_PROCESS_SIGNAL
 from app.processing.recognise import RecogniseMessageManager
 from app.backtest import events, config
 from app.backtest._queue import Queue
+from app.backtest.ledger import TransactionLedger, TransactionLedgerInMemory
+from app.backtest.position_close_detector import PositionCloseDetector, price_window_cache
+from app.backtest.resolved_signals import signal_resolver
 from app.backtest.wallet import Wallet
 from app.backtest.strategies import StrategyTakeProfit
 
@@ -51,6 +55,9 @@ class BacktestTimeline:
                 except IncorrectDecisionSignalTradeLevels:
                     logging.exception(f"Error occured while executing event={event.__repr__()}")
         self.backtest.statistics.executed_events_amount = self.events_executed_count
+        self.backtest.ledger.flush()
+        price_window_cache.log_stats()
+        signal_resolver.log_stats()
 
     def is_timeline_condition_met(self, event):
         return self.is_event_instance_signal_type(event)
@@ -70,7 +77,7 @@ class Backtest:
                  config: "BacktestConfig",
                  messages_filler: Union["BacktestMessagesFillerObjects", "BacktestMessagesFillerRawMessages"],
                  ):
-        self.messages_filler = messages_filler,
+        self.messages_filler = messages_filler
         messages_filler.backtest = self
         self.config = config
 
@@ -80,16 +87,48 @@ class Backtest:
     def fill_messages(self):
         self.messages_filler.add_messages()
 
+    def preload_prices(self):
+        """
+        loads prices of all pairs used by queued signals at once, call after fill_messages.
+        Signals already resolved by previous backtests don't need prices.
+        """
+        signal_resolver.preload(self.get_signals_messages())
+        PositionCloseDetector.preload_price_windows(
+            self.get_signals_pairs(), self.config.date_from, self.config.date_to
+        )
+
+    def get_signals_events(self):
+        return [event for event in self.queue.events_list_added_order if isinstance(event, EventSignal)]
+
+    def get_signals_messages(self):
+        return [event.message for event in self.get_signals_events()]
+
+    def get_signals_pairs(self):
+        pairs = set()
+        for event in self.get_signals_events():
+            if signal_resolver.is_resolved(event.message):
+                continue
+            processor = MAPPING_PROCESS_SIGNAL.get(event.message.channel.name)
+            if processor is None:
+                continue
+            try:
+                pairs.add(processor.get_pair(event.message))
+            except DecisionSignalPairNotFound:
+                continue
+        return sorted(pairs)
+
     def create_backtest_related_instances(self):
         self.create_backtest_related_instance_wallet()
         self.create_backtest_related_instance_queue()
         self.create_backtest_related_instance_timeline()
         self.create_backtest_related_instance_statistics()
+        self.create_backtest_related_instance_ledger()
 
     def create_backtest_related_instance_wallet(self):
         self.wallet = Wallet(
             initial_amount=self.config.wallet_initial_amount,
-            currency="USD"
+            currency="USD",
+            backtest=self
         )
 
     def create_backtest_related_instance_timeline(self):
@@ -103,6 +142,12 @@ class Backtest:
             initial_amount=self.config.wallet_initial_amount
         )
 
+    def create_backtest_related_instance_ledger(self):
+        if self.config.transactions_in_memory:
+            self.ledger = TransactionLedgerInMemory()
+        else:
+            self.ledger = TransactionLedger()
+
     def save_event(self, event):
         pass
 
@@ -128,7 +173,8 @@ class BacktestConfig:
                  strategy_label=StrategyTakeProfit.PRESET_GREEDY_LOW_LABEL,
                  amount_single_transaction=config.AMOUNT_SINGLE_TRANSACTION ,
                  max_days_in_position=config.TRANSACTION_DURATION,
-                 wallet_initial_amount=config.WALLET_INITIAL_AMOUNT):
+                 wallet_initial_amount=config.WALLET_INITIAL_AMOUNT,
+                 transactions_in_memory=config.TRANSACTIONS_IN_MEMORY):
         self.channel = channel
         self.tag = tag
         self.wallet_initial_amount = wallet_initial_amount
@@ -138,6 +184,7 @@ class BacktestConfig:
         self.strategy_label = strategy_label
         self.amount_single_transaction = amount_single_transaction
         self.max_days_in_position = max_days_in_position
+        self.transactions_in_memory = transactions_in_memory
 
     def get_config_as_json(self):
         return {
@@ -150,6 +197,7 @@ class BacktestConfig:
             "amount_single_transaction": self.amount_single_transaction,
             "max_days_in_position": self.max_days_in_position,
             "wallet_initial_amount": self.wallet_initial_amount,
+            "transactions_in_memory": self.transactions_in_memory,
         }
 
 class BacktestStatistics:
@@ -225,7 +273,7 @@ class BacktestMessagesFiller:
     filler_type = None
 
     def __init__(self, messages, backtest=None, type=None):
-        self.messages = messages,
+        self.messages = messages
         self.backtest = backtest
         self.type = type
 
@@ -242,25 +290,31 @@ class BacktestMessagesFillerObjects(BacktestMessagesFiller):
     filler_type = MessageFillTypeChoices.OBJECTS
 
     def add_messages(self):
-        self.backtest.add_messages_objects_signal_to_queue(
+        self.add_messages_to_queue(
             self.messages, date_from=date_from, date_to=date_to
         )
 
     def add_messages_to_queue(self, messages_objects, date_from=None, date_to=None):
+        messages_by_id_universal = Message.get_latest_by_id_universal(
+            message['id_universal'] for message in messages_objects
+        )
 
         for message in messages_objects:
 
-            if self.is_message_between_date(date_from=date_from, date_to=date_to):
+            if self.is_message_between_date(message, date_from=date_from, date_to=date_to):
                 continue
 
-            message_obj = Message.objects.filter(
-                id_universal=message['id_universal']
-            ).order_by('-created_at').first()
+            message_obj = messages_by_id_universal.get(message['id_universal'])
+            if message_obj is None:
+                logging.error(f"Message(id_universal={message['id_universal']}) not found")
+                continue
 
-            if message.is_message_type_signal():
+            if message_obj.is_message_type_signal():
                 self.backtest.statistics.increment_messages_recognised_as_signal()
 
-            message_event = events.EventMessageReceived(message_obj, self, tag=self.backtest.tag).event
+            message_event = events.EventMessageReceived(
+                message_obj, self.backtest, tag=self.backtest.config.tag
+            ).event
             if message_event == None:
                 continue
 
@@ -283,13 +337,13 @@ class BacktestMessagesFillerRawMessages(BacktestMessagesFiller):
             if self.is_message_between_date(message_json, date_from=date_from, date_to=date_to):
                 continue
 
-            message = RecogniseMessageManager.get_recognised_message_obj(message_json)
-            message.status = choices.MessageStatusChoices.RECOGNIZED
-            message.save()
+            message = RecogniseMessageManager.get_recognised_message_obj_cached(message_json)
             if message.type == choices.MessageTypeChoices.UNDEFINED:
                 continue
 
-            message_event = events.EventMessageReceived(message, self, tag=self.backtest.tag).event
+            message_event = events.EventMessageReceived(
+                message, self.backtest, tag=self.backtest.config.tag
+            ).event
             if message_event == None:
                 continue
 
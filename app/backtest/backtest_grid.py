@@ -0,0 +1,143 @@
+import itertools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from app.backtest import config
+from app.backtest.backtest import Backtest, BacktestConfig, BACKTEST_MESSAGES_FILLER_TYPE_MAPPER
+from app.backtest.reports.reports_fetcher import ReportFetcher
+from app.backtest.strategies import StrategyTakeProfit
+from app.backtest.resolved_signals import signal_resolver
+from app.backtest.workers import init_worker
+from app.models.choices import MessageFillTypeChoices
+from app.processing.cache import process_cache
+
+logger = logging.getLogger(__name__)
+
+REPORT_NAME_PROCESSED_TEMPLATE = 'processed_{channel}'
+
+
+class BacktestGrid:
+    """
+    Runs Backtest for every combination of channels, tags, strategy presets,
+    max_days_in_position and amount_single_transaction.
+    Each combination runs in its own worker process, so Wallet, Queue, BacktestStatistics
+    and price caches of one run never see other runs.
+    Processed messages of each channel are fetched once in main process and sent to workers.
+    """
+
+    def __init__(self,
+                 channels,
+                 tags=(None,),
+                 strategy_labels=tuple(StrategyTakeProfit.mapping),
+                 max_days_in_position=(config.TRANSACTION_DURATION,),
+                 amounts_single_transaction=(config.AMOUNT_SINGLE_TRANSACTION,),
+                 wallet_initial_amount=config.WALLET_INITIAL_AMOUNT,
+                 report_name_template=REPORT_NAME_PROCESSED_TEMPLATE,
+                 workers=config.BACKTEST_GRID_WORKERS,
+                 save_to_database=True):
+        self.channels = channels
+        self.tags = tags
+        self.strategy_labels = strategy_labels
+        self.max_days_in_position = max_days_in_position
+        self.amounts_single_transaction = amounts_single_transaction
+        self.wallet_initial_amount = wallet_initial_amount
+        self.report_name_template = report_name_template
+        self.workers = workers
+        self.save_to_database = save_to_database
+
+    def get_grid(self):
+        grid = []
+        for channel, tag, strategy_label, max_days, amount in itertools.product(
+                self.channels, self.tags, self.strategy_labels,
+                self.max_days_in_position, self.amounts_single_transaction):
+            grid.append({
+                'channel': channel,
+                'tag': tag if tag is not None else f'{channel}_{strategy_label}_{max_days}_{amount}',
+                'strategy_label': strategy_label,
+                'max_days_in_position': max_days,
+                'amount_single_transaction': amount,
+                'wallet_initial_amount': self.wallet_initial_amount,
+                'save_to_database': self.save_to_database,
+            })
+        return grid
+
+    def get_messages_by_channel(self):
+        report_fetcher = ReportFetcher()
+        return {
+            channel: report_fetcher.get_prebacktest_processed_success(
+                self.report_name_template.format(channel=channel)
+            )
+            for channel in self.channels
+        }
+
+    def run(self):
+        """ :return: DataFrame with one row per grid item, config columns and BacktestStatistics.as_json() """
+        messages_by_channel = self.get_messages_by_channel()
+        grid_items = [
+            dict(grid_item, messages=messages_by_channel[grid_item['channel']])
+            for grid_item in self.get_grid()
+        ]
+        logger.info(f'Running {len(grid_items)} backtests with workers={self.workers}')
+
+        if self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     initializer=init_worker) as executor:
+                results = list(executor.map(run_backtest_grid_item, grid_items))
+        else:
+            results = [run_backtest_grid_item(grid_item) for grid_item in grid_items]
+
+        return self.get_results_table(results)
+
+    @staticmethod
+    def get_results_table(results):
+        rows = []
+        for result in results:
+            row = {key: value for key, value in result.items() if key != 'statistics'}
+            row.update(result['statistics'] or {})
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def run_backtest_grid_item(grid_item):
+    """
+    Runs single Backtest of grid. Errors are returned in result so one broken run doesn't stop others.
+    """
+    time_start = time.time()
+    result = {key: value for key, value in grid_item.items() if key not in ('messages', 'save_to_database')}
+    result.update({'statistics': None, 'error': None})
+    try:
+        messages_filler = BACKTEST_MESSAGES_FILLER_TYPE_MAPPER[MessageFillTypeChoices.OBJECTS](
+            grid_item['messages']
+        )
+        backtest = Backtest(
+            messages_filler=messages_filler,
+            config=BacktestConfig(
+                channel=grid_item['channel'],
+                tag=grid_item['tag'],
+                strategy=StrategyTakeProfit.mapping[grid_item['strategy_label']],
+                strategy_label=grid_item['strategy_label'],
+                amount_single_transaction=grid_item['amount_single_transaction'],
+                max_days_in_position=grid_item['max_days_in_position'],
+                wallet_initial_amount=grid_item['wallet_initial_amount'],
+            )
+        )
+        backtest.create_backtest_related_instances()
+        backtest.fill_messages()
+        backtest.preload_prices()
+        backtest.run_analysing()
+        if grid_item['save_to_database']:
+            backtest.save_backtest_to_database()
+        result['profit_result'] = backtest.wallet.amount - backtest.wallet.initial_amount
+        result['statistics'] = backtest.statistics.as_json()
+    except Exception as e:
+        logger.exception(f"Error occurred while running backtest of grid item tag={grid_item['tag']}")
+        result['error'] = str(e)
+    finally:
+        signal_resolver.clear()  # decisions are modified by transactions of this backtest
+        process_cache.clear()
+
+    result['seconds'] = time.time() - time_start
+    return result
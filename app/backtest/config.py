@@ -4,6 +4,22 @@ TRANSACTION_DURATION = 5*DAY
 FETCH_DATES_UNTIL_AMOUNT_DAYS = 10*DAY
 AMOUNT_TO_INVEST_SINGLE_TRANSACTION = 100
 POSITION_DETECTOR_MAX_RETRIES = 1000
+POSITION_DETECTOR_VECTORIZED = True
+POSITION_DETECTOR_SINGLE_SWEEP = False  # stop detection at stop loss, later take profits are NOT_FOUND
+POSITION_DETECTOR_SWEEP_BLOCK_SIZE = 1440  # rows checked at once by single sweep (one day of minute bars)
+PRICE_WINDOW_BATCH_SIZE = 15000  # ~10 days of minute bars fetched in one batch
+PRICE_WINDOW_CACHE_MAX_BYTES = 256 * 1024 * 1024
+PRICE_WINDOW_CACHE_EXTEND_DAYS = 10*DAY  # fetched window is longer so next signals of pair can reuse it
+PRICE_STORE_ENABLED = False  # read prices from app.backtest.price_store instead of HistoricRow
+EXTREMES_INDEX_ENABLED = True  # use app.backtest.extremes_index for crossing queries when it is available
+EXTREMES_INDEX_BLOCK_SIZE = 64
 
 WALLET_INITIAL_AMOUNT = 10000
-AMOUNT_SINGLE_TRANSACTION = 100
\ No newline at end of file
+AMOUNT_SINGLE_TRANSACTION = 100
+TRANSACTIONS_IN_MEMORY = False  # keep transactions in memory during backtest and save them at the end
+BACKTEST_GRID_WORKERS = 4  # processes used by app.backtest.backtest_grid
+RESOLVED_SIGNALS_ENABLED = False  # reuse crossing dates and initial price saved as ResolvedSignal by previous runs
+PROCESSING_CACHE_ENABLED = False  # reuse recognised messages and decisions of unchanged messages, see app.processing.cache
+RECOGNISE_IN_MEMORY = False  # recognise raw messages without queries and save them with bulk insert, see RecognitionContext
+PREBACKTEST_WORKERS = 1  # processes recognising and processing messages of PreBacktest, 1 - without process pool
+PREBACKTEST_CHUNK_SIZE = 500  # messages sent to PreBacktest worker at once
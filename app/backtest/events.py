@@ -11,11 +11,8 @@ from app.models.choices import (
 )
 from app.models.positions import StopLoss, get_ratio_for_realized_position
 from app.models.transactions import Transaction
-from app.processing.process_signal import ProcessSignalManager
-from app.backtest.position_close_detector import (
-    PositionCloseDetector,
-    get_initial_price_of_nearest_historic_row_date_for_pair
-)
+from app.backtest.position_close_detector import PositionCloseDetector
+from app.backtest.resolved_signals import signal_resolver
 
 
 logger = logging.getLogger(__file__)
@@ -57,9 +54,9 @@ class EventCancel(Event):
             tp.result = tp.amount_invested
             tp.has_reached_level_before_days_limit = False
             self.backtest.wallet.on_transaction_refund_back(tp.result)
-            self.backtest.queue.remove_event_by_id(tp.generate_take_profit_id)
+            self.backtest.queue.remove_event_by_id(tp.generate_take_profit_id())
 
-        self.transaction.save()
+        self.backtest.ledger.save(self.transaction)
 
 
 # TRANSACTION
@@ -75,7 +72,7 @@ class EventTakeProfit(Event):
 
     def execute(self):
         self.backtest.statistics.on_position_event_realised(PositionTypeChoices.TAKE_PROFIT)
-        transaction = Transaction.objects.get(pk=self.take_profit.transaction_id)
+        transaction = self.backtest.ledger.get(self.take_profit.transaction_id)
         take_profit = transaction.take_profits[self.take_profit.order_number-1]
         take_profit.closed_date = self.execution_date
 
@@ -87,7 +84,7 @@ class EventTakeProfit(Event):
                         f'Stop loss will not be executed.')
             take_profit.has_reached_level_before_days_limit = True
             take_profit.is_transaction_already_closed = True
-            transaction.save()
+            self.backtest.ledger.save(transaction)
             return
 
         logging.info('Take profit realised :) !')
@@ -114,7 +111,7 @@ class EventTakeProfit(Event):
             self.backtest.queue.remove_event_by_id(transaction.get_event_id_cancel())
 
         self.backtest.statistics.on_event_realised(self, self.backtest.wallet)
-        transaction.save()
+        self.backtest.ledger.save(transaction)
         return
 
     def __repr__(self):
@@ -134,7 +131,7 @@ class EventStopLoss(Event):
 
     def execute(self):
         self.backtest.statistics.on_position_event_realised(PositionTypeChoices.STOP_LOSS)
-        transaction = Transaction.objects.get(pk=self.stop_loss.transaction_id)
+        transaction = self.backtest.ledger.get(self.stop_loss.transaction_id)
         stop_loss = transaction.stop_loss
         stop_loss.closed_date = self.execution_date
         stop_loss.has_reached_level_before_days_limit = True
@@ -146,7 +143,7 @@ class EventStopLoss(Event):
             logger.info(f'Transaction(pk={transaction.pk} has been already closed. '
                         f'Stop loss will not be executed.')
             stop_loss.is_transaction_already_closed = True
-            transaction.save()
+            self.backtest.ledger.save(transaction)
             return
 
         logging.info('Stop loss realised :( !')
@@ -173,7 +170,7 @@ class EventStopLoss(Event):
         self.backtest.queue.remove_event_by_id(transaction.get_event_id_cancel())
 
         self.backtest.statistics.on_event_realised(self, self.backtest.wallet)
-        transaction.save()
+        self.backtest.ledger.save(transaction)
 
     def __repr__(self):
         return f"EventStopLoss of transaction.id={self.stop_loss.transaction_id}"
@@ -216,12 +213,13 @@ class EventSignal(Event):
 
     def execute(self):
         logger.info(f'Executing EventSignal for message(id_universal={self.message.id_universal}')
-        decision_signal = ProcessSignalManager.get_decision_signal(self.message)
+        resolved_signal = signal_resolver.get(self.message)
+        decision_signal = resolved_signal.decision
 
-        position_close_date_take_profits, position_close_date_stop_loss = \
-            PositionCloseDetector.detect(decision_signal)
+        position_close_date_take_profits = resolved_signal.get_take_profits_closed_dates()
+        position_close_date_stop_loss = resolved_signal.stop_loss_closed_date
 
-        transaction = Transaction(
+        transaction = self.backtest.ledger.add(Transaction(
             tag=self.tag,
             channel=self.message.channel.name,
             decision=decision_signal,
@@ -229,7 +227,7 @@ class EventSignal(Event):
             pair=decision_signal.pair,
             date_open=decision_signal.date,
             strategy_label=self.backtest.config.strategy_label
-        ).save()
+        ))
 
         try:
             assigned_amount = self.backtest.wallet.on_transaction_open()
@@ -237,19 +235,15 @@ class EventSignal(Event):
         except InsufficientFundsException:
             logger.error('Insufficient funds')
             transaction.status = TransactionStatusChoices.INSUFFICIENT_FUNDS
-            transaction.save()
+            self.backtest.ledger.save(transaction)
             return
 
-        if decision_signal.initial_price is not None:
-            initial_price = decision_signal.initial_price
-            retries = None
-        else:
-            initial_price, retries = get_initial_price_of_nearest_historic_row_date_for_pair(
-                pair=decision_signal.pair, date=decision_signal.date
-            )
+        initial_price = resolved_signal.initial_price
+        retries = resolved_signal.initial_price_retries
 
         if initial_price is None:
             transaction.on_initial_price_not_found()
+            self.backtest.ledger.save(transaction)
             self.backtest.wallet.on_transaction_refund_back(transaction.amount_invested)
             self.backtest.statistics.increment_transaction_initial_pair_not_found()
             return
@@ -309,7 +303,7 @@ class EventSignal(Event):
 
         self.backtest.queue.add(event_cancel)
         self.backtest.statistics.on_event_realised(self, self.backtest.wallet)
-        transaction.save()
+        self.backtest.ledger.save(transaction)
 
     def is_stop_loss_reached(self, position_close_date_stop_loss):
         return position_close_date_stop_loss not in [PositionCloseDetector.NOT_FOUND, None]
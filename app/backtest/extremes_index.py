@@ -0,0 +1,91 @@
+import numpy as np
+
+EXTREMES_INDEX_FILE_SUFFIX = '.extremes.npz'
+
+
+class ExtremesIndex:
+    """
+    Answers "first bar in [start, end) with high above / low below price" without scanning all bars.
+
+    Bars are grouped in blocks of block_size. Sparse tables keep max high and min low of
+    2**level consecutive blocks (level 0 - single block), so the first block that can contain
+    the crossing is found with binary lifting in O(log n) and only that block is scanned.
+    Bars after the last full block are scanned directly.
+    """
+
+    def __init__(self, highs, lows, block_size, high_table, low_table):
+        self.highs = highs
+        self.lows = lows
+        self.block_size = block_size
+        self.high_table = high_table
+        self.low_table = low_table
+        self.blocks = high_table.shape[1]
+
+    @classmethod
+    def build(cls, highs, lows, block_size=64):
+        blocks = len(highs) // block_size
+        indexed = blocks * block_size
+        block_max_high = np.asarray(highs[:indexed], dtype=np.float64).reshape(blocks, block_size).max(axis=1)
+        block_min_low = np.asarray(lows[:indexed], dtype=np.float64).reshape(blocks, block_size).min(axis=1)
+        return cls(
+            highs, lows, block_size,
+            high_table=cls.build_sparse_table(block_max_high, np.maximum, -np.inf),
+            low_table=cls.build_sparse_table(block_min_low, np.minimum, np.inf)
+        )
+
+    @staticmethod
+    def build_sparse_table(values, function, padding):
+        """ table[level, i] = function of values[i:i + 2**level], cells exceeding values are padding """
+        length = len(values)
+        levels = int(np.log2(length)) + 1 if length else 1
+        table = np.full((levels, length), padding, dtype=np.float64)
+        table[0] = values
+        for level in range(1, levels):
+            span = 1 << (level - 1)
+            valid = length - 2 * span + 1
+            table[level, :valid] = function(table[level - 1, :valid], table[level - 1, span:span + valid])
+        return table
+
+    def save(self, path):
+        np.savez(path, block_size=self.block_size, high_table=self.high_table, low_table=self.low_table)
+
+    @classmethod
+    def load(cls, path, highs, lows):
+        with np.load(path) as data:
+            return cls(highs, lows, int(data['block_size']), data['high_table'], data['low_table'])
+
+    def get_first_index_above(self, price, start, end):
+        """ first index in [start, end) with high > price, -1 if there isn't any """
+        return self.get_first_index(self.highs, self.high_table, np.greater, price, start, end)
+
+    def get_first_index_below(self, price, start, end):
+        """ first index in [start, end) with low < price, -1 if there isn't any """
+        return self.get_first_index(self.lows, self.low_table, np.less, price, start, end)
+
+    def get_first_index(self, values, table, is_crossed, price, start, end):
+        first_full_block = -(-start // self.block_size)
+        end_full_block = min(end // self.block_size, self.blocks)
+        if first_full_block >= end_full_block:
+            return self.scan(values, is_crossed, price, start, end)
+
+        index = self.scan(values, is_crossed, price, start, first_full_block * self.block_size)
+        if index >= 0:
+            return index
+
+        block = first_full_block
+        for level in reversed(range(table.shape[0])):
+            if block + (1 << level) <= end_full_block and not is_crossed(table[level, block], price):
+                block += 1 << level
+
+        if block < end_full_block:
+            return self.scan(values, is_crossed, price,
+                             block * self.block_size, (block + 1) * self.block_size)
+        return self.scan(values, is_crossed, price, end_full_block * self.block_size, end)
+
+    @staticmethod
+    def scan(values, is_crossed, price, start, end):
+        if start >= end:
+            return -1
+        crossed = is_crossed(values[start:end], price)
+        index = int(crossed.argmax())
+        return start + index if crossed[index] else -1
@@ -0,0 +1,59 @@
+import logging
+from collections import OrderedDict
+
+from bson import ObjectId
+
+from app.models.transactions import Transaction
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionLedger:
+    """ Every change of transaction is saved to database immediately. """
+
+    def add(self, transaction):
+        return transaction.save()
+
+    def get(self, transaction_id):
+        return Transaction.objects.get(pk=transaction_id)
+
+    def save(self, transaction):
+        transaction.save()
+
+    def flush(self):
+        pass
+
+
+class TransactionLedgerInMemory(TransactionLedger):
+    """
+    Transactions are kept in memory by id while backtest timeline is running
+    and written to database with single insert_many on flush.
+    """
+
+    def __init__(self):
+        self.transactions = OrderedDict()
+
+    def add(self, transaction):
+        transaction.id = ObjectId()
+        self.transactions[str(transaction.id)] = transaction
+        return transaction
+
+    def get(self, transaction_id):
+        return self.transactions[str(transaction_id)]
+
+    def save(self, transaction):
+        """ transaction object is modified in place so there is nothing to do until flush """
+        pass
+
+    def flush(self):
+        if not self.transactions:
+            return
+
+        documents = []
+        for transaction in self.transactions.values():
+            transaction.validate()
+            documents.append(transaction.to_mongo())
+
+        Transaction._get_collection().insert_many(documents)
+        logger.info(f'Saved {len(documents)} transactions to database')
+        self.transactions.clear()
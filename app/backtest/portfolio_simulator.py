@@ -0,0 +1,335 @@
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+from app.backtest import config
+from app.backtest.position_close_detector import PositionCloseDetector
+from app.backtest.resolved_signals import signal_resolver
+from app.backtest.strategies import StrategyTakeProfit
+from app.exceptions.process import IncorrectDecisionSignalTradeLevels
+from app.models.choices import DecisionSignalTypeChoices, PositionTypeChoices, TransactionClosedByChoices
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND_DATE = np.datetime64('NaT', 'us')
+NEVER = np.iinfo(np.int64).max
+
+GROUP_SIGNAL = 0
+GROUP_POSITION = 1  # take profit and stop loss events are queued after all signals
+
+
+def get_events_table(resolved_signals):
+    """
+    One row per signal: date, type, initial price, stop loss and every take profit of decision
+    (tp{number}_order_number, tp{number}_price, tp{number}_date) with NaT when level wasn't crossed.
+    """
+    rows = []
+    for resolved_signal in resolved_signals:
+        decision = resolved_signal.decision
+        stop_loss = decision.stop_loss or {}
+        row = {
+            'id_universal': resolved_signal.id_universal,
+            'date': decision.date,
+            'type': decision.type,
+            'initial_price': resolved_signal.initial_price,
+            'take_profits_amount': len(decision.take_profits),
+            'stop_loss_price': get_price(stop_loss.get('price')),
+            'stop_loss_date': get_closed_date(resolved_signal.stop_loss_closed_date),
+        }
+        closed_dates = list(resolved_signal.get_take_profits_closed_dates().values())
+        for number, (take_profit, closed_date) in enumerate(zip(decision.take_profits, closed_dates), 1):
+            row[f'tp{number}_order_number'] = take_profit['order_number']
+            row[f'tp{number}_price'] = get_price(take_profit['price'])
+            row[f'tp{number}_date'] = get_closed_date(closed_date)
+        rows.append(row)
+
+    events_table = pd.DataFrame(rows)
+    for column in events_table.columns:
+        if column == 'date' or column.endswith('_date'):
+            events_table[column] = pd.to_datetime(events_table[column])
+    return events_table
+
+
+def get_price(price):
+    return float(price) if price is not None else math.nan
+
+
+def get_closed_date(closed_date):
+    return None if closed_date in (PositionCloseDetector.NOT_FOUND, None) else closed_date
+
+
+class PortfolioSimulator:
+    """
+    Computes wallet of backtest from events table instead of running BacktestTimeline.
+    Crossing dates are already known, so result of strategy is arithmetic over take profit weights,
+    ratios of realised positions and cash flows ordered like BacktestTimeline queue orders events:
+    by date, signals before position events and position events by order of their signals.
+    BacktestTimeline doesn't execute EventCancel, so max_days_in_position doesn't change result
+    and transaction which is never closed keeps its not realised amount out of wallet.
+    All transactions are computed together on numpy arrays, only insufficient funds
+    (which depend on wallet state) are resolved in one pass over flows ordered by execution.
+    """
+
+    def __init__(self, events_table,
+                 amount_single_transaction=config.AMOUNT_SINGLE_TRANSACTION,
+                 wallet_initial_amount=config.WALLET_INITIAL_AMOUNT):
+        self.events_table = events_table
+        self.amount = amount_single_transaction
+        self.wallet_initial_amount = wallet_initial_amount
+        self.load_arrays()
+
+    def load_arrays(self):
+        table = self.events_table
+        self.signals = len(table)
+        self.take_profits = int(table['take_profits_amount'].max()) if self.signals else 0
+        # order of events of one transaction with the same date: take profits, stop loss
+        self.seq_stop_loss = self.take_profits
+
+        self.dates = self.get_dates_column('date')
+        # position in which signals are executed, their position events are queued in the same order
+        self.signals_order = np.empty(self.signals, dtype=int)
+        self.signals_order[np.lexsort((np.arange(self.signals), self.dates))] = np.arange(self.signals)
+        self.initial_prices = table['initial_price'].astype(float).values
+        self.has_initial_price = ~np.isnan(self.initial_prices)
+        self.take_profits_amount = table['take_profits_amount'].values.astype(int)
+
+        self.tp_order_numbers = np.zeros((self.signals, self.take_profits), dtype=int)
+        self.tp_prices = np.full((self.signals, self.take_profits), np.nan)
+        self.tp_dates = np.full((self.signals, self.take_profits), NOT_FOUND_DATE)
+        for column in range(self.take_profits):
+            number = column + 1
+            if f'tp{number}_order_number' not in table:
+                continue
+            self.tp_order_numbers[:, column] = table[f'tp{number}_order_number'].fillna(0).astype(int).values
+            self.tp_prices[:, column] = table[f'tp{number}_price'].astype(float).values
+            self.tp_dates[:, column] = self.get_dates_column(f'tp{number}_date')
+
+        self.sl_prices = table['stop_loss_price'].astype(float).values
+        self.sl_dates = self.get_dates_column('stop_loss_date')
+
+        is_long = (table['type'] == DecisionSignalTypeChoices.LONG).values[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.tp_ratios = np.where(is_long, self.tp_prices / self.initial_prices[:, None],
+                                      self.initial_prices[:, None] / self.tp_prices)
+            self.sl_ratios = np.where(is_long[:, 0], self.sl_prices / self.initial_prices,
+                                      self.initial_prices / self.sl_prices)
+
+        self.tp_keys = self.get_keys(self.tp_dates, np.arange(self.take_profits))
+        self.sl_keys = self.get_keys(self.sl_dates, self.seq_stop_loss)
+
+    def get_dates_column(self, column):
+        if column not in self.events_table:
+            return np.full(self.signals, NOT_FOUND_DATE)
+        return self.events_table[column].values.astype('datetime64[us]')
+
+    def get_keys(self, dates, seq):
+        """ comparable keys of events of one transaction, NEVER when event doesn't happen """
+        keys = dates.astype(np.int64) * (self.take_profits + 1) + seq
+        return np.where(np.isnat(dates), NEVER, keys)
+
+    def get_weights(self, strategy):
+        """ amount part of every take profit assigned by strategy like Transaction.assign_take_profits_from_strategy """
+        weights = np.zeros((self.signals, self.take_profits))
+        for take_profits_amount in np.unique(self.take_profits_amount):
+            distribution = strategy.get(int(take_profits_amount))
+            if distribution is None:
+                raise ValueError(f'Strategy has no distribution for {take_profits_amount} take profits')
+            rows = self.take_profits_amount == take_profits_amount
+            for column in range(take_profits_amount):
+                default = 1 if take_profits_amount == 1 else 0
+                weights[rows, column] = [distribution.get(order_number, default)
+                                         for order_number in self.tp_order_numbers[rows, column]]
+        return weights
+
+    def simulate_presets(self, strategies=StrategyTakeProfit.mapping):
+        """ :return: DataFrame with one row per strategy label and results by label """
+        results = {label: self.simulate(strategy) for label, strategy in strategies.items()}
+        summary = pd.DataFrame([
+            {
+                'strategy_label': label,
+                'wallet_state_final': result['wallet_state_final'],
+                'profit_result': result['wallet_state_final'] - self.wallet_initial_amount,
+                **{f'closed_by_{key}': value for key, value in result['closed_by_type__ratio'].items()},
+                **{f'realised_{key}': value for key, value in result['position_event_realised__ratio'].items()},
+            }
+            for label, result in results.items()
+        ])
+        return summary, results
+
+    def simulate(self, strategy):
+        weights = self.get_weights(strategy)
+        positions = self.get_positions(weights)
+        flows = self.get_flows(positions, np.ones(self.signals, dtype=bool))
+
+        opened = self.get_opened(flows)
+        flows = flows[opened[flows['signal'].values]].reset_index(drop=True)
+        flows['wallet_state'] = self.get_wallet_states(flows['amount'].values)
+        return self.get_result(positions, flows, opened)
+
+    def get_positions(self, weights):
+        amount = self.amount
+        weighted = weights != 0
+        tp_found = weighted & (self.tp_keys != NEVER)
+        sl_found = self.sl_keys != NEVER
+        nothing_found = ~tp_found.any(axis=1) & ~sl_found
+
+        # last take profit with amount assigned closes transaction
+        rows = np.arange(self.signals)
+        last_column = self.take_profits - 1 - np.argmax(weighted[:, ::-1], axis=1)
+        last_keys = np.where(tp_found[rows, last_column], self.tp_keys[rows, last_column], NEVER)
+
+        close_keys = np.minimum(last_keys, self.sl_keys)
+        closed = close_keys != NEVER
+        closed_by_tp = closed & (last_keys < self.sl_keys)
+        closed_by_sl = closed & ~closed_by_tp
+
+        # events of closed transaction are still executed, but they don't change wallet
+        tp_paid = tp_found & (self.tp_keys <= close_keys[:, None])
+        weights_paid = np.where(tp_paid, weights, 0).sum(axis=1)
+        not_realised = amount * (weights.sum(axis=1) - weights_paid)
+        with np.errstate(invalid='ignore'):
+            tp_results = np.where(tp_paid, amount * weights * self.tp_ratios, 0)
+        return {
+            'nothing_found': nothing_found,
+            'closed_by_tp': closed_by_tp,
+            'closed_by_sl': closed_by_sl,
+            'tp_executed': tp_found,
+            'tp_paid': tp_paid,
+            'sl_executed': sl_found,
+            'tp_results': tp_results,
+            'sl_results': np.where(closed_by_sl, not_realised * self.sl_ratios, 0),
+        }
+
+    def get_flows(self, positions, opened):
+        """
+        Wallet cash flows of opened transactions sorted like BacktestTimeline executes them.
+        Signal flow is opening amount with refund when initial price or any realisation date isn't found.
+        """
+        amount = self.amount
+        traded = opened & self.has_initial_price
+        signal_amounts = np.where(traded & ~positions['nothing_found'], -amount, 0.)
+
+        tp_rows, tp_columns = np.nonzero(positions['tp_paid'] & traded[:, None])
+        sl_rows = np.nonzero(positions['closed_by_sl'] & traded)[0]
+        signal_rows = np.nonzero(opened)[0]
+
+        flows = pd.DataFrame({
+            'date': np.concatenate([self.dates[signal_rows], self.tp_dates[tp_rows, tp_columns],
+                                    self.sl_dates[sl_rows]]),
+            'group': np.concatenate([np.full(len(signal_rows), GROUP_SIGNAL),
+                                     np.full(len(tp_rows) + len(sl_rows), GROUP_POSITION)]),
+            'signal': np.concatenate([signal_rows, tp_rows, sl_rows]),
+            'seq': np.concatenate([np.zeros(len(signal_rows), dtype=int), tp_columns,
+                                   np.full(len(sl_rows), self.seq_stop_loss)]),
+            'type': np.concatenate([np.full(len(signal_rows), 'EventSignal'),
+                                    np.full(len(tp_rows), 'EventTakeProfit'),
+                                    np.full(len(sl_rows), 'EventStopLoss')]),
+            'amount': np.concatenate([signal_amounts[signal_rows], positions['tp_results'][tp_rows, tp_columns],
+                                      positions['sl_results'][sl_rows]]),
+        })
+        # wallet state isn't saved by statistics after signal without initial price
+        flows['is_recorded'] = (flows['type'] != 'EventSignal') | self.has_initial_price[flows['signal'].values]
+
+        flows['signal_order'] = self.signals_order[flows['signal'].values]
+        flows = flows.sort_values(['date', 'group', 'signal_order', 'seq'], kind='stable').reset_index(drop=True)
+        flows['wallet_state'] = self.get_wallet_states(flows['amount'].values)
+        return flows
+
+    def get_wallet_states(self, amounts):
+        """ wallet after every flow, summed one by one like Wallet does """
+        return np.cumsum(np.concatenate([[self.wallet_initial_amount], amounts]))[1:]
+
+    def get_opened(self, flows):
+        """
+        Signals which open transaction, flows of all signals are replayed once in order of execution.
+        Wallet.on_transaction_open requires more than amount of transaction in wallet, signal rejected
+        for insufficient funds doesn't open transaction, so its later take profit and stop loss flows are skipped.
+        """
+        opened = np.ones(self.signals, dtype=bool)
+        wallet_state = self.wallet_initial_amount
+        is_signal = (flows['type'] == 'EventSignal').values.tolist()
+        for signal, amount, is_signal_flow in zip(flows['signal'].values.tolist(),
+                                                  flows['amount'].values.tolist(), is_signal):
+            if not opened[signal]:
+                continue
+            if is_signal_flow and wallet_state - self.amount <= 0:
+                opened[signal] = False
+                continue
+            wallet_state += amount
+        return opened
+
+    def get_result(self, positions, flows, opened):
+        traded = opened & self.has_initial_price
+        equity_curve = flows.loc[flows['is_recorded'], ['date', 'type', 'wallet_state']].reset_index(drop=True)
+        return {
+            'wallet_state_final': float(flows['wallet_state'].iloc[-1]) if len(flows) else self.wallet_initial_amount,
+            'equity_curve': equity_curve,
+            'closed_by_type__ratio': {
+                TransactionClosedByChoices.TAKE_PROFIT: int((positions['closed_by_tp'] & traded).sum()),
+                TransactionClosedByChoices.STOP_LOSS: int((positions['closed_by_sl'] & traded).sum()),
+            },
+            'position_event_realised__ratio': {
+                PositionTypeChoices.TAKE_PROFIT: int((positions['tp_executed'] & traded[:, None]).sum()),
+                PositionTypeChoices.STOP_LOSS: int((positions['sl_executed'] & traded).sum()),
+            },
+            'transaction_insufficient_funds': int((~opened).sum()),
+            'transaction_initial_pair_not_found': int((opened & ~self.has_initial_price).sum()),
+            'transaction_any_position_realisation_date_not_found': int((positions['nothing_found'] & traded).sum()),
+        }
+
+
+def get_cross_check_mismatches(backtest, result, tolerance=1e-6):
+    """
+    Compares result of PortfolioSimulator.simulate with backtest which has run BacktestTimeline.run_queue
+    for the same signals and config. Empty list means both gave the same wallet and statistics.
+    """
+    mismatches = []
+    if not math.isclose(backtest.wallet.amount, result['wallet_state_final'], rel_tol=tolerance, abs_tol=tolerance):
+        mismatches.append(f"wallet_state_final: timeline={backtest.wallet.amount} "
+                          f"simulator={result['wallet_state_final']}")
+
+    for name in ('closed_by_type__ratio', 'position_event_realised__ratio'):
+        timeline = {key: value for key, value in getattr(backtest.statistics, name).items() if value}
+        simulator = {key: value for key, value in result[name].items() if value}
+        if timeline != simulator:
+            mismatches.append(f"{name}: timeline={timeline} simulator={simulator}")
+
+    for name in ('transaction_initial_pair_not_found', 'transaction_any_position_realisation_date_not_found'):
+        if getattr(backtest.statistics, name) != result[name]:
+            mismatches.append(f"{name}: timeline={getattr(backtest.statistics, name)} simulator={result[name]}")
+
+    timeline_states = [state['wallet_state'] for state in backtest.statistics.wallet_state]
+    simulator_states = list(result['equity_curve']['wallet_state'])
+    if len(timeline_states) != len(simulator_states) or not np.allclose(
+            timeline_states, simulator_states, rtol=tolerance, atol=tolerance):
+        mismatches.append(f"wallet_state: timeline has {len(timeline_states)} states, "
+                          f"simulator has {len(simulator_states)} states or they differ")
+    return mismatches
+
+
+def cross_check_with_timeline(backtest):
+    """
+    Runs backtest (created and filled with messages) through BacktestTimeline and through PortfolioSimulator
+    with its config. Signals are resolved once before the run and timeline replays them from signal_resolver.
+    """
+    resolved_signals = []
+    for event in backtest.get_signals_events():
+        try:
+            resolved_signals.append(signal_resolver.get(event.message))
+        except IncorrectDecisionSignalTradeLevels:
+            continue  # timeline skips these signals too
+
+    simulator = PortfolioSimulator(
+        get_events_table(resolved_signals),
+        amount_single_transaction=backtest.config.amount_single_transaction,
+        wallet_initial_amount=backtest.config.wallet_initial_amount
+    )
+    result = simulator.simulate(backtest.config.strategy)
+    backtest.run_analysing()
+
+    mismatches = get_cross_check_mismatches(backtest, result)
+    for mismatch in mismatches:
+        logger.error(f'Simulator differs from timeline. {mismatch}')
+    return mismatches
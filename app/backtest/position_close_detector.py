@@ -2,9 +2,11 @@ import logging
 import datetime
 from collections import OrderedDict
 
-from mongoengine import DoesNotExist
+import numpy as np
 
 from app.backtest import config
+from app.backtest.extremes_index import ExtremesIndex
+from app.backtest.price_store import PriceStore
 from app.models.choices import DecisionSignalTypeChoices
 
 from app.models.historic import HistoricRow
@@ -17,13 +19,37 @@ STOP_LOSS = "stop_loss"
 
 UNDEFINED = 'undefined'
 
+PRICE_WINDOW_PROJECTION = {'_id': 0, 'date': 1, 'high': 1, 'low': 1}
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+price_store = PriceStore()
+
+
+def get_nearest_historic_row(pair, date, max_minutes=None):
+    """
+    First HistoricRow bar of pair at or after date, found with single query on (pair, date) index.
+    Bars further than max_minutes from date are not taken into account.
+    """
+    date_filter = {'date__gte': date}
+    if max_minutes is not None:
+        date_filter['date__lte'] = date + datetime.timedelta(minutes=max_minutes)
+    return HistoricRow.objects(pair=pair, **date_filter).order_by('date').only(
+        'date', 'high', 'low'
+    ).as_pymongo().first()
+
+
+def get_minutes_between(date_from, date_to):
+    return int((date_to - date_from).total_seconds() // 60)
+
 
 def get_initial_price_of_nearest_historic_row_date_for_pair(pair, date):
-    price = None
-    retries = 0
+    """
+    Price in the middle of the first bar at or after date (minute precision).
+    retries is amount of minutes between date and the bar found,
+    bars further than POSITION_DETECTOR_MAX_RETRIES minutes are not taken into account.
+    """
     date_query = datetime.datetime(
         year=date.year,
         month=date.month,
@@ -32,26 +58,283 @@ def get_initial_price_of_nearest_historic_row_date_for_pair(pair, date):
         minute=date.minute
     )
 
-    while price is None:
-        try:
-            historic_row = HistoricRow.objects.get(date=date_query, pair=pair)
-            price = (historic_row.low + historic_row.high)/2
-        except DoesNotExist:
-            if retries == config.POSITION_DETECTOR_MAX_RETRIES:
-                logger.error(f'Initial price not found for pair={pair} and date={date}')
-                return None, retries
-            retries += 1
-            date = date + datetime.timedelta(minutes=1)
+    bar = preloaded_prices.get_nearest_bar(pair, date_query)
+    if bar is None and config.PRICE_STORE_ENABLED:
+        bar = price_store.get_nearest_bar(pair, date_query)
+    elif bar is None:
+        bar = get_nearest_historic_row(pair, date_query, max_minutes=config.POSITION_DETECTOR_MAX_RETRIES)
+
+    if bar is not None:
+        retries = get_minutes_between(date_query, bar['date'])
+        if retries <= config.POSITION_DETECTOR_MAX_RETRIES:
+            return (bar['low'] + bar['high'])/2, retries
+
+    logger.error(f'Initial price not found for pair={pair} and date={date}')
+    return None, config.POSITION_DETECTOR_MAX_RETRIES
+
+
+class PriceWindow:
+    """
+    High/low/date columns of one pair for the detection window, loaded once per signal
+    so every take profit and stop loss can be checked against the same arrays.
+    """
+
+    def __init__(self, dates, highs, lows, extremes_index=None, extremes_index_offset=0):
+        self.dates = dates
+        self.highs = highs
+        self.lows = lows
+        # optional ExtremesIndex covering this window, offset is position of first row of window in it
+        self.extremes_index = extremes_index
+        self.extremes_index_offset = extremes_index_offset
+
+    @classmethod
+    def from_raw_rows(cls, raw_rows):
+        """ raw_rows are plain dicts with date, high and low (projection of HistoricRow documents) """
+        dates, highs, lows = [], [], []
+        for raw_row in raw_rows:
+            dates.append(raw_row['date'])
+            highs.append(raw_row['high'])
+            lows.append(raw_row['low'])
+        return cls(
+            dates=np.array(dates, dtype='datetime64[us]'),
+            highs=np.array(highs, dtype=np.float64),
+            lows=np.array(lows, dtype=np.float64)
+        )
+
+    @classmethod
+    def from_price_bars(cls, price_bars):
+        return cls(
+            dates=price_bars.dates, highs=price_bars.high, lows=price_bars.low,
+            extremes_index=price_bars.extremes_index,
+            extremes_index_offset=price_bars.extremes_index_offset
+        )
+
+    def build_extremes_index(self):
+        self.extremes_index = ExtremesIndex.build(self.highs, self.lows, config.EXTREMES_INDEX_BLOCK_SIZE)
+        self.extremes_index_offset = 0
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.highs.nbytes + self.lows.nbytes
+
+    def slice(self, date_from, date_to):
+        """ rows with date_from <= date <= date_to, arrays are views of this window """
+        start = np.searchsorted(self.dates, np.datetime64(date_from), side='left')
+        end = np.searchsorted(self.dates, np.datetime64(date_to), side='right')
+        return PriceWindow(
+            self.dates[start:end], self.highs[start:end], self.lows[start:end],
+            extremes_index=self.extremes_index,
+            extremes_index_offset=self.extremes_index_offset + start
+        )
+
+    def get_first_cross_dates(self, prices, direction):
+        """
+        Returns date of first row crossing each of given prices (or NOT_FOUND) in one pass:
+        boolean mask has shape (len(prices), len(window)) and argmax gives first True in row.
+        """
+        return [self.get_date_or_not_found(index) for index in self.get_first_cross_indexes(prices, direction)]
+
+    def get_first_cross_indexes(self, prices, direction, start=0, end=None):
+        """ index of first row in [start, end) crossing each of given prices, -1 if not crossed """
+        end = len(self) if end is None else min(end, len(self))
+        not_crossed = np.full(len(prices), -1)
+        if not prices or start >= end:
+            return not_crossed
+
+        if self.extremes_index is not None and direction in (CROSS_UP, CROSS_DOWN):
+            return np.array([
+                self.get_first_cross_index_from_extremes_index(price, direction, start, end)
+                for price in prices
+            ])
+
+        if direction == CROSS_UP:
+            crossed = self.highs[np.newaxis, start:end] > np.array(prices, dtype=np.float64)[:, np.newaxis]
+        elif direction == CROSS_DOWN:
+            crossed = self.lows[np.newaxis, start:end] < np.array(prices, dtype=np.float64)[:, np.newaxis]
+        else:
+            return not_crossed
+
+        first_cross_indexes = crossed.argmax(axis=1)
+        has_crossed = crossed[np.arange(len(prices)), first_cross_indexes]
+        return np.where(has_crossed, first_cross_indexes + start, not_crossed)
+
+    def get_first_cross_index_from_extremes_index(self, price, direction, start, end):
+        offset = self.extremes_index_offset
+        if direction == CROSS_UP:
+            index = self.extremes_index.get_first_index_above(float(price), offset + start, offset + end)
+        else:
+            index = self.extremes_index.get_first_index_below(float(price), offset + start, offset + end)
+        return index - offset if index >= 0 else -1
+
+    def get_first_cross_dates_single_sweep(self, take_profits_prices, direction_tp,
+                                           stop_loss_price, direction_sl, block_size):
+        """
+        Walks window forward in blocks of block_size rows and resolves all levels on the way.
+        Stops when stop loss is crossed - take profits crossed later than stop loss stay NOT_FOUND.
+        Take profit crossed in the same row as stop loss is still taken.
+        """
+        take_profits_indexes = [-1] * len(take_profits_prices)
+        stop_loss_index = -1
+        unresolved = list(range(len(take_profits_prices)))
+
+        for start in range(0, len(self), block_size):
+            end = start + block_size
+            if stop_loss_price is not None:
+                stop_loss_index = self.get_first_cross_indexes([stop_loss_price], direction_sl, start, end)[0]
+
+            if unresolved:
+                block_indexes = self.get_first_cross_indexes(
+                    [take_profits_prices[order] for order in unresolved], direction_tp, start, end
+                )
+                still_unresolved = []
+                for order, index in zip(unresolved, block_indexes):
+                    if index >= 0 and (stop_loss_index < 0 or index <= stop_loss_index):
+                        take_profits_indexes[order] = index
+                    else:
+                        still_unresolved.append(order)
+                unresolved = still_unresolved
+
+            if stop_loss_index >= 0 or (not unresolved and stop_loss_price is None):
+                break
+
+        return (
+            [self.get_date_or_not_found(index) for index in take_profits_indexes],
+            self.get_date_or_not_found(stop_loss_index)
+        )
+
+    def get_date_or_not_found(self, index):
+        return self.dates[index].astype(datetime.datetime) if index >= 0 else PositionCloseDetector.NOT_FOUND
+
+
+class PriceWindowCache:
+    """
+    Least recently used price windows fetched from database, bounded by size of their arrays.
+    Window requested for pair is served from cache if any cached window of this pair covers it,
+    so all levels of one signal and overlapping signals on the same pair share one fetch.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.windows = OrderedDict()  # (pair, date_from, date_to) -> PriceWindow
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pair, date_from, date_to):
+        for key, price_window in self.windows.items():
+            cached_pair, cached_date_from, cached_date_to = key
+            if cached_pair == pair and cached_date_from <= date_from and date_to <= cached_date_to:
+                self.windows.move_to_end(key)
+                self.hits += 1
+                return price_window.slice(date_from, date_to)
+        self.misses += 1
+        return None
+
+    def add(self, pair, date_from, date_to, price_window):
+        key = (pair, date_from, date_to)
+        if key in self.windows:
+            self.size_bytes -= self.windows.pop(key).nbytes
+        self.windows[key] = price_window
+        self.size_bytes += price_window.nbytes
+
+        while self.size_bytes > self.max_bytes and len(self.windows) > 1:
+            _, evicted_price_window = self.windows.popitem(last=False)
+            self.size_bytes -= evicted_price_window.nbytes
+
+    def clear(self):
+        """ hits and misses are counted again from zero, so stats describe run after clear """
+        self.windows.clear()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'windows': len(self.windows),
+            'size_bytes': self.size_bytes,
+        }
+
+    def log_stats(self):
+        logger.info(f'Price window cache: {self.get_stats()}')
+
+
+price_window_cache = PriceWindowCache(max_bytes=config.PRICE_WINDOW_CACHE_MAX_BYTES)
+
+
+class PreloadedPrices:
+    """
+    Price windows of whole backtest period loaded with one read per pair before backtest starts.
+    Detector and initial price lookup are served from here when requested dates are covered.
+    """
+
+    def __init__(self):
+        self.price_windows = {}  # pair -> (date_from, date_to, PriceWindow)
+
+    def add(self, pair, date_from, date_to, price_window):
+        self.price_windows[pair] = (date_from, date_to, price_window)
+
+    def clear(self):
+        self.price_windows.clear()
+
+    def get_pairs(self):
+        return list(self.price_windows.keys())
+
+    def get(self, pair, date_from, date_to):
+        if pair not in self.price_windows:
+            return None
+        preloaded_date_from, preloaded_date_to, price_window = self.price_windows[pair]
+        if preloaded_date_from <= date_from and date_to <= preloaded_date_to:
+            return price_window.slice(date_from, date_to)
+        return None
 
-    return price, retries
+    def get_nearest_bar(self, pair, date):
+        """ first bar at or after date, None if it can't be answered from preloaded window """
+        if pair not in self.price_windows:
+            return None
+        preloaded_date_from, preloaded_date_to, price_window = self.price_windows[pair]
+        if not preloaded_date_from <= date <= preloaded_date_to:
+            return None
+        index = np.searchsorted(price_window.dates, np.datetime64(date), side='left')
+        if index >= len(price_window):
+            return None
+        return {
+            'date': price_window.dates[index].astype(datetime.datetime),
+            'high': float(price_window.highs[index]),
+            'low': float(price_window.lows[index]),
+        }
+
+
+preloaded_prices = PreloadedPrices()
 
 
 class PositionCloseDetector:
 
     NOT_FOUND = 'NOT_FOUND'
 
+    @classmethod
+    def get_version(cls):
+        """ settings which change result of detect and initial price, results of other version can't be reused """
+        if config.POSITION_DETECTOR_SINGLE_SWEEP:
+            mode = 'single_sweep'
+        elif config.POSITION_DETECTOR_VECTORIZED:
+            mode = 'vectorized'
+        else:
+            mode = 'loop'
+        # initial price of resolved signal is searched up to POSITION_DETECTOR_MAX_RETRIES minutes after signal
+        return f'{mode}__{config.FETCH_DATES_UNTIL_AMOUNT_DAYS}d__{config.POSITION_DETECTOR_MAX_RETRIES}m'
+
     @classmethod
     def detect(cls, decision_signal):
+        if config.POSITION_DETECTOR_SINGLE_SWEEP:
+            return cls.detect_single_sweep(decision_signal)
+        if config.POSITION_DETECTOR_VECTORIZED:
+            return cls.detect_vectorized(decision_signal)
+
         result_take_profits, result_stop_loss = OrderedDict(), OrderedDict()
 
         date_from = decision_signal.date
@@ -87,28 +370,169 @@ class PositionCloseDetector:
 
         return result_take_profits, result_stop_loss
 
+    @classmethod
+    def detect_vectorized(cls, decision_signal):
+        """
+        Same result as detect, but price window is fetched once per signal
+        and all levels of given direction are resolved together on numpy arrays.
+        """
+        direction_tp = cls.get_analysing_direction(decision_signal.type, TAKE_PROFIT)
+        direction_sl = cls.get_analysing_direction(decision_signal.type, STOP_LOSS)
+
+        price_window = cls.get_price_window(decision_signal.pair, decision_signal.date)
+
+        result_take_profits, take_profits_to_detect = cls.get_take_profits_to_detect(decision_signal)
+        dates_take_profits = price_window.get_first_cross_dates(
+            [float(tp['price']) for tp in take_profits_to_detect], direction_tp
+        )
+        for take_profit, date_take_profit in zip(take_profits_to_detect, dates_take_profits):
+            result_take_profits[take_profit['order_number']] = date_take_profit
+
+        result_stop_loss, stop_loss_price = cls.get_stop_loss_to_detect(decision_signal)
+        if stop_loss_price is not None:
+            result_stop_loss = price_window.get_first_cross_dates([stop_loss_price], direction_sl)[0]
+
+        return result_take_profits, result_stop_loss
+
+    @classmethod
+    def detect_single_sweep(cls, decision_signal):
+        """
+        All take profits and stop loss found in one forward sweep over price window,
+        which ends as soon as stop loss is crossed. Unlike detect, take profits crossed
+        after stop loss are returned as NOT_FOUND (transaction is closed by then anyway).
+        """
+        direction_tp = cls.get_analysing_direction(decision_signal.type, TAKE_PROFIT)
+        direction_sl = cls.get_analysing_direction(decision_signal.type, STOP_LOSS)
+
+        price_window = cls.get_price_window(decision_signal.pair, decision_signal.date)
+
+        result_take_profits, take_profits_to_detect = cls.get_take_profits_to_detect(decision_signal)
+        result_stop_loss, stop_loss_price = cls.get_stop_loss_to_detect(decision_signal)
+
+        dates_take_profits, date_stop_loss = price_window.get_first_cross_dates_single_sweep(
+            [float(tp['price']) for tp in take_profits_to_detect], direction_tp,
+            stop_loss_price, direction_sl,
+            block_size=config.POSITION_DETECTOR_SWEEP_BLOCK_SIZE
+        )
+        for take_profit, date_take_profit in zip(take_profits_to_detect, dates_take_profits):
+            result_take_profits[take_profit['order_number']] = date_take_profit
+        if stop_loss_price is not None:
+            result_stop_loss = date_stop_loss
+
+        return result_take_profits, result_stop_loss
+
+    @classmethod
+    def get_take_profits_to_detect(cls, decision_signal):
+        """
+        Result dict with NOT_FOUND for every take profit (in signal order)
+        and list of take profits which price can be detected.
+        """
+        result_take_profits = OrderedDict()
+        take_profits_to_detect = []
+        for take_profit in decision_signal.take_profits:
+            if take_profit is None:
+                logger.error(
+                    f"Error occured. Take_profit is null. "
+                    f"Decision_signal.pk={decision_signal.pk}"
+                )
+                result_take_profits[take_profit['order_number']] = None
+                continue
+            if take_profit['price'] is None:
+                logger.error(f"Price is none for position.pk: {take_profit} ")
+                result_take_profits[take_profit['order_number']] = cls.NOT_FOUND
+                continue
+            result_take_profits[take_profit['order_number']] = cls.NOT_FOUND
+            take_profits_to_detect.append(take_profit)
+        return result_take_profits, take_profits_to_detect
+
+    @classmethod
+    def get_stop_loss_to_detect(cls, decision_signal):
+        """ result of stop loss if it can't be detected and its price (None if it can't) """
+        stop_loss = decision_signal.stop_loss
+        if stop_loss is None:
+            logger.error(f"Error occured. Stop_loss is null. "
+                         f"Decision_signal.pk={decision_signal.pk}")
+            return None, None
+        if stop_loss['price'] is None:
+            logger.error(f"Price is none for position.pk: {stop_loss} ")
+            return cls.NOT_FOUND, None
+        return cls.NOT_FOUND, float(stop_loss['price'])
+
+    @classmethod
+    def get_price_window_query(cls, pair, date_from, date_to=None):
+        """ raw filter and sort of HistoricRow query for price window """
+        if date_to is None:
+            date_to = date_from+datetime.timedelta(days=config.FETCH_DATES_UNTIL_AMOUNT_DAYS)
+        query_filter = {
+            'pair': pair,
+            'date': {'$gte': date_from, '$lte': date_to}
+        }
+        return query_filter, [('date', 1)]
+
+    @classmethod
+    def get_price_window(cls, pair, date_from):
+        date_to = date_from+datetime.timedelta(days=config.FETCH_DATES_UNTIL_AMOUNT_DAYS)
+
+        price_window = preloaded_prices.get(pair, date_from, date_to)
+        if price_window is not None:
+            return price_window
+
+        if config.PRICE_STORE_ENABLED:
+            return PriceWindow.from_price_bars(price_store.get_bars(pair, date_from, date_to))
+
+        price_window = price_window_cache.get(pair, date_from, date_to)
+        if price_window is None:
+            # fetch longer window so signals on the same pair in next days are served from cache
+            date_to_fetched = date_to + datetime.timedelta(days=config.PRICE_WINDOW_CACHE_EXTEND_DAYS)
+            price_window_fetched = cls.fetch_price_window(pair, date_from, date_to_fetched)
+            price_window_cache.add(pair, date_from, date_to_fetched, price_window_fetched)
+            price_window = price_window_fetched.slice(date_from, date_to)
+
+        return price_window
+
+    @classmethod
+    def preload_price_windows(cls, pairs, date_from, date_to):
+        """ one read per pair for [date_from, date_to + FETCH_DATES_UNTIL_AMOUNT_DAYS] """
+        date_to = date_to + datetime.timedelta(days=config.FETCH_DATES_UNTIL_AMOUNT_DAYS)
+        preloaded_prices.clear()
+        for pair in pairs:
+            if config.PRICE_STORE_ENABLED:
+                price_window = PriceWindow.from_price_bars(price_store.get_bars(pair, date_from, date_to))
+            else:
+                price_window = cls.fetch_price_window(pair, date_from, date_to)
+            if config.EXTREMES_INDEX_ENABLED and price_window.extremes_index is None:
+                price_window.build_extremes_index()
+            preloaded_prices.add(pair, date_from, date_to, price_window)
+            logger.info(f'Preloaded {len(price_window)} bars for pair={pair}')
+
+    @classmethod
+    def fetch_price_window(cls, pair, date_from, date_to):
+        query_filter, sort = cls.get_price_window_query(pair, date_from, date_to)
+        historical_rows_for_pairs = HistoricRow._get_collection().find(
+            query_filter,
+            projection=PRICE_WINDOW_PROJECTION,
+            sort=sort,
+            batch_size=config.PRICE_WINDOW_BATCH_SIZE
+        )
+
+        return PriceWindow.from_raw_rows(historical_rows_for_pairs)
+
     @classmethod
     def get_date_of_execution(cls, position, pair, date_from, direction):
         if position['price'] is None:
             logger.error(f"Price is none for position.pk: {position} ")
             return cls.NOT_FOUND
 
-        date_to = date_from+datetime.timedelta(days=config.FETCH_DATES_UNTIL_AMOUNT_DAYS)
-
-        historical_rows_for_pairs = HistoricRow.objects.filter(
-            date__gte=date_from,
-            date__lte=date_to,
-            pair=pair
-        )
+        price_window = cls.get_price_window(pair, date_from)
 
-        for historic_row in historical_rows_for_pairs:
+        for date, high, low in zip(price_window.dates, price_window.highs, price_window.lows):
             if direction == CROSS_UP:
-                if historic_row.high > position['price']:
-                    return historic_row.date
+                if high > position['price']:
+                    return date.astype(datetime.datetime)
                 continue
             if direction == CROSS_DOWN:
-                if historic_row.low < position['price']:
-                    return historic_row.date
+                if low < position['price']:
+                    return date.astype(datetime.datetime)
                 continue
 
         return cls.NOT_FOUND
@@ -1,9 +1,11 @@
+import itertools
 import logging
 from datetime import datetime
 
 from mongoengine import register_connection, DoesNotExist
 
 from app.backtest.backtest import Backtest, BACKTEST_MESSAGES_FILLER_TYPE_MAPPER, BacktestConfig
+from app.backtest.prebacktest_pipeline import PreBacktestPipeline, PROCESS_SUCCESS
 from app.exceptions.process import (
     DecisionSignalTypeUndefined,
     DecisionSignalAnyTakeProfitFound,
@@ -13,14 +15,15 @@ from app.exceptions.process import (
 )
 from app.mappings import MAPPING_NAME_TO_CHAT_ID
 from app.models.channels import Channel
-from app.models.decisions import DecisionSignal
-from app.models.messages import Message, RawMessage
+from app.models.messages import RawMessage
 from app.models.choices import MessageTypeChoices, ChannelNameChoices, MessageFillTypeChoices
-from app.processing.process_signal import MAPPING_PROCESS_SIGNAL
-from app.processing.recognise import RecogniseMessageManager
+from app.backtest.resolved_signals import signal_resolver
+from app.processing.cache import recognise_cache, process_cache
+from app.processing.recognise import RecogniseMessageManager, RecognitionContext, MAPPING_RECOGNISE
 from backtest import config
 from backtest.reports.reports_fetcher import ReportFetcher
 from database import connect_to_db, DB_BACKTEST, MONGO_HOST, MONGO_PORT, get_collection_for_database
+from database.stats import check_historic_row_query_plan
 
 
 logger = logging.getLogger(__name__)
@@ -67,7 +70,12 @@ class PreBacktest():
         )
         backtest.create_backtest_related_instances()
         backtest.fill_messages()
-        backtest.run_analysing()
+        backtest.preload_prices()
+        try:
+            backtest.run_analysing()
+        finally:
+            signal_resolver.clear()  # decisions are modified by transactions of this backtest
+            process_cache.clear()
         backtest.save_backtest_to_database()
 
     def process_signal(self):
@@ -90,7 +98,8 @@ class PreBacktest():
 
     def recognise_messages(self):
         prebacktest_recognise = PreBacktestRecognise(
-            self.channel.channel_id, self.analysed_chat_name, self.recognise_report_name
+            self.channel.channel_id, self.analysed_chat_name, self.recognise_report_name,
+            in_memory=config.RECOGNISE_IN_MEMORY
         )
         self.report_recognision = prebacktest_recognise.recognise()
 
@@ -99,6 +108,7 @@ class PreBacktest():
         register_connection(DB_BACKTEST,
                             db=DB_BACKTEST, name=DB_BACKTEST,
                             host=MONGO_HOST, port=MONGO_PORT)
+        check_historic_row_query_plan()
 
     @staticmethod
     def get_or_create_channel(chat_id, chat_name):
@@ -113,9 +123,18 @@ class PreBacktest():
 
 class PreBacktestRecognise():
 
-    def __init__(self, chat_id, analysed_chat_name, report_name='default_name'):
+    def __init__(self, chat_id, analysed_chat_name, report_name='default_name',
+                 in_memory=False, save_messages=True, pipeline=None):
+        """
+        :param in_memory: recognise messages without database access, see RecognitionContext
+        :param save_messages: with in_memory, save recognised messages with bulk insert afterwards
+        :param pipeline: PreBacktestPipeline, with more than one worker messages are always recognised in memory
+        """
         self.analysed_chat_name = analysed_chat_name
         self.report_name = report_name
+        self.in_memory = in_memory
+        self.save_messages = save_messages
+        self.pipeline = pipeline or PreBacktestPipeline()
 
         self.collection_recognised_messages = get_collection_for_database(PRE_BACKTEST_RECOGNISED)
         self.raw_messages = RawMessage.objects.filter(chat_id=chat_id)
@@ -131,15 +150,12 @@ class PreBacktestRecognise():
             MessageTypeChoices.CORRECTION: [],
             MessageTypeChoices.UNDEFINED: []
         }
+        if self.in_memory or self.pipeline.workers > 1:
+            messages_recognised = self.get_messages_recognised_in_memory()
+        else:
+            messages_recognised = self.get_messages_recognised()
 
-        for message in self.raw_messages:
-            try:
-                message_recognised = RecogniseMessageManager.get_recognised_message_obj(message)
-            except Exception:
-                logger.exception(f"Error occurred while recognising message object. "
-                                 f"Message_uuid={message.uuid}")
-                continue
-
+        for message_recognised in messages_recognised:
             message_recognised_json = message_recognised.to_json_representation()
 
             if message_recognised.type == MessageTypeChoices.SKIP:
@@ -160,14 +176,58 @@ class PreBacktestRecognise():
         self.collection_recognised_messages.insert_one(report)
         return report
 
+    def get_messages_recognised(self):
+        messages_recognised = []
+        recognise_cache.preload(MAPPING_RECOGNISE.get(self.analysed_chat_name))
+
+        for message in self.raw_messages:
+            try:
+                messages_recognised.append(
+                    RecogniseMessageManager.get_recognised_message_obj_cached(message)
+                )
+            except Exception:
+                logger.exception(f"Error occurred while recognising message object. "
+                                 f"Message_uuid={message.uuid}")
+
+        recognise_cache.log_stats()
+        return messages_recognised
+
+    def get_messages_recognised_in_memory(self):
+        messages_recognised = []
+        context = RecognitionContext.preload([self.analysed_chat_name])
+
+        if self.pipeline.workers > 1:
+            # types are recognised by workers, messages are built here in order to resolve quotes
+            raw_messages = list(self.raw_messages.as_pymongo())
+            messages_types = self.pipeline.get_messages_types(raw_messages)
+        else:
+            raw_messages = self.raw_messages
+            messages_types = itertools.repeat((None, None))
+
+        for message, (message_type, error) in zip(raw_messages, messages_types):
+            if error is not None:
+                continue
+            try:
+                messages_recognised.append(
+                    RecogniseMessageManager.get_recognised_message_obj_in_memory(message, context, message_type)
+                )
+            except Exception:
+                logger.exception(f"Error occurred while recognising message object. "
+                                 f"Message_uuid={message['uuid']}")
+
+        if self.save_messages:
+            context.save_messages()
+        return messages_recognised
+
 
 class PreBacktestProcessSignal():
 
-    def __init__(self, recognised_messages_signal, channel_name, report_name='default') -> None:
+    def __init__(self, recognised_messages_signal, channel_name, report_name='default', pipeline=None) -> None:
         self.collection_processed_messages = get_collection_for_database(PRE_BACKTEST_PROCESSED)
         self.channel_name = channel_name
         self.report_name = report_name
         self.recognised_messages_signal = recognised_messages_signal
+        self.pipeline = pipeline or PreBacktestPipeline()
 
     def process(self):
         report = {
@@ -185,33 +245,18 @@ class PreBacktestProcessSignal():
             }
         }
         channel_name = self.recognised_messages_signal[0]['channel']['name']
-        processor = MAPPING_PROCESS_SIGNAL.get(channel_name)
+        outcomes = self.pipeline.get_process_outcomes(channel_name, self.recognised_messages_signal)
 
-        for messsage in self.recognised_messages_signal:
-            messsage_object = Message.objects \
-                .filter(id_universal=messsage['id_universal']) \
-                .order_by('-created_at').first()
-            try:
-                decision = processor.get_decision(messsage_object)
-                if isinstance(decision, DecisionSignal):
-                    report['success'].append(messsage)
-                else:
-                    logger.error("It should be DecisionSignal instance")
-            except IncorrectDecisionSignalTradeLevels:
-                report['failures'][IncorrectDecisionSignalTradeLevels.__name__].append(messsage)
-            except DecisionSignalTypeUndefined:
-                report['failures'][DecisionSignalTypeUndefined.__name__].append(messsage)
-            except DecisionSignalAnyTakeProfitFound:
-                report['failures'][DecisionSignalAnyTakeProfitFound.__name__].append(messsage)
-            except InvalidTakeProfit:
-                report['failures'][InvalidTakeProfit.__name__].append(messsage)
-            except DecisionSignalStopLossNotFound:
-                report['failures'][DecisionSignalStopLossNotFound.__name__].append(messsage)
-            except Exception as e:
+        for messsage, (outcome, error_message) in zip(self.recognised_messages_signal, outcomes):
+            if outcome == PROCESS_SUCCESS:
+                report['success'].append(messsage)
+            elif outcome == Exception.__name__:
                 report['failures'][Exception.__name__].append({
                     'message': messsage,
-                    'error_message': str(e)
+                    'error_message': error_message
                 })
+            elif outcome is not None:
+                report['failures'][outcome].append(messsage)
 
         self.collection_processed_messages.insert_one(report)
         return report
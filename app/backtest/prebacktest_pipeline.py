@@ -0,0 +1,117 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from app.backtest import config
+from app.backtest.workers import init_process_worker
+from app.exceptions.process import (
+    DecisionSignalTypeUndefined,
+    DecisionSignalAnyTakeProfitFound,
+    InvalidTakeProfit,
+    DecisionSignalStopLossNotFound,
+    IncorrectDecisionSignalTradeLevels
+)
+from app.models.decisions import DecisionSignal
+from app.models.messages import Message
+from app.processing.cache import process_cache
+from app.processing.process_signal import MAPPING_PROCESS_SIGNAL
+from app.processing.recognise import RecogniseMessageManager
+
+logger = logging.getLogger(__name__)
+
+PROCESS_SUCCESS = 'success'
+PROCESS_FAILURES = (
+    IncorrectDecisionSignalTradeLevels,
+    DecisionSignalTypeUndefined,
+    DecisionSignalAnyTakeProfitFound,
+    InvalidTakeProfit,
+    DecisionSignalStopLossNotFound,
+)
+
+
+class PreBacktestPipeline:
+    """
+    Fans messages of PreBacktest out to worker processes in chunks of chunk_size.
+    Results of chunks are returned in order of messages, so reports are the same as
+    when messages are handled one by one. With workers=1 everything runs in current process.
+
+    Recognition in workers only decides types of raw messages, quoted messages depend on
+    previous messages, so Message objects are built in order by caller (see PreBacktestRecognise).
+    """
+
+    def __init__(self, workers=config.PREBACKTEST_WORKERS, chunk_size=config.PREBACKTEST_CHUNK_SIZE):
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def get_chunks(self, items):
+        return [items[start:start + self.chunk_size] for start in range(0, len(items), self.chunk_size)]
+
+    def get_messages_types(self, raw_messages):
+        """
+        :param raw_messages: list of raw message dicts (RawMessage.objects.as_pymongo())
+        :return: list of (MessageTypeChoices or None, error message or None), one per raw message
+        """
+        raw_messages = list(raw_messages)
+        logger.info(f'Recognising {len(raw_messages)} messages with workers={self.workers}')
+        chunks = self.get_chunks(raw_messages)
+        if self.workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(recognise_chunk, chunks))
+        else:
+            results = [recognise_chunk(chunk) for chunk in chunks]
+        return [result for chunk_results in results for result in chunk_results]
+
+    def get_process_outcomes(self, channel_name, recognised_messages):
+        """
+        :param recognised_messages: jsons of recognised messages (report of PreBacktestRecognise)
+        :return: list of (outcome, error message) from get_process_outcome, one per message
+        """
+        logger.info(f'Processing {len(recognised_messages)} messages with workers={self.workers}')
+        chunks = [(channel_name, chunk) for chunk in self.get_chunks(recognised_messages)]
+        if self.workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_process_worker,
+                                     initargs=(channel_name,)) as executor:
+                results = list(executor.map(process_chunk, chunks))
+        else:
+            process_cache.preload(MAPPING_PROCESS_SIGNAL.get(channel_name))
+            results = [process_chunk(chunk) for chunk in chunks]
+            process_cache.log_stats()
+        return [result for chunk_results in results for result in chunk_results]
+
+
+def recognise_chunk(raw_messages):
+    results = []
+    for raw_message in raw_messages:
+        try:
+            results.append((RecogniseMessageManager.get_message_type(raw_message), None))
+        except Exception as e:
+            logger.exception(f"Error occurred while recognising message object. "
+                             f"Message_uuid={raw_message.get('uuid')}")
+            results.append((None, str(e)))
+    return results
+
+
+def process_chunk(channel_name_and_messages):
+    channel_name, recognised_messages = channel_name_and_messages
+    processor = MAPPING_PROCESS_SIGNAL.get(channel_name)
+    messages_by_id_universal = Message.get_latest_by_id_universal(
+        message['id_universal'] for message in recognised_messages
+    )
+
+    results = []
+    for message in recognised_messages:
+        results.append(get_process_outcome(processor, messages_by_id_universal.get(message['id_universal'])))
+    return results
+
+
+def get_process_outcome(processor, message_object):
+    """ :return: (PROCESS_SUCCESS or name of failure, error message), (None, None) if nothing was decided """
+    try:
+        decision = process_cache.get_decision(processor, message_object)
+        if isinstance(decision, DecisionSignal):
+            return PROCESS_SUCCESS, None
+        logger.error("It should be DecisionSignal instance")
+        return None, None
+    except PROCESS_FAILURES as e:
+        return next(failure.__name__ for failure in PROCESS_FAILURES if isinstance(e, failure)), None
+    except Exception as e:
+        return Exception.__name__, str(e)
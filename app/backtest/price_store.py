@@ -0,0 +1,294 @@
+import datetime
+import logging
+import os
+import shutil
+
+import numpy as np
+
+from app import constants
+from app.backtest import config
+from app.backtest.extremes_index import ExtremesIndex, EXTREMES_INDEX_FILE_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+PRICE_STORE_MAGIC = b'FXCOLS01'
+PRICE_STORE_HEADER_SIZE = 64
+PRICE_STORE_FILE_NAME = '{pair}_{year}.fxcol'
+
+# column name, dtype - columns are written one after another in this order
+PRICE_STORE_COLUMNS = (
+    ('date', np.int64),  # seconds since epoch
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float32),
+)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def datetime_to_timestamp(date):
+    return int((date - EPOCH).total_seconds())
+
+
+def timestamp_to_datetime(timestamp):
+    return EPOCH + datetime.timedelta(seconds=int(timestamp))
+
+
+class PriceStoreFile:
+    """
+    One pair/year of minute bars. File layout:
+    header (magic, amount of rows) followed by contiguous column blocks from PRICE_STORE_COLUMNS.
+    Columns are opened with numpy.memmap so slicing them doesn't copy anything.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = self.read_header(path)
+
+        offset = PRICE_STORE_HEADER_SIZE
+        for name, dtype in PRICE_STORE_COLUMNS:
+            column = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(self.rows,)) \
+                if self.rows else np.empty(0, dtype=dtype)
+            setattr(self, name, column)
+            offset += self.rows * np.dtype(dtype).itemsize
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def dates(self):
+        return self.date.view('datetime64[s]')
+
+    @staticmethod
+    def read_header(path):
+        with open(path, 'rb') as f:
+            header = f.read(PRICE_STORE_HEADER_SIZE)
+        if header[:len(PRICE_STORE_MAGIC)] != PRICE_STORE_MAGIC:
+            raise ValueError(f"File={path} is not price store file")
+        return int(np.frombuffer(header, dtype=np.uint64, count=1, offset=len(PRICE_STORE_MAGIC))[0])
+
+    @staticmethod
+    def write_header(f, rows):
+        header = PRICE_STORE_MAGIC + np.array([rows], dtype=np.uint64).tobytes()
+        f.write(header.ljust(PRICE_STORE_HEADER_SIZE, b'\0'))
+
+    @classmethod
+    def write(cls, path, columns):
+        """
+        :param columns: dict with all PRICE_STORE_COLUMNS,
+                        'date' has to be sorted int64 timestamps (seconds)
+        """
+        rows = len(columns['date'])
+        if any(len(column) != rows for column in columns.values()):
+            raise ValueError("All columns have to have the same length")
+
+        with open(path, 'wb') as f:
+            cls.write_header(f, rows)
+            for name, dtype in PRICE_STORE_COLUMNS:
+                np.ascontiguousarray(columns[name], dtype=dtype).tofile(f)
+        return cls(path)
+
+    def get_index_range(self, date_from, date_to):
+        """ indexes [start, end) of bars with date_from <= date <= date_to """
+        start = int(np.searchsorted(self.date, datetime_to_timestamp(date_from), side='left'))
+        end = int(np.searchsorted(self.date, datetime_to_timestamp(date_to), side='right'))
+        return start, end
+
+    def get_nearest_index(self, date):
+        """ index of first bar at or after date, None if there is no such bar in this file """
+        index = int(np.searchsorted(self.date, datetime_to_timestamp(date), side='left'))
+        return index if index < self.rows else None
+
+
+class PriceStoreFileWriter:
+    """
+    Writes PriceStoreFile without holding all rows in memory.
+    Appended columns go to temporary file per column, on close they are joined behind the header
+    into temporary file which replaces file at path, so file at path is never left partially written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.column_files = {
+            name: open(self.get_column_file_path(name), 'wb') for name, _ in PRICE_STORE_COLUMNS
+        }
+
+    def get_column_file_path(self, name):
+        return f"{self.path}.{name}.tmp"
+
+    def append(self, columns):
+        """ columns as in PriceStoreFile.write, dates have to be greater than already appended """
+        rows = len(columns['date'])
+        if any(len(columns[name]) != rows for name, _ in PRICE_STORE_COLUMNS):
+            raise ValueError("All columns have to have the same length")
+
+        for name, dtype in PRICE_STORE_COLUMNS:
+            np.ascontiguousarray(columns[name], dtype=dtype).tofile(self.column_files[name])
+        self.rows += rows
+
+    def close(self):
+        for column_file in self.column_files.values():
+            column_file.close()
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                PriceStoreFile.write_header(f, self.rows)
+                for name, _ in PRICE_STORE_COLUMNS:
+                    with open(self.get_column_file_path(name), 'rb') as column_file:
+                        shutil.copyfileobj(column_file, f)
+            os.replace(tmp_path, self.path)
+        finally:
+            self.remove_tmp_files(tmp_path)
+        return PriceStoreFile(self.path)
+
+    def abort(self):
+        """ drops appended rows, file at path (if already existed) stays untouched """
+        for column_file in self.column_files.values():
+            column_file.close()
+        self.remove_tmp_files()
+
+    def remove_tmp_files(self, *paths):
+        for path in [self.get_column_file_path(name) for name, _ in PRICE_STORE_COLUMNS] + list(paths):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class PriceBars:
+    """ Slice of price columns for single pair. Views on memmap when slice is within one file. """
+
+    def __init__(self, date, open, high, low, close, volume,
+                 extremes_index=None, extremes_index_offset=0):
+        self.date = date
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        # index of whole file and position of first bar of this slice in it
+        self.extremes_index = extremes_index
+        self.extremes_index_offset = extremes_index_offset
+
+    def __len__(self):
+        return len(self.date)
+
+    @property
+    def dates(self):
+        return self.date.view('datetime64[s]')
+
+    @classmethod
+    def empty(cls):
+        return cls(**{name: np.empty(0, dtype=dtype) for name, dtype in PRICE_STORE_COLUMNS})
+
+    @classmethod
+    def concatenate(cls, price_bars):
+        price_bars = [bars for bars in price_bars if len(bars)]
+        if not price_bars:
+            return cls.empty()
+        if len(price_bars) == 1:
+            return price_bars[0]
+        return cls(**{
+            name: np.concatenate([getattr(bars, name) for bars in price_bars])
+            for name, _ in PRICE_STORE_COLUMNS
+        })
+
+
+class PriceStore:
+    """
+    Directory of PriceStoreFile, one per pair and year.
+    Replacement of HistoricRow collection for reading prices during backtest.
+    """
+
+    def __init__(self, path=constants.PATH_PRICE_STORE):
+        self.path = path
+        self.files = {}
+        self.extremes_indexes = {}
+
+    def get_file_path(self, pair, year):
+        return os.path.join(self.path, PRICE_STORE_FILE_NAME.format(pair=pair, year=year))
+
+    def is_pair_available(self, pair, year):
+        return os.path.exists(self.get_file_path(pair, year))
+
+    def get_file(self, pair, year):
+        key = (pair, year)
+        if key not in self.files:
+            path = self.get_file_path(pair, year)
+            self.files[key] = PriceStoreFile(path) if os.path.exists(path) else None
+        return self.files[key]
+
+    def write(self, pair, year, columns):
+        os.makedirs(self.path, exist_ok=True)
+        self.files[(pair, year)] = PriceStoreFile.write(self.get_file_path(pair, year), columns)
+        self.extremes_indexes.pop((pair, year), None)
+        return self.files[(pair, year)]
+
+    def get_extremes_index_path(self, pair, year):
+        return self.get_file_path(pair, year) + EXTREMES_INDEX_FILE_SUFFIX
+
+    def get_extremes_index(self, pair, year):
+        """ ExtremesIndex stored next to the pair/year file, None if it wasn't built """
+        if not config.EXTREMES_INDEX_ENABLED:
+            return None
+        key = (pair, year)
+        if key not in self.extremes_indexes:
+            path = self.get_extremes_index_path(pair, year)
+            price_store_file = self.get_file(pair, year)
+            if price_store_file is not None and os.path.exists(path):
+                self.extremes_indexes[key] = ExtremesIndex.load(
+                    path, price_store_file.high, price_store_file.low
+                )
+            else:
+                self.extremes_indexes[key] = None
+        return self.extremes_indexes[key]
+
+    def write_extremes_index(self, pair, year, block_size=config.EXTREMES_INDEX_BLOCK_SIZE):
+        price_store_file = self.get_file(pair, year)
+        if price_store_file is None:
+            return None
+        extremes_index = ExtremesIndex.build(price_store_file.high, price_store_file.low, block_size)
+        extremes_index.save(self.get_extremes_index_path(pair, year))
+        self.extremes_indexes[(pair, year)] = extremes_index
+        return extremes_index
+
+    def get_file_writer(self, pair, year):
+        os.makedirs(self.path, exist_ok=True)
+        self.files.pop((pair, year), None)
+        self.extremes_indexes.pop((pair, year), None)
+        return PriceStoreFileWriter(self.get_file_path(pair, year))
+
+    def get_bars(self, pair, date_from, date_to):
+        """ bars of pair with date_from <= date <= date_to """
+        price_bars = []
+        for year in range(date_from.year, date_to.year + 1):
+            price_store_file = self.get_file(pair, year)
+            if price_store_file is None:
+                continue
+            start, end = price_store_file.get_index_range(date_from, date_to)
+            price_bars.append(PriceBars(
+                extremes_index=self.get_extremes_index(pair, year),
+                extremes_index_offset=start,
+                **{name: getattr(price_store_file, name)[start:end] for name, _ in PRICE_STORE_COLUMNS}
+            ))
+        return PriceBars.concatenate(price_bars)
+
+    def get_nearest_bar(self, pair, date, max_year=None):
+        """
+        First bar of pair at or after date as dict of column values.
+        Returns None if pair has no bar after date.
+        """
+        max_year = max_year or date.year + 1
+        for year in range(date.year, max_year + 1):
+            price_store_file = self.get_file(pair, year)
+            if price_store_file is None:
+                continue
+            index = price_store_file.get_nearest_index(date)
+            if index is None:
+                continue
+            bar = {name: getattr(price_store_file, name)[index].item() for name, _ in PRICE_STORE_COLUMNS}
+            bar['date'] = timestamp_to_datetime(bar['date'])
+            return bar
+        return None
@@ -0,0 +1,127 @@
+import logging
+
+from app.backtest import config
+from app.backtest.position_close_detector import (
+    PositionCloseDetector,
+    get_initial_price_of_nearest_historic_row_date_for_pair
+)
+from app.models.decisions import ResolvedSignal
+from app.processing.cache import get_text_hash
+from app.processing.process_signal import ProcessSignalManager, MAPPING_PROCESS_SIGNAL
+
+logger = logging.getLogger(__name__)
+
+
+class SignalResolver:
+    """
+    Resolves signal message into ResolvedSignal: decision, crossing dates of its levels and initial price.
+    With config.RESOLVED_SIGNALS_ENABLED results are saved to database and reused by next backtests
+    of the same message, so only wallet and strategy accounting is done again.
+    Results are keyed by (id_universal, detector version, processor version, text hash),
+    changed detector, processor or message text makes them resolved again.
+    """
+
+    def __init__(self):
+        self.resolved_signals = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(message):
+        processor = MAPPING_PROCESS_SIGNAL.get(message.channel.name)
+        return (
+            message.id_universal,
+            PositionCloseDetector.get_version(),
+            processor.version if processor else None,
+            get_text_hash(message.text)
+        )
+
+    def preload(self, messages):
+        """ loads resolved signals of all given messages with single query """
+        if not config.RESOLVED_SIGNALS_ENABLED:
+            return
+        keys_to_load = {self.get_key(message) for message in messages} - set(self.resolved_signals)
+        if not keys_to_load:
+            return
+        resolved_signals = ResolvedSignal.objects.filter(
+            id_universal__in=[key[0] for key in keys_to_load],
+            detector_version=PositionCloseDetector.get_version()
+        ).select_related()
+        loaded = 0
+        for resolved_signal in resolved_signals:
+            key = resolved_signal.get_key()
+            if key in keys_to_load:
+                self.resolved_signals[key] = resolved_signal
+                loaded += 1
+        logger.info(f'Preloaded {loaded} of {len(keys_to_load)} resolved signals')
+
+    def is_resolved(self, message):
+        return self.get_key(message) in self.resolved_signals
+
+    def get(self, message):
+        """ resolved signals are kept in memory until clear, saved to database only if enabled """
+        key = self.get_key(message)
+        resolved_signal = self.resolved_signals.get(key)
+        if resolved_signal is None and config.RESOLVED_SIGNALS_ENABLED:
+            id_universal, detector_version, processor_version, text_hash = key
+            resolved_signal = ResolvedSignal.objects.filter(
+                id_universal=id_universal,
+                detector_version=detector_version,
+                processor_version=processor_version,
+                text_hash=text_hash
+            ).first()
+
+        if resolved_signal is None:
+            self.misses += 1
+            resolved_signal = self.resolve(message, key)
+            if config.RESOLVED_SIGNALS_ENABLED:
+                resolved_signal.save()
+        else:
+            self.hits += 1
+        self.resolved_signals[key] = resolved_signal
+        return resolved_signal
+
+    def add(self, message, decision_signal):
+        """ resolves decision already processed from message, e.g. decision which isn't saved to database """
+        key = self.get_key(message)
+        self.resolved_signals[key] = self.resolve_decision(decision_signal, key)
+        return self.resolved_signals[key]
+
+    @classmethod
+    def resolve(cls, message, key):
+        return cls.resolve_decision(ProcessSignalManager.get_decision_signal(message), key)
+
+    @staticmethod
+    def resolve_decision(decision_signal, key):
+        take_profits_closed_dates, stop_loss_closed_date = PositionCloseDetector.detect(decision_signal)
+
+        if decision_signal.initial_price is not None:
+            initial_price, retries = float(decision_signal.initial_price), None
+        else:
+            initial_price, retries = get_initial_price_of_nearest_historic_row_date_for_pair(
+                pair=decision_signal.pair, date=decision_signal.date
+            )
+
+        id_universal, detector_version, processor_version, text_hash = key
+        resolved_signal = ResolvedSignal(
+            id_universal=id_universal,
+            detector_version=detector_version,
+            processor_version=processor_version,
+            text_hash=text_hash,
+            decision=decision_signal,
+            initial_price=initial_price,
+            initial_price_retries=retries,
+            stop_loss_closed_date=stop_loss_closed_date
+        )
+        resolved_signal.set_take_profits_closed_dates(take_profits_closed_dates)
+        return resolved_signal
+
+    def clear(self):
+        self.resolved_signals.clear()
+
+    def log_stats(self):
+        if config.RESOLVED_SIGNALS_ENABLED:
+            logger.info(f'Resolved signals reused: {self.hits}, resolved again: {self.misses}')
+
+
+signal_resolver = SignalResolver()
@@ -17,7 +17,7 @@ class Wallet:
     def on_transaction_open(self):
         if self.amount - self.backtest.config.amount_single_transaction > 0:
             self.amount -= self.backtest.config.amount_single_transaction
-            logger.info(f'Amount we get from wallet: {self.backtest.amount_single_transaction} '
+            logger.info(f'Amount we get from wallet: {self.backtest.config.amount_single_transaction} '
                         f'Now in our wallet we have: {self.amount}')
             return self.backtest.config.amount_single_transaction
         else:
@@ -0,0 +1,23 @@
+"""
+Initializers of worker processes shared by process pools of backtest (BacktestGrid, PreBacktestPipeline).
+"""
+from mongoengine import register_connection, disconnect_all
+
+from app.processing.cache import process_cache
+from app.processing.process_signal import MAPPING_PROCESS_SIGNAL
+from database import connect_to_db, DB_BACKTEST, MONGO_HOST, MONGO_PORT
+
+
+def init_worker():
+    """ mongo clients must not be shared between processes, every worker connects on its own """
+    disconnect_all()
+    connect_to_db()
+    register_connection(DB_BACKTEST,
+                        db=DB_BACKTEST, name=DB_BACKTEST,
+                        host=MONGO_HOST, port=MONGO_PORT)
+
+
+def init_process_worker(channel_name):
+    """ connects worker to database and loads cached decisions of channel once per worker """
+    init_worker()
+    process_cache.preload(MAPPING_PROCESS_SIGNAL.get(channel_name))
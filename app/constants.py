@@ -8,3 +8,4 @@ PATH_HISTORICAL_PRICES_ABSOLUTE = "/Users/rafaldolega/Desktop/HIST_DATA_2018"
 
 PATH_DOWNLOADS = '/Users/rafaldolega/Downloads'
 DOCKER_CONTAINER_HIST_DATA_DIRECTORY_PATH = '/histdata/'
+PATH_PRICE_STORE = '/histdata_columnar/'
@@ -0,0 +1,35 @@
+import datetime
+
+from mongoengine import Document, StringField, DateTimeField, ReferenceField, IntField
+
+from app.models.choices import ChannelNameChoices, ProcessingCacheStageChoices
+from app.models.decisions import DecisionSignal
+from app.models.messages import Message
+
+
+class ProcessingCacheEntry(Document):
+    """
+    Output of recognise or process stage for one message. Entry is valid as long as
+    text of message and version of processor which produced it don't change.
+    Failed processing is stored too (error_name, error_message) and raised again from cache.
+    """
+    created_at = DateTimeField(default=datetime.datetime.now)
+    stage = StringField(choices=ProcessingCacheStageChoices.choices, required=True)
+    channel = StringField(choices=ChannelNameChoices.choices, required=True)
+    id_internal = StringField(required=True)
+    text_hash = StringField(required=True)
+    processor_version = IntField(required=True)
+
+    message = ReferenceField(Message)
+    decision = ReferenceField(DecisionSignal)
+    error_name = StringField()
+    error_message = StringField()
+
+    meta = {
+        'indexes': [
+            {'fields': ('stage', 'channel', 'processor_version', 'id_internal', 'text_hash'), 'unique': True},
+        ]
+    }
+
+    def get_key(self):
+        return self.channel, self.id_internal, self.text_hash, self.processor_version
@@ -191,3 +191,10 @@ class AmountInvestedCurrenciesChoices:
     USD = 'USD'
 
     choices = (PLN, EUR, USD,)
+
+
+class ProcessingCacheStageChoices:
+    RECOGNISE = 'recognise'
+    PROCESS = 'process'
+
+    choices = (RECOGNISE, PROCESS,)
@@ -1,10 +1,12 @@
 import datetime
+from collections import OrderedDict
 
 from mongoengine import (
     Document,
     StringField, DateTimeField,
     ReferenceField, DecimalField,
-    IntField, ListField, DictField
+    IntField, ListField, DictField,
+    FloatField, DynamicField
 )
 
 from app.models.choices import (
@@ -77,3 +79,44 @@ class CorrectionActionCancelAll(DecisionCorrection):
 
 class CorrectionActionHold(DecisionCorrection):
     add_days_amount = IntField()
+
+
+class ResolvedSignal(Document):
+    """
+    Result of resolving DecisionSignal against prices: when its take profits and stop loss were crossed
+    and initial price of pair. It doesn't depend on wallet or strategy, so backtests of the same messages
+    with other strategy or amounts replay it instead of detecting crossings again.
+    """
+    created_at = DateTimeField(default=datetime.datetime.now)
+    id_universal = StringField(required=True)
+    detector_version = StringField(required=True)
+    # version of signal processor and hash of message text which decision was processed from
+    processor_version = IntField(required=True)
+    text_hash = StringField(required=True)
+    decision = ReferenceField(DecisionSignal)
+    initial_price = FloatField(null=True)
+    initial_price_retries = IntField(null=True)
+    # order_number (as str) -> closed date or PositionCloseDetector.NOT_FOUND / None
+    take_profits_closed_dates = DictField()
+    stop_loss_closed_date = DynamicField(null=True)
+
+    meta = {
+        'indexes': [
+            {'fields': ('id_universal', 'detector_version', 'processor_version', 'text_hash'), 'unique': True},
+        ]
+    }
+
+    def get_key(self):
+        return self.id_universal, self.detector_version, self.processor_version, self.text_hash
+
+    def get_take_profits_closed_dates(self):
+        """ in the same order as take profits of decision, like PositionCloseDetector.detect returns them """
+        return OrderedDict(
+            (int(order_number), closed_date)
+            for order_number, closed_date in self.take_profits_closed_dates.items()
+        )
+
+    def set_take_profits_closed_dates(self, take_profits_closed_dates):
+        self.take_profits_closed_dates = {
+            str(order_number): closed_date for order_number, closed_date in take_profits_closed_dates.items()
+        }
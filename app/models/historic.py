@@ -6,8 +6,7 @@ from database import DB_BACKTEST
 
 class HistoricRow(Document):
     pair = fields.StringField(
-        choices=pairs.pairs_without_slash,
-        unique_with='date'
+        choices=pairs.pairs_without_slash
     )
     date = fields.DateTimeField()
     open = fields.FloatField()
@@ -17,7 +16,11 @@ class HistoricRow(Document):
     volume = fields.FloatField()
 
     meta = {
-        "db_alias": DB_BACKTEST
+        "db_alias": DB_BACKTEST,
+        "indexes": [
+            # detector fetches pair in date range, initial price fetches exact pair+date
+            {"fields": ("pair", "date"), "unique": True},
+        ]
     }
 
     def __str__(self):
@@ -12,6 +12,9 @@ from app.models.choices import MessageTypeChoices, MessageStatusChoices
 
 logger = logging.getLogger(__name__)
 
+MESSAGES_LOOKUP_CHUNK_SIZE = 1000
+MESSAGES_INSERT_CHUNK_SIZE = 1000
+
 
 class Message(DynamicDocument):
     created_at = DateTimeField(default=datetime.now())
@@ -25,9 +28,44 @@ class Message(DynamicDocument):
     type = StringField(choices=MessageTypeChoices.choices)
     quoted_message = ReferenceField('Message', default=None)
 
+    meta = {
+        'indexes': [
+            # latest message of id_universal, see get_latest_by_id_universal
+            {'fields': ('id_universal', '-created_at')},
+        ]
+    }
+
     def __str__(self):
         return f"{self.id_universal}: {self.text[:20]}"
 
+    @classmethod
+    def get_latest_by_id_universal(cls, ids_universal, chunk_size=MESSAGES_LOOKUP_CHUNK_SIZE):
+        """
+        Latest (by created_at) message of every id_universal, fetched with one aggregation per chunk of ids.
+        :return: dict id_universal -> Message, ids without any message are missing
+        """
+        ids_universal = list(dict.fromkeys(ids_universal))
+        messages = {}
+        for start in range(0, len(ids_universal), chunk_size):
+            documents = cls._get_collection().aggregate([
+                {'$match': {'id_universal': {'$in': ids_universal[start:start + chunk_size]}}},
+                {'$sort': {'id_universal': 1, 'created_at': -1, '_id': -1}},
+                {'$group': {'_id': '$id_universal', 'document': {'$first': '$$ROOT'}}},
+            ])
+            for document in documents:
+                messages[document['_id']] = cls._from_son(document['document'])
+        return messages
+
+    @classmethod
+    def insert_many(cls, messages, chunk_size=MESSAGES_INSERT_CHUNK_SIZE):
+        """ validates and inserts not saved messages with one insert per chunk """
+        for message in messages:
+            if message.id_universal is None:
+                message.id_universal = message.get_universal_id()
+            message.validate()
+        for start in range(0, len(messages), chunk_size):
+            cls.objects.insert(messages[start:start + chunk_size], load_bulk=False)
+
     def save(self, *args, **kwargs):
         if not self.id:
             self.id_universal = self.get_universal_id()
@@ -52,7 +90,7 @@ class Message(DynamicDocument):
         return f"{message['channel']['name']}__{message['id_internal']}"
 
     def to_json_representation(self):
-        _json_repr = self._data
+        _json_repr = dict(self._data)  # copy, so channel of message isn't replaced with its data
         _json_repr['channel'] = self.channel._data
         if self.quoted_message is not None:
             _json_repr['quoted_message'] = self.quoted_message.to_json_representation()
@@ -160,11 +160,8 @@ class Transaction(DynamicDocument):
         else:
             self.is_ratio_suspicious = False
 
-        self.save()
-
     def on_initial_price_not_found(self):
         self.status = TransactionStatusChoices.INITIAL_PRICE_NOT_FOUND
-        self.save()
 
     def get_closed_take_profits_result(self):
         result = 0
@@ -0,0 +1,84 @@
+from collections import deque
+
+from app.pairs import pairs_without_slash_lower
+
+
+class PairMatcher:
+    """
+    Aho-Corasick automaton of pairs. All pairs occurring in text (overlapping ones too)
+    are found in one pass over text, instead of testing every pair with `pair in text`.
+    Matching is case insensitive and characters from ignore_characters are skipped
+    while scanning, which replaces text.replace(' ', '').replace('/', '').
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.pattern_order = {pattern: order for order, pattern in enumerate(self.patterns)}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern in self.patterns:
+            self.add_pattern(pattern)
+        self.build_fail_links()
+
+    def add_pattern(self, pattern):
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append(pattern)
+
+    def build_fail_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find_all(self, text, ignore_characters=''):
+        """ :return: list of (start index in text, pattern) in order of occurrence """
+        hits = []
+        positions = deque(maxlen=max(map(len, self.patterns), default=0))
+        state = 0
+        for index, char in enumerate(text):
+            if char in ignore_characters:
+                continue
+            for char_lower in char.lower():
+                positions.append(index)
+                while state and char_lower not in self.goto[state]:
+                    state = self.fail[state]
+                state = self.goto[state].get(char_lower, 0)
+                for pattern in self.output[state]:
+                    hits.append((positions[-len(pattern)], pattern))
+        return hits
+
+    def find_patterns(self, text_lower):
+        """ :return: set of patterns occurring in already lowercased text, without their positions """
+        found = set()
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text_lower:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def get_pairs(self, text, ignore_characters=''):
+        """ every pair found in text once, in order of pairs list (like iterating it with `pair in text`) """
+        if ignore_characters:
+            text = text.translate(str.maketrans('', '', ignore_characters))
+        return sorted(self.find_patterns(text.lower()), key=self.pattern_order.get)
+
+
+pair_matcher = PairMatcher(pairs_without_slash_lower)
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark of signal processors: per-message cost of extracting pair, type, take profits
+and stop loss from fixture signals of every channel. Nothing is read from or saved to database.
+
+    python -m app.processing.benchmark [repeat]
+"""
+import logging
+import sys
+import time
+
+from app.models import choices
+from app.models.channels import Channel
+from app.models.messages import Message
+from app.processing.process_signal import MAPPING_PROCESS_SIGNAL
+from app.processing.tokenizer import get_message_tokens
+
+FIXTURE_SIGNALS = {
+    choices.ChannelNameChoices.GAFOREX: [
+        "EURUSD SELL 1.1850\nTP 1.1820\nTP 1.1790\nSL 1.1900",
+        "GBPJPY BUY 140.50\nTP 141.00\nTP 141.50\nTP 142.00\nSL: 139.80 (70+pips)",
+        "AUDUSD sell now 0.7350\nTP 0.7320\nSL 0.7390",
+    ],
+    choices.ChannelNameChoices.SURE_SHOT_FOREX: [
+        "USDCAD BUY 1.2550\nTP 1.2580\nTP 1.2610\nSL @ 1.2510",
+        "EURJPY SELL 129.40\nTP 129.00\nTP 128.60\nTP open\nSL – 129.90",
+        "NZDUSD buy 0.7100\nTP 0.7130\nSL 0.7060 (40+pips)",
+    ],
+    choices.ChannelNameChoices.LIFESTYLE_PIP_FX: [
+        "EUR/USD BUY 1.1850\nTake profit 1.1880\nTake profit 1.1910\nStop loss 1.1810",
+        "GBP/USD SELL 1.3850\nT/P 1.3820\nS/L 1.3890",
+    ],
+    choices.ChannelNameChoices.SMART_TRADE_SOLUTIONS: [
+        "XAUUSD BUY 1780\nTP1 1785\nTP2 1790\nSL 1770",
+        "USD/JPY sell 110.20\nTP 109.90\nTP 109.60\nSL 110.60",
+    ],
+    choices.ChannelNameChoices.BLUECAPITAL_FX: [
+        "EURGBP SELL 0.8600\nTP 0.8570\nSL 0.8640",
+        "CADJPY BUY 88.50 SL: 88.10 TP 89.00",
+    ],
+    choices.ChannelNameChoices.EUPHORIA_TRADING: [
+        "Sell now 1.3750 GBPUSD\nTP 1.3720\nTP 1.3690\nSL 1.3790",
+        "Buy now @ 0.7420 AUDUSD\nTake profit 0.7450\nStop loss 0.7390",
+    ],
+    choices.ChannelNameChoices.PIPSMEUP: [
+        "Sell now 1.1820 EURUSD\nTP 1.1790\nTP 1.1760\nSL 1.1860",
+        "Buy now 145.20 GBPJPY\nTP 145.60\nSL 144.80",
+    ],
+    choices.ChannelNameChoices.FX_SCORPIONS: [
+        "Sell now 1.2650 USDCAD\nTP 1.2620\nTP 1.2590\nSL 1.2690",
+        "Buy now 1790 XAUUSD\nTP 1795\nTP 1800\nSL 1780",
+    ],
+}
+
+logger = logging.getLogger(__file__)
+
+
+def get_fixture_messages():
+    """ :return: list of (processor, unsaved Message) """
+    messages = []
+    for channel_name, texts in FIXTURE_SIGNALS.items():
+        channel = Channel(name=channel_name)
+        for nr, text in enumerate(texts):
+            message = Message(id_internal=str(nr), channel=channel, text=text)
+            messages.append((MAPPING_PROCESS_SIGNAL[channel_name], message))
+    return messages
+
+
+def parse_message(processor, message):
+    result = {
+        'pair': processor.get_pair(message),
+        'type': processor.get_type(message),
+        'take_profits': processor.get_take_profits(message),
+        'stop_loss': processor.get_stop_loss(message),
+    }
+    if hasattr(processor, 'get_initial_price'):
+        result['initial_price'] = processor.get_initial_price(message)
+    return result
+
+
+def run_benchmark(repeat=2000):
+    """ :return: mean seconds of parsing one fixture message """
+    messages = get_fixture_messages()
+    logging.disable(logging.CRITICAL)  # processors log doubtful take profits, don't measure logging
+    try:
+        time_start = time.perf_counter()
+        for _ in range(repeat):
+            get_message_tokens.cache_clear()  # every repeat tokenizes messages again, like new messages
+            for processor, message in messages:
+                parse_message(processor, message)
+        seconds = time.perf_counter() - time_start
+    finally:
+        logging.disable(logging.NOTSET)
+    return seconds / (repeat * len(messages))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    logger.info(f'Parsing fixture signal took {run_benchmark(repeat) * 1e6:.1f}us per message')
@@ -0,0 +1,145 @@
+import hashlib
+import logging
+
+from mongoengine import NotUniqueError, ValidationError
+
+from app.backtest import config
+from app.exceptions import process as process_exceptions
+from app.models.cache import ProcessingCacheEntry
+from app.models.choices import ProcessingCacheStageChoices
+
+logger = logging.getLogger(__name__)
+
+# deterministic failures of processing, the same message always fails the same way so they are cached.
+# Other errors (e.g. lost database connection) are raised without being cached, next run tries again.
+CACHED_ERRORS = tuple(
+    error for error in vars(process_exceptions).values()
+    if isinstance(error, type) and issubclass(error, Exception)
+) + (ValidationError,)
+CACHED_ERRORS_BY_NAME = {error.__name__: error for error in CACHED_ERRORS}
+
+
+def get_text_hash(text):
+    return hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+
+
+def get_cached_error(entry):
+    """ exception of the same class and text as the one raised when entry was created """
+    exception_class = CACHED_ERRORS_BY_NAME.get(entry.error_name)
+    if exception_class is None:
+        return Exception(entry.error_message)
+    error = exception_class.__new__(exception_class)
+    error.args = (entry.error_message,)
+    return error
+
+
+class ProcessingCache:
+    """
+    Outputs of recognise/process stage stored as ProcessingCacheEntry and keyed by
+    (channel, id_internal, text hash, processor version), so unchanged messages are not parsed
+    and saved again on every run. Entries of channel can be loaded with one query by preload.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(processor, id_internal, text):
+        return processor.name, str(id_internal), get_text_hash(text), processor.version
+
+    def preload(self, processor):
+        if not config.PROCESSING_CACHE_ENABLED or processor is None:
+            return
+        entries = ProcessingCacheEntry.objects.filter(
+            stage=self.stage, channel=processor.name, processor_version=processor.version
+        ).select_related()
+        for entry in entries:
+            self.entries[entry.get_key()] = entry
+        logger.info(f'Preloaded {len(self.entries)} {self.stage} cache entries of channel={processor.name}')
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            channel, id_internal, text_hash, processor_version = key
+            entry = ProcessingCacheEntry.objects.filter(
+                stage=self.stage, channel=channel, id_internal=id_internal,
+                text_hash=text_hash, processor_version=processor_version
+            ).first()
+        if entry is not None:
+            self.hits += 1
+            self.entries[key] = entry
+        else:
+            self.misses += 1
+        return entry
+
+    def add(self, key, **outputs):
+        channel, id_internal, text_hash, processor_version = key
+        entry = ProcessingCacheEntry(
+            stage=self.stage, channel=channel, id_internal=id_internal,
+            text_hash=text_hash, processor_version=processor_version, **outputs
+        )
+        try:
+            entry.save()
+        except NotUniqueError:
+            logger.warning(f'{self.stage} cache entry of message(id_internal={id_internal}) '
+                           f'has been already added')
+        self.entries[key] = entry
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+
+    def log_stats(self):
+        logger.info(f'{self.stage} cache hits: {self.hits}, misses: {self.misses}')
+
+
+class RecogniseCache(ProcessingCache):
+
+    def __init__(self):
+        super().__init__(ProcessingCacheStageChoices.RECOGNISE)
+
+    def get_recognised_message(self, processor, message_json):
+        if not config.PROCESSING_CACHE_ENABLED:
+            return processor.get_recognised_message_type(message_json)
+
+        key = self.get_key(processor, processor.get_id_internal(message_json), processor.get_text(message_json))
+        entry = self.get(key)
+        if entry is not None and entry.message is not None:
+            return entry.message
+
+        message = processor.get_recognised_message_type(message_json)
+        self.add(key, message=message)
+        return message
+
+
+class ProcessCache(ProcessingCache):
+
+    def __init__(self):
+        super().__init__(ProcessingCacheStageChoices.PROCESS)
+
+    def get_decision(self, processor, message):
+        if not config.PROCESSING_CACHE_ENABLED:
+            return processor.get_decision(message)
+
+        key = self.get_key(processor, message.id_internal, message.text)
+        entry = self.get(key)
+        if entry is not None:
+            if entry.error_name:
+                raise get_cached_error(entry)
+            if entry.decision is not None:
+                return entry.decision
+
+        try:
+            decision = processor.get_decision(message)
+        except CACHED_ERRORS as e:
+            self.add(key, error_name=type(e).__name__, error_message=str(e))
+            raise
+        self.add(key, decision=decision)
+        return decision
+
+
+recognise_cache = RecogniseCache()
+process_cache = ProcessCache()
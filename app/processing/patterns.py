@@ -0,0 +1,24 @@
+"""
+Regular expressions used by signal processors, compiled once at import time and shared
+by all ProcessorSignal* classes instead of being compiled (or looked up in re cache) per message and line.
+"""
+import re
+
+# price with at least 2 digits, e.g. 1.2345, 12.5, 150
+PRICE_WITH_DOT = re.compile(r'(\d*\.?\d+){2}')
+# any price, e.g. 1.2345, 15
+PRICE = re.compile(r'([\d*]+\.?\d+)')
+# "sl" prefix of stop loss line
+STOP_LOSS_PREFIX = re.compile(r'[sS][lL]')
+# separators between "sl" and stop loss price
+STOP_LOSS_SYMBOLS = re.compile(r'[-!: ]')
+STOP_LOSS_SYMBOLS_EXTENDED = re.compile(r'[-!:@– ]')
+# number of pips at the end of stop loss line, e.g. (84+pips), (123+pips)
+NUMBER_OF_PIPS_AT_END = re.compile(r'(\([0-9]{1,3}\.?([0-9]{1})?\+pips\))$')
+# stop loss given in pips instead of price, e.g. SL 50 pips
+STOP_LOSS_RELATIVE_PIPS_AMOUNT = re.compile(r'[sS][lL]\ {1,5}\d{1,3}\ {1,5}pips')
+# stop loss with price in one line message, e.g. "EURUSD buy 1.1 sl: 1.09 tp 1.2"
+STOP_LOSS_IN_ONE_LINE = re.compile(r'[Ss][Ll]\s*[:\-! ]{1}\s*\d*\.?\d*')
+STOP_LOSS_PRICE = re.compile(r'[\d]*\.\d*')
+# "sell now 1.1234" / "buy now @ 1.1234" line
+BUY_SELL_NOW_PRICE = re.compile(r'(([sS][eE][lL]{1,2})|([bB][uU][yY]))\s*([nN][oO][wW])\s*@?\s*(\d*\.?\d+)')
@@ -88,7 +88,7 @@ class ProcessorCorrectionGaForex(ProcessorCorrectionBase):
             logger.error(f"Message text is none."
                          f"Message.uuid={message.get_universal_id()}")
             return False, 0
-        message_text_lower = message.text.lower()
+        message_text_lower = message['text'].lower()
 
         if "hold" in message_text_lower and "weekend" in message_text_lower:
             return True, 3
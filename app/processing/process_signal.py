@@ -1,5 +1,4 @@
 import logging
-import re
 
 from app.exceptions.process import (
     DecisionSignalPairNotFound,
@@ -11,13 +10,18 @@ from app.exceptions.process import (
 from app.models import choices
 from app.models.choices import DecisionSignalTypeChoices
 from app.models.decisions import DecisionSignal
-from app.pairs import pairs_without_slash
+from app.pairs.matcher import pair_matcher
+from app.processing import patterns
+from app.processing.cache import process_cache
+from app.processing.tokenizer import get_message_tokens
 
 logger = logging.getLogger(__file__)
 
 
 class ProcessorSignalBase:
 
+    version = 1  # bump when processing changes, cached decisions of other versions are not used
+
     @staticmethod
     def get_decision(message):
         raise NotImplementedError
@@ -60,25 +64,27 @@ class ProcessorSignalGaForex(ProcessorSignalBase):
 
     @classmethod
     def get_pair(cls, message):
+        tokens = get_message_tokens(message.text)
         try:
-            return ([p for p in pairs_without_slash if p.lower() in message.text.lower()][0]).upper()
+            return pair_matcher.get_pairs(tokens.text_lower)[0].upper()
         except IndexError:
-            if "gold" in message.text.lower():
+            if tokens.has_keyword('gold'):
                return "XAUUSD"
             print(f"Not found any pair in message_text={message.text}")
             raise DecisionSignalPairNotFound(message.get_universal_id(), message.text)
 
     @classmethod
     def get_take_profits(cls, message):
-        message_parts = message.text.split("\n")
-        message_tps = [msg_part for msg_part in message_parts
-                       if 'tp' in msg_part.lower() and 'http' not in msg_part.lower()]
+        tokens = get_message_tokens(message.text)
+        http_lines = tokens.get_lines('http')
+        tp_lines = [index for index in tokens.get_lines('tp') if index not in http_lines]
+        message_tps = [tokens.lines[index] for index in tp_lines]
         take_profits = []
-        for order_number, tp in enumerate(message_tps):
+        for order_number, (line_index, tp) in enumerate(zip(tp_lines, message_tps)):
             try:
                 take_profit = {
                     'order_number': order_number + 1,
-                    'price': cls.get_take_profit_from_tp_part(tp),
+                    'price': cls.get_take_profit_from_tp_line(tokens, line_index),
                     'is_last': message_tps.index(tp) == len(message_tps) - 1
                 }
                 take_profits.append(take_profit)
@@ -98,16 +104,14 @@ class ProcessorSignalGaForex(ProcessorSignalBase):
         return take_profits
 
     @classmethod
-    def get_take_profit_from_tp_part(cls, tp):
-
-        if 'open' in tp.lower():
+    def get_take_profit_from_tp_line(cls, tokens, line_index):
+        tp = tokens.lines[line_index]
+        if 'open' in tokens.lines_lower[line_index]:
             return -1
 
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        tp_price = pattern_price_with_dot.search(tp)
+        tp_price = tokens.get_first_number(line_index)
         if tp_price:
-            price = float(tp_price[0])
+            price = float(tp_price)
             if price in [1,2,3,4,5,6]:
                 logger.error(f"ARE WE SURE THAT WE PROCESSED TP CORRECTLY? "
                              f"price={price}, tp={tp}")
@@ -117,17 +121,13 @@ class ProcessorSignalGaForex(ProcessorSignalBase):
 
     @classmethod
     def get_stop_loss(cls, message):
-        pattern_sl_replace = re.compile('[sS][lL]')
-        pattern_symbols_replace = re.compile('[-!: ]')
-        pattern_number_of_pips_at_end = '(\([0-9]{1,3}\.?([0-9]{1})?\+pips\))$'   #(84+pips), (123+pips)
+        tokens = get_message_tokens(message.text)
+        if len(tokens.lines) > 1:
+            message_sl = tokens.lines[tokens.get_lines('sl')[0]]
 
-        message_parts = message.text.split("\n")
-        if len(message_parts) > 1:
-            message_sl = [msg_part for msg_part in message_parts if 'sl' in msg_part.lower()][0]
-
-            price_formatted = re.sub(pattern_sl_replace, "", message_sl)
-            price_formatted = re.sub(pattern_symbols_replace, '', price_formatted)
-            price_formatted = re.sub(pattern_number_of_pips_at_end, '', price_formatted)
+            price_formatted = patterns.STOP_LOSS_PREFIX.sub("", message_sl)
+            price_formatted = patterns.STOP_LOSS_SYMBOLS.sub('', price_formatted)
+            price_formatted = patterns.NUMBER_OF_PIPS_AT_END.sub('', price_formatted)
 
             try:
                 price = float(price_formatted)
@@ -137,12 +137,10 @@ class ProcessorSignalGaForex(ProcessorSignalBase):
                              f"Error={e}")
                 raise DecisionSignalStopLossNotFound(message.get_universal_id(), message.text)
         else:
-            pattern_stop_loss_in_one_line = re.compile('[Ss][Ll]\s*[:\-! ]{1}\s*\d*\.?\d*')
-            pattern_stop_loss = re.compile('[\d]*\.\d*')
-            sl_and_price = pattern_stop_loss_in_one_line.search(message.text)
+            sl_and_price = patterns.STOP_LOSS_IN_ONE_LINE.search(message.text)
             if sl_and_price:
                 stop_loss = sl_and_price[0]
-                stop_loss_price = pattern_stop_loss.search(stop_loss)[0]
+                stop_loss_price = patterns.STOP_LOSS_PRICE.search(stop_loss)[0]
                 try:
                     price = float(stop_loss_price)
                     return {'price': price}
@@ -153,11 +151,11 @@ class ProcessorSignalGaForex(ProcessorSignalBase):
 
     @classmethod
     def get_type(cls, message):
-        message_text_lower = message.text.lower()
+        tokens = get_message_tokens(message.text)
 
-        if "sell" in message_text_lower:
+        if tokens.has_keyword('sell'):
             return DecisionSignalTypeChoices.SHORT
-        elif "buy" in message_text_lower:
+        elif tokens.has_keyword('buy'):
             return DecisionSignalTypeChoices.LONG
         else:
             raise DecisionSignalTypeUndefined(
@@ -198,28 +196,28 @@ class ProcessorSignalSureShotForex(ProcessorSignalBase):
 
     @classmethod
     def get_pair(cls, message):
+        tokens = get_message_tokens(message.text)
         try:
-            return (
-                [p for p in pairs_without_slash if p.lower() in message.text.lower()][0]
-            ).upper()
+            return pair_matcher.get_pairs(tokens.text_lower)[0].upper()
         except IndexError:
-            if "gold" in message.text.lower():
+            if tokens.has_keyword('gold'):
                return "XAUUSD"
             print(f"Not found any pair in message_text={message.text}")
             raise DecisionSignalPairNotFound(message.get_universal_id(), message.text)
 
     @classmethod
     def get_take_profits(cls, message):
-        message_parts = message.text.split("\n")
-        message_tps = [msg_part for msg_part in message_parts
-                       if 'tp' in msg_part.lower() and 'http' not in msg_part.lower()]
+        tokens = get_message_tokens(message.text)
+        http_lines = tokens.get_lines('http')
+        tp_lines = [index for index in tokens.get_lines('tp') if index not in http_lines]
+        message_tps = [tokens.lines[index] for index in tp_lines]
         take_profits = []
 
-        for order_number, tp in enumerate(message_tps):
+        for order_number, (line_index, tp) in enumerate(zip(tp_lines, message_tps)):
             try:
                 take_profit = {
                     'order_number': order_number + 1,
-                    'price': cls.get_take_profit_from_tp_part(tp),
+                    'price': cls.get_take_profit_from_tp_line(tokens, line_index),
                     'is_last': message_tps.index(tp) == len(message_tps) - 1
                 }
                 take_profits.append(take_profit)
@@ -236,16 +234,14 @@ class ProcessorSignalSureShotForex(ProcessorSignalBase):
         return take_profits
 
     @classmethod
-    def get_take_profit_from_tp_part(cls, tp):
-
-        if 'open' in tp.lower():
+    def get_take_profit_from_tp_line(cls, tokens, line_index):
+        tp = tokens.lines[line_index]
+        if 'open' in tokens.lines_lower[line_index]:
             return -1
 
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        tp_price = pattern_price_with_dot.search(tp)
+        tp_price = tokens.get_first_number(line_index)
         if tp_price:
-            price = float(tp_price[0])
+            price = float(tp_price)
             if price in [1,2,3,4,5,6]:
                 logger.error(f"ARE WE SURE THAT WE PROCESSED TP CORRECTLY? "
                              f"price={price}, tp={tp}")
@@ -255,20 +251,15 @@ class ProcessorSignalSureShotForex(ProcessorSignalBase):
 
     @classmethod
     def get_stop_loss(cls, message):
-        pattern_sl_replace = re.compile('[sS][lL]')
-        pattern_symbols_replace = re.compile('[-!:@– ]')
-        pattern_number_of_pips_at_end = '(\([0-9]{1,3}\.?([0-9]{1})?\+pips\))$'   #(84+pips), (123+pips)
-        pattern_stop_loss_relative_pips_amount = '[sS][lL]\ {1,5}\d{1,3}\ {1,5}pips'  # SL 50 pips
+        tokens = get_message_tokens(message.text)
 
-        message_parts = message.text.split("\n")
+        if len(tokens.lines) > 1:
 
-        if len(message_parts) > 1:
+            message_sl = tokens.lines[tokens.get_lines('sl')[0]]
 
-            message_sl = [msg_part for msg_part in message_parts if 'sl' in msg_part.lower()][0]
-
-            price_formatted = re.sub(pattern_sl_replace, "", message_sl)
-            price_formatted = re.sub(pattern_symbols_replace, '', price_formatted)
-            price_formatted = re.sub(pattern_number_of_pips_at_end, '', price_formatted)
+            price_formatted = patterns.STOP_LOSS_PREFIX.sub("", message_sl)
+            price_formatted = patterns.STOP_LOSS_SYMBOLS_EXTENDED.sub('', price_formatted)
+            price_formatted = patterns.NUMBER_OF_PIPS_AT_END.sub('', price_formatted)
 
             try:
                 price = float(price_formatted)
@@ -279,12 +270,10 @@ class ProcessorSignalSureShotForex(ProcessorSignalBase):
                              f"Error={e}")
                 raise DecisionSignalStopLossNotFound(message.get_universal_id(), message.text)
         else:
-            pattern_stop_loss_in_one_line = re.compile('[Ss][Ll]\s*[:\-! ]{1}\s*\d*\.?\d*')
-            pattern_stop_loss = re.compile('[\d]*\.\d*')
-            sl_and_price = pattern_stop_loss_in_one_line.search(message.text)
+            sl_and_price = patterns.STOP_LOSS_IN_ONE_LINE.search(message.text)
             if sl_and_price:
                 stop_loss = sl_and_price[0]
-                stop_loss_price = pattern_stop_loss.search(stop_loss)[0]
+                stop_loss_price = patterns.STOP_LOSS_PRICE.search(stop_loss)[0]
                 try:
                     price = float(stop_loss_price)
                     return {'price': price}
@@ -296,11 +285,11 @@ class ProcessorSignalSureShotForex(ProcessorSignalBase):
 
     @classmethod
     def get_type(cls, message):
-        message_text_lower = message.text.lower()
+        tokens = get_message_tokens(message.text)
 
-        if "sell" in message_text_lower:
+        if tokens.has_keyword('sell'):
             return DecisionSignalTypeChoices.SHORT
-        elif "buy" in message_text_lower:
+        elif tokens.has_keyword('buy'):
             return DecisionSignalTypeChoices.LONG
         else:
             raise DecisionSignalTypeUndefined(
@@ -335,33 +324,27 @@ class ProcessorSignalLifestylePipsFx(ProcessorSignalBase):
 
     @classmethod
     def get_pair(cls, message):
+        tokens = get_message_tokens(message.text)
         try:
-            return (
-                [p for p in pairs_without_slash
-                 if p.lower() in message.text.replace(' ', '').replace('/', '').lower()][0]
-            ).upper()
+            return pair_matcher.get_pairs(tokens.text_lower, ignore_characters=' /')[0].upper()
         except IndexError:
-            if "gold" in message.text.lower():
+            if tokens.has_keyword('gold'):
                return "XAUUSD"
             print(f"Not found any pair in message_text={message.text}")
             raise DecisionSignalPairNotFound(message.get_universal_id(), message.text)
 
     @classmethod
     def get_take_profits(cls, message):
-        message_parts = message.text.split("\n")
-        message_tps = [
-            msg_part for msg_part in message_parts
-            if bool(
-                [phrase for phrase in cls.take_profits_phrases if phrase in msg_part.lower()]
-            )
-        ]
+        tokens = get_message_tokens(message.text)
+        tp_lines = tokens.get_keyword_lines(*cls.take_profits_phrases)
+        message_tps = [tokens.lines[index] for index in tp_lines]
         take_profits = []
 
-        for order_number, tp in enumerate(message_tps):
+        for order_number, (line_index, tp) in enumerate(zip(tp_lines, message_tps)):
             try:
                 take_profit = {
                     'order_number': order_number + 1,
-                    'price': cls.get_take_profit_from_tp_part(tp),
+                    'price': cls.get_take_profit_from_tp_line(tokens, line_index),
                     'is_last': message_tps.index(tp) == len(message_tps) - 1
                 }
                 take_profits.append(take_profit)
@@ -378,17 +361,14 @@ class ProcessorSignalLifestylePipsFx(ProcessorSignalBase):
         return take_profits
 
     @classmethod
-    def get_take_profit_from_tp_part(cls, tp):
-
-        if 'open' in tp.lower():
+    def get_take_profit_from_tp_line(cls, tokens, line_index):
+        tp = tokens.lines[line_index]
+        if 'open' in tokens.lines_lower[line_index]:
             return -1
 
-        # pattern_price_with_dot = re.compile('\W\d*\.\d*')
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        tp_price = pattern_price_with_dot.search(tp)
+        tp_price = tokens.get_first_number(line_index)
         if tp_price:
-            price = float(tp_price[0])
+            price = float(tp_price)
             if price in [1,2,3,4,5,6]:
                 logger.error(f"ARE WE SURE THAT WE PROCESSED TP CORRECTLY? "
                              f"price={price}, tp={tp}")
@@ -398,22 +378,15 @@ class ProcessorSignalLifestylePipsFx(ProcessorSignalBase):
 
     @classmethod
     def get_stop_loss(cls, message):
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        message_parts = message.text.split("\n")
+        tokens = get_message_tokens(message.text)
 
-        if len(message_parts) > 1:
+        if len(tokens.lines) > 1:
 
-            message_sl = [
-                msg_part for msg_part in message_parts
-                if bool(
-                    [phrase for phrase in cls.stop_loss_phrases if phrase in msg_part.lower()]
-                )
-            ][0]
+            sl_line = tokens.get_keyword_lines(*cls.stop_loss_phrases)[0]
 
-            price_formatted = pattern_price_with_dot.search(message_sl)
+            price_formatted = tokens.get_first_number(sl_line)
             try:
-                price = float(price_formatted[0])
+                price = float(price_formatted)
                 return {'price': price}
             except ValueError as e:
                 logger.error(f"\nError while converting message_id={message.get_universal_id()}\n"
@@ -421,12 +394,10 @@ class ProcessorSignalLifestylePipsFx(ProcessorSignalBase):
                              f"Error={e}")
                 raise DecisionSignalStopLossNotFound(message.get_universal_id(), message.text)
         else:
-            pattern_stop_loss_in_one_line = re.compile('[Ss][Ll]\s*[:\-! ]{1}\s*\d*\.?\d*')
-            pattern_stop_loss = re.compile('[\d]*\.\d*')
-            sl_and_price = pattern_stop_loss_in_one_line.search(message.text)
+            sl_and_price = patterns.STOP_LOSS_IN_ONE_LINE.search(message.text)
             if sl_and_price:
                 stop_loss = sl_and_price[0]
-                stop_loss_price = pattern_stop_loss.search(stop_loss)[0]
+                stop_loss_price = patterns.STOP_LOSS_PRICE.search(stop_loss)[0]
                 try:
                     price = float(stop_loss_price)
                     return {'price': price}
@@ -438,11 +409,11 @@ class ProcessorSignalLifestylePipsFx(ProcessorSignalBase):
 
     @classmethod
     def get_type(cls, message):
-        message_text_lower = message.text.lower()
+        tokens = get_message_tokens(message.text)
 
-        if "sell" in message_text_lower:
+        if tokens.has_keyword('sell'):
             return DecisionSignalTypeChoices.SHORT
-        elif "buy" in message_text_lower:
+        elif tokens.has_keyword('buy'):
             return DecisionSignalTypeChoices.LONG
         else:
             raise DecisionSignalTypeUndefined(
@@ -477,34 +448,29 @@ class ProcessorSignalSmartTradeSolutions(ProcessorSignalBase):
 
     @classmethod
     def get_pair(cls, message):
+        tokens = get_message_tokens(message.text)
         try:
-            return (
-                [p for p in pairs_without_slash
-                 if p.lower() in message.text.replace(' ', '').replace('/', '').lower()][0]
-            ).upper()
+            return pair_matcher.get_pairs(tokens.text_lower, ignore_characters=' /')[0].upper()
         except IndexError:
-            if "gold" in message.text.lower():
+            if tokens.has_keyword('gold'):
                return "XAUUSD"
             print(f"Not found any pair in message_text={message.text}")
             raise DecisionSignalPairNotFound(message.get_universal_id(), message.text)
 
     @classmethod
     def get_take_profits(cls, message):
-        message_parts = message.text.split("\n")
-        message_tps = [
-            msg_part for msg_part in message_parts
-            if bool(
-                [phrase for phrase in cls.take_profits_phrases
-                 if phrase in msg_part.lower() and 'https' not in msg_part.lower()]
-            )
-        ]
+        tokens = get_message_tokens(message.text)
+        https_lines = tokens.get_lines('https')
+        tp_lines = [index for index in tokens.get_keyword_lines(*cls.take_profits_phrases)
+                    if index not in https_lines]
+        message_tps = [tokens.lines[index] for index in tp_lines]
         take_profits = []
 
-        for order_number, tp in enumerate(message_tps):
+        for order_number, (line_index, tp) in enumerate(zip(tp_lines, message_tps)):
             try:
                 take_profit = {
                     'order_number': order_number + 1,
-                    'price': cls.get_take_profit_from_tp_part(tp),
+                    'price': cls.get_take_profit_from_tp_line(tokens, line_index),
                     'is_last': message_tps.index(tp) == len(message_tps) - 1
                 }
                 take_profits.append(take_profit)
@@ -521,16 +487,14 @@ class ProcessorSignalSmartTradeSolutions(ProcessorSignalBase):
         return take_profits
 
     @classmethod
-    def get_take_profit_from_tp_part(cls, tp):
-
-        if 'open' in tp.lower():
+    def get_take_profit_from_tp_line(cls, tokens, line_index):
+        tp = tokens.lines[line_index]
+        if 'open' in tokens.lines_lower[line_index]:
             return -1
 
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        tp_price = pattern_price_with_dot.search(tp)
+        tp_price = tokens.get_first_number(line_index)
         if tp_price:
-            price = float(tp_price[0])
+            price = float(tp_price)
             if price in [1,2,3,4,5,6]:
                 logger.error(f"ARE WE SURE THAT WE PROCESSED TP CORRECTLY? "
                              f"price={price}, tp={tp}")
@@ -540,22 +504,15 @@ class ProcessorSignalSmartTradeSolutions(ProcessorSignalBase):
 
     @classmethod
     def get_stop_loss(cls, message):
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
+        tokens = get_message_tokens(message.text)
 
-        message_parts = message.text.split("\n")
+        if len(tokens.lines) > 1:
 
-        if len(message_parts) > 1:
-
-            message_sl = [
-                msg_part for msg_part in message_parts
-                if bool(
-                    [phrase for phrase in cls.stop_loss_phrases if phrase in msg_part.lower()]
-                )
-            ][0]
+            sl_line = tokens.get_keyword_lines(*cls.stop_loss_phrases)[0]
 
-            price_formatted = pattern_price_with_dot.search(message_sl)
+            price_formatted = tokens.get_first_number(sl_line)
             try:
-                price = float(price_formatted[0])
+                price = float(price_formatted)
                 return {'price': price}
             except ValueError as e:
                 logger.error(f"\nError while converting message_id={message.get_universal_id()}\n"
@@ -563,12 +520,10 @@ class ProcessorSignalSmartTradeSolutions(ProcessorSignalBase):
                              f"Error={e}")
                 raise DecisionSignalStopLossNotFound(message.get_universal_id(), message.text)
         else:
-            pattern_stop_loss_in_one_line = re.compile('[Ss][Ll]\s*[:\-! ]{1}\s*\d*\.?\d*')
-            pattern_stop_loss = re.compile('[\d]*\.\d*')
-            sl_and_price = pattern_stop_loss_in_one_line.search(message.text)
+            sl_and_price = patterns.STOP_LOSS_IN_ONE_LINE.search(message.text)
             if sl_and_price:
                 stop_loss = sl_and_price[0]
-                stop_loss_price = pattern_stop_loss.search(stop_loss)[0]
+                stop_loss_price = patterns.STOP_LOSS_PRICE.search(stop_loss)[0]
                 try:
                     price = float(stop_loss_price)
                     return {'price': price}
@@ -580,11 +535,11 @@ class ProcessorSignalSmartTradeSolutions(ProcessorSignalBase):
 
     @classmethod
     def get_type(cls, message):
-        message_text_lower = message.text.lower()
+        tokens = get_message_tokens(message.text)
 
-        if "sell" in message_text_lower:
+        if tokens.has_keyword('sell'):
             return DecisionSignalTypeChoices.SHORT
-        elif "buy" in message_text_lower:
+        elif tokens.has_keyword('buy'):
             return DecisionSignalTypeChoices.LONG
         else:
             raise DecisionSignalTypeUndefined(
@@ -619,34 +574,29 @@ class ProcessorSignalBlueCapitalFx(ProcessorSignalBase):
 
     @classmethod
     def get_pair(cls, message):
+        tokens = get_message_tokens(message.text)
         try:
-            return (
-                [p for p in pairs_without_slash
-                 if p.lower() in message.text.replace(' ', '').replace('/', '').lower()][0]
-            ).upper()
+            return pair_matcher.get_pairs(tokens.text_lower, ignore_characters=' /')[0].upper()
         except IndexError:
-            if "gold" in message.text.lower():
+            if tokens.has_keyword('gold'):
                return "XAUUSD"
             print(f"Not found any pair in message_text={message.text}")
             raise DecisionSignalPairNotFound(message.get_universal_id(), message.text)
 
     @classmethod
     def get_take_profits(cls, message):
-        message_parts = message.text.split("\n")
-        message_tps = [
-            msg_part for msg_part in message_parts
-            if bool(
-                [phrase for phrase in cls.take_profits_phrases
-                 if phrase in msg_part.lower() and 'https' not in msg_part.lower()]
-            )
-        ]
+        tokens = get_message_tokens(message.text)
+        https_lines = tokens.get_lines('https')
+        tp_lines = [index for index in tokens.get_keyword_lines(*cls.take_profits_phrases)
+                    if index not in https_lines]
+        message_tps = [tokens.lines[index] for index in tp_lines]
         take_profits = []
 
-        for order_number, tp in enumerate(message_tps):
+        for order_number, (line_index, tp) in enumerate(zip(tp_lines, message_tps)):
             try:
                 take_profit = {
                     'order_number': order_number + 1,
-                    'price': cls.get_take_profit_from_tp_part(tp),
+                    'price': cls.get_take_profit_from_tp_line(tokens, line_index),
                     'is_last': message_tps.index(tp) == len(message_tps) - 1
                 }
                 take_profits.append(take_profit)
@@ -663,16 +613,14 @@ class ProcessorSignalBlueCapitalFx(ProcessorSignalBase):
         return take_profits
 
     @classmethod
-    def get_take_profit_from_tp_part(cls, tp):
-
-        if 'open' in tp.lower():
+    def get_take_profit_from_tp_line(cls, tokens, line_index):
+        tp = tokens.lines[line_index]
+        if 'open' in tokens.lines_lower[line_index]:
             return -1
 
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        tp_price = pattern_price_with_dot.search(tp)
+        tp_price = tokens.get_first_number(line_index)
         if tp_price:
-            price = float(tp_price[0])
+            price = float(tp_price)
             if price in [1,2,3,4,5,6]:
                 logger.error(f"ARE WE SURE THAT WE PROCESSED TP CORRECTLY? "
                              f"price={price}, tp={tp}")
@@ -682,22 +630,15 @@ class ProcessorSignalBlueCapitalFx(ProcessorSignalBase):
 
     @classmethod
     def get_stop_loss(cls, message):
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
+        tokens = get_message_tokens(message.text)
 
-        message_parts = message.text.split("\n")
+        if len(tokens.lines) > 1:
 
-        if len(message_parts) > 1:
+            sl_line = tokens.get_keyword_lines(*cls.stop_loss_phrases)[0]
 
-            message_sl = [
-                msg_part for msg_part in message_parts
-                if bool(
-                    [phrase for phrase in cls.stop_loss_phrases if phrase in msg_part.lower()]
-                )
-            ][0]
-
-            price_formatted = pattern_price_with_dot.search(message_sl)
+            price_formatted = tokens.get_first_number(sl_line)
             try:
-                price = float(price_formatted[0])
+                price = float(price_formatted)
                 return {'price': price}
             except ValueError as e:
                 logger.error(f"\nError while converting message_id={message.get_universal_id()}\n"
@@ -705,12 +646,10 @@ class ProcessorSignalBlueCapitalFx(ProcessorSignalBase):
                              f"Error={e}")
                 raise DecisionSignalStopLossNotFound(message.get_universal_id(), message.text)
         else:
-            pattern_stop_loss_in_one_line = re.compile('[Ss][Ll]\s*[:\-! ]{1}\s*\d*\.?\d*')
-            pattern_stop_loss = re.compile('[\d]*\.\d*')
-            sl_and_price = pattern_stop_loss_in_one_line.search(message.text)
+            sl_and_price = patterns.STOP_LOSS_IN_ONE_LINE.search(message.text)
             if sl_and_price:
                 stop_loss = sl_and_price[0]
-                stop_loss_price = pattern_stop_loss.search(stop_loss)[0]
+                stop_loss_price = patterns.STOP_LOSS_PRICE.search(stop_loss)[0]
                 try:
                     price = float(stop_loss_price)
                     return {'price': price}
@@ -722,11 +661,11 @@ class ProcessorSignalBlueCapitalFx(ProcessorSignalBase):
 
     @classmethod
     def get_type(cls, message):
-        message_text_lower = message.text.lower()
+        tokens = get_message_tokens(message.text)
 
-        if "sell" in message_text_lower:
+        if tokens.has_keyword('sell'):
             return DecisionSignalTypeChoices.SHORT
-        elif "buy" in message_text_lower:
+        elif tokens.has_keyword('buy'):
             return DecisionSignalTypeChoices.LONG
         else:
             raise DecisionSignalTypeUndefined(
@@ -762,27 +701,22 @@ class ProcessorSignalEuphoriaTrading(ProcessorSignalBase):
 
     @classmethod
     def get_pair(cls, message):
+        tokens = get_message_tokens(message.text)
         try:
-            return (
-                [p for p in pairs_without_slash
-                 if p.lower() in message.text.replace(' ', '').replace('/', '').lower()][0]
-            ).upper()
+            return pair_matcher.get_pairs(tokens.text_lower, ignore_characters=' /')[0].upper()
         except IndexError:
-            if "gold" in message.text.lower():
+            if tokens.has_keyword('gold'):
                return "XAUUSD"
             print(f"Not found any pair in message_text={message.text}")
             raise DecisionSignalPairNotFound(message.get_universal_id(), message.text)
 
     @classmethod
     def get_initial_price(cls, message):
-        sell_now_price_regex = "(([sS][eE][lL]{1,2})|([bB][uU][yY]))\s*([nN][oO][wW])\s*@?\s*(\d*\.?\d+)"
-        sell_now_price_regex_compiled = re.compile(sell_now_price_regex)
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
+        tokens = get_message_tokens(message.text)
         try:
             sell_now_line = [
-                msg_part for msg_part in message.text.split('\n')
-                if bool(sell_now_price_regex_compiled.match(msg_part))
+                index for index in tokens.get_lines('now')
+                if patterns.BUY_SELL_NOW_PRICE.match(tokens.lines[index])
             ][0]
         except IndexError:
             logger.error(f'could not find sell now line in message_text={message.text}')
@@ -790,7 +724,7 @@ class ProcessorSignalEuphoriaTrading(ProcessorSignalBase):
 
         try:
             price = float(
-                pattern_price_with_dot.search(sell_now_line)[0]
+                tokens.get_first_number(sell_now_line)
             )
             return price
         except ValueError:
@@ -799,20 +733,16 @@ class ProcessorSignalEuphoriaTrading(ProcessorSignalBase):
 
     @classmethod
     def get_take_profits(cls, message):
-        message_parts = message.text.split("\n")
-        message_tps = [
-            msg_part for msg_part in message_parts
-            if bool(
-                [phrase for phrase in cls.take_profits_phrases if phrase in msg_part.lower()]
-            )
-        ]
+        tokens = get_message_tokens(message.text)
+        tp_lines = tokens.get_keyword_lines(*cls.take_profits_phrases)
+        message_tps = [tokens.lines[index] for index in tp_lines]
         take_profits = []
 
-        for order_number, tp in enumerate(message_tps):
+        for order_number, (line_index, tp) in enumerate(zip(tp_lines, message_tps)):
             try:
                 take_profit = {
                     'order_number': order_number + 1,
-                    'price': cls.get_take_profit_from_tp_part(tp),
+                    'price': cls.get_take_profit_from_tp_line(tokens, line_index),
                     'is_last': message_tps.index(tp) == len(message_tps) - 1
                 }
                 take_profits.append(take_profit)
@@ -829,16 +759,14 @@ class ProcessorSignalEuphoriaTrading(ProcessorSignalBase):
         return take_profits
 
     @classmethod
-    def get_take_profit_from_tp_part(cls, tp):
-
-        if 'open' in tp.lower():
+    def get_take_profit_from_tp_line(cls, tokens, line_index):
+        tp = tokens.lines[line_index]
+        if 'open' in tokens.lines_lower[line_index]:
             return -1
 
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        tp_price = pattern_price_with_dot.search(tp)
+        tp_price = tokens.get_first_number(line_index)
         if tp_price:
-            price = float(tp_price[0])
+            price = float(tp_price)
             if price in [1,2,3,4,5,6]:
                 logger.error(f"ARE WE SURE THAT WE PROCESSED TP CORRECTLY? "
                              f"price={price}, tp={tp}")
@@ -848,22 +776,15 @@ class ProcessorSignalEuphoriaTrading(ProcessorSignalBase):
 
     @classmethod
     def get_stop_loss(cls, message):
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        message_parts = message.text.split("\n")
+        tokens = get_message_tokens(message.text)
 
-        if len(message_parts) > 1:
+        if len(tokens.lines) > 1:
 
-            message_sl = [
-                msg_part for msg_part in message_parts
-                if bool(
-                    [phrase for phrase in cls.stop_loss_phrases if phrase in msg_part.lower()]
-                )
-            ][0]
+            sl_line = tokens.get_keyword_lines(*cls.stop_loss_phrases)[0]
 
-            price_formatted = pattern_price_with_dot.search(message_sl)
+            price_formatted = tokens.get_first_number(sl_line)
             try:
-                price = float(price_formatted[0])
+                price = float(price_formatted)
                 return {'price': price}
             except ValueError as e:
                 logger.error(f"\nError while converting message_id={message.get_universal_id()}\n"
@@ -871,12 +792,10 @@ class ProcessorSignalEuphoriaTrading(ProcessorSignalBase):
                              f"Error={e}")
                 raise DecisionSignalStopLossNotFound(message.get_universal_id(), message.text)
         else:
-            pattern_stop_loss_in_one_line = re.compile('[Ss][Ll]\s*[:\-! ]{1}\s*\d*\.?\d*')
-            pattern_stop_loss = re.compile('[\d]*\.\d*')
-            sl_and_price = pattern_stop_loss_in_one_line.search(message.text)
+            sl_and_price = patterns.STOP_LOSS_IN_ONE_LINE.search(message.text)
             if sl_and_price:
                 stop_loss = sl_and_price[0]
-                stop_loss_price = pattern_stop_loss.search(stop_loss)[0]
+                stop_loss_price = patterns.STOP_LOSS_PRICE.search(stop_loss)[0]
                 try:
                     price = float(stop_loss_price)
                     return {'price': price}
@@ -888,11 +807,11 @@ class ProcessorSignalEuphoriaTrading(ProcessorSignalBase):
 
     @classmethod
     def get_type(cls, message):
-        message_text_lower = message.text.lower()
+        tokens = get_message_tokens(message.text)
 
-        if "sell" in message_text_lower:
+        if tokens.has_keyword('sell'):
             return DecisionSignalTypeChoices.SHORT
-        elif "buy" in message_text_lower:
+        elif tokens.has_keyword('buy'):
             return DecisionSignalTypeChoices.LONG
         else:
             raise DecisionSignalTypeUndefined(
@@ -928,27 +847,22 @@ class ProcessorSignalPipsMeUp(ProcessorSignalBase):
 
     @classmethod
     def get_pair(cls, message):
+        tokens = get_message_tokens(message.text)
         try:
-            return (
-                [p for p in pairs_without_slash
-                 if p.lower() in message.text.replace(' ', '').replace('/', '').lower()][0]
-            ).upper()
+            return pair_matcher.get_pairs(tokens.text_lower, ignore_characters=' /')[0].upper()
         except IndexError:
-            if "gold" in message.text.lower():
+            if tokens.has_keyword('gold'):
                return "XAUUSD"
             print(f"Not found any pair in message_text={message.text}")
             raise DecisionSignalPairNotFound(message.get_universal_id(), message.text)
 
     @classmethod
     def get_initial_price(cls, message):
-        sell_now_price_regex = "(([sS][eE][lL]{1,2})|([bB][uU][yY]))\s*([nN][oO][wW])\s*@?\s*(\d*\.?\d+)"
-        sell_now_price_regex_compiled = re.compile(sell_now_price_regex)
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
+        tokens = get_message_tokens(message.text)
         try:
             sell_now_line = [
-                msg_part for msg_part in message.text.split('\n')
-                if bool(sell_now_price_regex_compiled.match(msg_part))
+                index for index in tokens.get_lines('now')
+                if patterns.BUY_SELL_NOW_PRICE.match(tokens.lines[index])
             ][0]
         except IndexError:
             logger.error(f'could not find sell now line in message_text={message.text}')
@@ -956,7 +870,7 @@ class ProcessorSignalPipsMeUp(ProcessorSignalBase):
 
         try:
             price = float(
-                pattern_price_with_dot.search(sell_now_line)[0]
+                tokens.get_first_number(sell_now_line)
             )
             return price
         except ValueError:
@@ -965,20 +879,16 @@ class ProcessorSignalPipsMeUp(ProcessorSignalBase):
 
     @classmethod
     def get_take_profits(cls, message):
-        message_parts = message.text.split("\n")
-        message_tps = [
-            msg_part for msg_part in message_parts
-            if bool(
-                [phrase for phrase in cls.take_profits_phrases if phrase in msg_part.lower()]
-            )
-        ]
+        tokens = get_message_tokens(message.text)
+        tp_lines = tokens.get_keyword_lines(*cls.take_profits_phrases)
+        message_tps = [tokens.lines[index] for index in tp_lines]
         take_profits = []
 
-        for order_number, tp in enumerate(message_tps):
+        for order_number, (line_index, tp) in enumerate(zip(tp_lines, message_tps)):
             try:
                 take_profit = {
                     'order_number': order_number + 1,
-                    'price': cls.get_take_profit_from_tp_part(tp),
+                    'price': cls.get_take_profit_from_tp_line(tokens, line_index),
                     'is_last': message_tps.index(tp) == len(message_tps) - 1
                 }
                 take_profits.append(take_profit)
@@ -995,16 +905,14 @@ class ProcessorSignalPipsMeUp(ProcessorSignalBase):
         return take_profits
 
     @classmethod
-    def get_take_profit_from_tp_part(cls, tp):
-
-        if 'open' in tp.lower():
+    def get_take_profit_from_tp_line(cls, tokens, line_index):
+        tp = tokens.lines[line_index]
+        if 'open' in tokens.lines_lower[line_index]:
             return -1
 
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        tp_price = pattern_price_with_dot.search(tp)
+        tp_price = tokens.get_first_number(line_index)
         if tp_price:
-            price = float(tp_price[0])
+            price = float(tp_price)
             if price in [1,2,3,4,5,6]:
                 logger.error(f"ARE WE SURE THAT WE PROCESSED TP CORRECTLY? "
                              f"price={price}, tp={tp}")
@@ -1014,22 +922,15 @@ class ProcessorSignalPipsMeUp(ProcessorSignalBase):
 
     @classmethod
     def get_stop_loss(cls, message):
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
-        message_parts = message.text.split("\n")
+        tokens = get_message_tokens(message.text)
 
-        if len(message_parts) > 1:
+        if len(tokens.lines) > 1:
 
-            message_sl = [
-                msg_part for msg_part in message_parts
-                if bool(
-                    [phrase for phrase in cls.stop_loss_phrases if phrase in msg_part.lower()]
-                )
-            ][0]
+            sl_line = tokens.get_keyword_lines(*cls.stop_loss_phrases)[0]
 
-            price_formatted = pattern_price_with_dot.search(message_sl)
+            price_formatted = tokens.get_first_number(sl_line)
             try:
-                price = float(price_formatted[0])
+                price = float(price_formatted)
                 return {'price': price}
             except ValueError as e:
                 logger.error(f"\nError while converting message_id={message.get_universal_id()}\n"
@@ -1037,12 +938,10 @@ class ProcessorSignalPipsMeUp(ProcessorSignalBase):
                              f"Error={e}")
                 raise DecisionSignalStopLossNotFound(message.get_universal_id(), message.text)
         else:
-            pattern_stop_loss_in_one_line = re.compile('[Ss][Ll]\s*[:\-! ]{1}\s*\d*\.?\d*')
-            pattern_stop_loss = re.compile('[\d]*\.\d*')
-            sl_and_price = pattern_stop_loss_in_one_line.search(message.text)
+            sl_and_price = patterns.STOP_LOSS_IN_ONE_LINE.search(message.text)
             if sl_and_price:
                 stop_loss = sl_and_price[0]
-                stop_loss_price = pattern_stop_loss.search(stop_loss)[0]
+                stop_loss_price = patterns.STOP_LOSS_PRICE.search(stop_loss)[0]
                 try:
                     price = float(stop_loss_price)
                     return {'price': price}
@@ -1054,11 +953,11 @@ class ProcessorSignalPipsMeUp(ProcessorSignalBase):
 
     @classmethod
     def get_type(cls, message):
-        message_text_lower = message.text.lower()
+        tokens = get_message_tokens(message.text)
 
-        if "sell" in message_text_lower:
+        if tokens.has_keyword('sell'):
             return DecisionSignalTypeChoices.SHORT
-        elif "buy" in message_text_lower:
+        elif tokens.has_keyword('buy'):
             return DecisionSignalTypeChoices.LONG
         else:
             raise DecisionSignalTypeUndefined(
@@ -1094,27 +993,22 @@ class ProcessorSignalFxScorpions(ProcessorSignalBase):
 
     @classmethod
     def get_pair(cls, message):
+        tokens = get_message_tokens(message.text)
         try:
-            return (
-                [p for p in pairs_without_slash
-                 if p.lower() in message.text.replace(' ', '').replace('/', '').lower()][0]
-            ).upper()
+            return pair_matcher.get_pairs(tokens.text_lower, ignore_characters=' /')[0].upper()
         except IndexError:
-            if "gold" in message.text.lower():
+            if tokens.has_keyword('gold'):
                return "XAUUSD"
             print(f"Not found any pair in message_text={message.text}")
             raise DecisionSignalPairNotFound(message.get_universal_id(), message.text)
 
     @classmethod
     def get_initial_price(cls, message):
-        sell_now_price_regex = "(([sS][eE][lL]{1,2})|([bB][uU][yY]))\s*([nN][oO][wW])\s*@?\s*(\d*\.?\d+)"
-        sell_now_price_regex_compiled = re.compile(sell_now_price_regex)
-        pattern_price_with_dot = re.compile('(\d*\.?\d+){2}')
-
+        tokens = get_message_tokens(message.text)
         try:
             sell_now_line = [
-                msg_part for msg_part in message.text.split('\n')
-                if bool(sell_now_price_regex_compiled.match(msg_part))
+                index for index in tokens.get_lines('now')
+                if patterns.BUY_SELL_NOW_PRICE.match(tokens.lines[index])
             ][0]
         except IndexError:
             logger.error(f'could not find sell now line in message_text={message.text}')
@@ -1122,7 +1016,7 @@ class ProcessorSignalFxScorpions(ProcessorSignalBase):
 
         try:
             price = float(
-                pattern_price_with_dot.search(sell_now_line)[0]
+                tokens.get_first_number(sell_now_line)
             )
             return price
         except ValueError:
@@ -1131,20 +1025,16 @@ class ProcessorSignalFxScorpions(ProcessorSignalBase):
 
     @classmethod
     def get_take_profits(cls, message):
-        message_parts = message.text.split("\n")
-        message_tps = [
-            msg_part for msg_part in message_parts
-            if bool(
-                [phrase for phrase in cls.take_profits_phrases if phrase in msg_part.lower()]
-            )
-        ]
+        tokens = get_message_tokens(message.text)
+        tp_lines = tokens.get_keyword_lines(*cls.take_profits_phrases)
+        message_tps = [tokens.lines[index] for index in tp_lines]
         take_profits = []
 
-        for order_number, tp in enumerate(message_tps):
+        for order_number, (line_index, tp) in enumerate(zip(tp_lines, message_tps)):
             try:
                 take_profit = {
                     'order_number': order_number + 1,
-                    'price': cls.get_take_profit_from_tp_part(tp),
+                    'price': cls.get_take_profit_from_tp_line(tokens, line_index),
                     'is_last': message_tps.index(tp) == len(message_tps) - 1
                 }
                 take_profits.append(take_profit)
@@ -1161,14 +1051,12 @@ class ProcessorSignalFxScorpions(ProcessorSignalBase):
         return take_profits
 
     @classmethod
-    def get_take_profit_from_tp_part(cls, tp):
-
-        if 'open' in tp.lower():
+    def get_take_profit_from_tp_line(cls, tokens, line_index):
+        tp = tokens.lines[line_index]
+        if 'open' in tokens.lines_lower[line_index]:
             return -1
 
-        pattern_price_with_dot = re.compile('([\d*]+\.?\d+)')
-
-        tp_price = pattern_price_with_dot.search(tp)
+        tp_price = patterns.PRICE.search(tp)
         if tp_price:
             price = float(tp_price[0])
             if price in [1,2,3,4,5,6]:
@@ -1180,20 +1068,13 @@ class ProcessorSignalFxScorpions(ProcessorSignalBase):
 
     @classmethod
     def get_stop_loss(cls, message):
-        pattern_price_with_dot = re.compile('([\d*]+\.?\d+)')
+        tokens = get_message_tokens(message.text)
 
-        message_parts = message.text.split("\n")
+        if len(tokens.lines) > 1:
 
-        if len(message_parts) > 1:
-
-            message_sl = [
-                msg_part for msg_part in message_parts
-                if bool(
-                    [phrase for phrase in cls.stop_loss_phrases if phrase in msg_part.lower()]
-                )
-            ][0]
+            sl_line = tokens.get_keyword_lines(*cls.stop_loss_phrases)[0]
 
-            price_formatted = pattern_price_with_dot.search(message_sl)
+            price_formatted = patterns.PRICE.search(tokens.lines[sl_line])
             try:
                 price = float(price_formatted[0])
                 return {'price': price}
@@ -1203,12 +1084,10 @@ class ProcessorSignalFxScorpions(ProcessorSignalBase):
                              f"Error={e}")
                 raise DecisionSignalStopLossNotFound(message.get_universal_id(), message.text)
         else:
-            pattern_stop_loss_in_one_line = re.compile('[Ss][Ll]\s*[:\-! ]{1}\s*\d*\.?\d*')
-            pattern_stop_loss = re.compile('[\d]*\.\d*')
-            sl_and_price = pattern_stop_loss_in_one_line.search(message.text)
+            sl_and_price = patterns.STOP_LOSS_IN_ONE_LINE.search(message.text)
             if sl_and_price:
                 stop_loss = sl_and_price[0]
-                stop_loss_price = pattern_stop_loss.search(stop_loss)[0]
+                stop_loss_price = patterns.STOP_LOSS_PRICE.search(stop_loss)[0]
                 try:
                     price = float(stop_loss_price)
                     return {'price': price}
@@ -1220,11 +1099,11 @@ class ProcessorSignalFxScorpions(ProcessorSignalBase):
 
     @classmethod
     def get_type(cls, message):
-        message_text_lower = message.text.lower()
+        tokens = get_message_tokens(message.text)
 
-        if "sell" in message_text_lower:
+        if tokens.has_keyword('sell'):
             return DecisionSignalTypeChoices.SHORT
-        elif "buy" in message_text_lower:
+        elif tokens.has_keyword('buy'):
             return DecisionSignalTypeChoices.LONG
         else:
             raise DecisionSignalTypeUndefined(
@@ -1255,13 +1134,14 @@ class ProcessSignalManager:
         processor = MAPPING_PROCESS_SIGNAL.get(message.channel.name, None)
 
         if processor:
-            decision_signal = processor.get_decision(message)
+            decision_signal = process_cache.get_decision(processor, message)
             if not decision_signal.take_profits or not decision_signal.stop_loss:
                 raise IncorrectDecisionSignalTradeLevels(
                     message.get_universal_id(), message.text
                 )
-            message.status = choices.MessageStatusChoices.PROCESSED
-            message.save()
+            if message.status != choices.MessageStatusChoices.PROCESSED:
+                message.status = choices.MessageStatusChoices.PROCESSED
+                message.save()
             return decision_signal
         else:
             logger.error("Processor for channel={} not found".format(message.channel))
@@ -3,14 +3,17 @@ from dateutil import parser
 
 import logging
 
+from bson import ObjectId
 from mongoengine import DoesNotExist, MultipleObjectsReturned
 
-from app import mappings, pairs
+from app import mappings
 from app.exceptions.recognise import MoreThanOneMessageTypeHasBeenRecognised, MoreThanOnePairFound
 from app.models import choices
 from app.models.channels import Channel
 from app.models.choices import MessageTypeChoices, MessageSignalTypeChoices
 from app.models.messages import Message
+from app.pairs.matcher import pair_matcher
+from app.processing.cache import recognise_cache
 from app.processing.process_correction import ProcessorCorrectionGaForex
 
 logger = logging.getLogger(__file__)
@@ -19,6 +22,7 @@ logger = logging.getLogger(__file__)
 class RecognsiseProcessorBase:
 
     name = None
+    version = 1  # bump when recognition changes, cached results of other versions are not used
 
     @staticmethod
     def get_recognised_message_type(message):
@@ -57,10 +61,36 @@ class RecognsiseProcessorBase:
     def get_quoted_message(self, message):
         raise NotImplementedError
 
-    def get_amount_and_pairs_from_text(self, text):
-        found_pairs = [pair
-                       for pair in pairs.pairs_without_slash_lower
-                       if pair in text.replace('/', '').lower()]
+    @staticmethod
+    def get_reply_to_msg_id(message):
+        """ works for RawMessage and for raw message dict """
+        return message['reply_to_msg_id'] if 'reply_to_msg_id' in message else None
+
+    @classmethod
+    def get_recognised_message_in_memory(cls, message_json, context, message_type=None):
+        """
+        Same message as get_recognised_message_type, but channel and quoted message are taken
+        from context instead of database and message isn't saved (see RecognitionContext.save_messages)
+        :param message_type: type already recognised by get_message_type_from_message
+        """
+        message = Message(
+            id=ObjectId(),
+            id_internal=cls.get_id_internal(message_json),
+            channel=context.get_channel(cls.name),
+            text=cls.get_text(message_json),
+            text_raw=cls.get_text_raw(message_json),
+            date=cls.get_date(message_json),
+            type=message_type or cls.get_message_type_from_message(message_json),
+            status=choices.MessageStatusChoices.RECOGNIZED,
+            quoted_message=context.get_quoted_message(cls.get_reply_to_msg_id(message_json))
+        )
+        message.id_universal = message.get_universal_id()
+        context.add_message(message)
+        return message
+
+    @classmethod
+    def get_amount_and_pairs_from_text(cls, text):
+        found_pairs = pair_matcher.get_pairs(text, ignore_characters='/')
         if len(found_pairs) > 1:
             return len(found_pairs), found_pairs
         elif len(found_pairs) == 1:
@@ -92,7 +122,7 @@ class RecogniseProcessorGaForex(RecognsiseProcessorBase):
     @classmethod
     def get_message_type_from_message(cls, message):
         if not message['text']:
-            logger.error(f"Message(uuid={message.get_universal_id()}) is blank")
+            logger.error(f"Message(id_internal={cls.get_id_internal(message)}) is blank")
             return choices.MessageTypeChoices.SKIP
 
         is_signal, signal_type = cls.is_message_signal(message)
@@ -117,7 +147,7 @@ class RecogniseProcessorGaForex(RecognsiseProcessorBase):
 
     @classmethod
     def is_message_signal(cls, message):
-        if getattr(message, 'reply_to_msg_id', None) is not None:
+        if cls.get_reply_to_msg_id(message) is not None:
             return False, None
 
         text = cls.get_text(message)
@@ -219,7 +249,7 @@ class RecogniseProcessorSureShotSignal(RecognsiseProcessorBase):
     @classmethod
     def get_message_type_from_message(cls, message):
         if not message['text']:
-            logger.error(f"Message(uuid={message.get_universal_id()}) is blank")
+            logger.error(f"Message(id_internal={cls.get_id_internal(message)}) is blank")
             return choices.MessageTypeChoices.SKIP
 
         is_signal, signal_type = cls.is_message_signal(message)
@@ -244,7 +274,7 @@ class RecogniseProcessorSureShotSignal(RecognsiseProcessorBase):
 
     @classmethod
     def is_message_signal(cls, message):
-        if getattr(message, 'reply_to_msg_id', None) is not None:
+        if cls.get_reply_to_msg_id(message) is not None:
             return False, None
 
         text = cls.get_text(message)
@@ -346,7 +376,7 @@ class RecogniseProcessorLifestylePipsFx(RecognsiseProcessorBase):
     @classmethod
     def get_message_type_from_message(cls, message):
         if not message['text']:
-            logger.error(f"Message(uuid={message.get_universal_id()}) is blank")
+            logger.error(f"Message(id_internal={cls.get_id_internal(message)}) is blank")
             return choices.MessageTypeChoices.SKIP
 
         is_signal, signal_type = cls.is_message_signal(message)
@@ -371,7 +401,7 @@ class RecogniseProcessorLifestylePipsFx(RecognsiseProcessorBase):
 
     @classmethod
     def is_message_signal(cls, message):
-        if getattr(message, 'reply_to_msg_id', None) is not None:
+        if cls.get_reply_to_msg_id(message) is not None:
             return False, None
 
         text = cls.get_text(message)
@@ -405,10 +435,7 @@ class RecogniseProcessorLifestylePipsFx(RecognsiseProcessorBase):
 
     @classmethod
     def get_amount_and_pairs_from_text(cls, message_text):
-        found_pairs = [
-            pair for pair in pairs.pairs_without_slash_lower
-            if pair in message_text.replace(' ', '').replace('/', '').lower()
-        ]
+        found_pairs = pair_matcher.get_pairs(message_text, ignore_characters=' /')
         if len(found_pairs) > 1:
             return len(found_pairs), found_pairs
         elif len(found_pairs) == 1:
@@ -491,7 +518,7 @@ class RecogniseProcessorSmartTradeSolutions(RecognsiseProcessorBase):
     @classmethod
     def get_message_type_from_message(cls, message):
         if not message['text']:
-            logger.error(f"Message(uuid={message.get_universal_id()}) is blank")
+            logger.error(f"Message(id_internal={cls.get_id_internal(message)}) is blank")
             return choices.MessageTypeChoices.SKIP
 
         is_signal, signal_type = cls.is_message_signal(message)
@@ -516,7 +543,7 @@ class RecogniseProcessorSmartTradeSolutions(RecognsiseProcessorBase):
 
     @classmethod
     def is_message_signal(cls, message):
-        if getattr(message, 'reply_to_msg_id', None) is not None:
+        if cls.get_reply_to_msg_id(message) is not None:
             return False, None
 
         text = cls.get_text(message)
@@ -551,10 +578,7 @@ class RecogniseProcessorSmartTradeSolutions(RecognsiseProcessorBase):
 
     @classmethod
     def get_amount_and_pairs_from_text(cls, message_text):
-        found_pairs = [
-            pair for pair in pairs.pairs_without_slash_lower
-            if pair in message_text.replace(' ', '').replace('/', '').lower()
-        ]
+        found_pairs = pair_matcher.get_pairs(message_text, ignore_characters=' /')
         if len(found_pairs) > 1:
             return len(found_pairs), found_pairs
         elif len(found_pairs) == 1:
@@ -639,7 +663,7 @@ class RecogniseProcessorBlueCapitalFx(RecognsiseProcessorBase):
     @classmethod
     def get_message_type_from_message(cls, message):
         if not message['text']:
-            logger.error(f"Message(uuid={message.get_universal_id()}) is blank")
+            logger.error(f"Message(id_internal={cls.get_id_internal(message)}) is blank")
             return choices.MessageTypeChoices.SKIP
 
         is_signal, signal_type = cls.is_message_signal(message)
@@ -664,7 +688,7 @@ class RecogniseProcessorBlueCapitalFx(RecognsiseProcessorBase):
 
     @classmethod
     def is_message_signal(cls, message):
-        if getattr(message, 'reply_to_msg_id', None) is not None:
+        if cls.get_reply_to_msg_id(message) is not None:
             return False, None
 
         text = cls.get_text(message)
@@ -698,10 +722,7 @@ class RecogniseProcessorBlueCapitalFx(RecognsiseProcessorBase):
 
     @classmethod
     def get_amount_and_pairs_from_text(cls, message_text):
-        found_pairs = [
-            pair for pair in pairs.pairs_without_slash_lower
-            if pair in message_text.replace(' ', '').replace('/', '').lower()
-        ]
+        found_pairs = pair_matcher.get_pairs(message_text, ignore_characters=' /')
         if len(found_pairs) > 1:
             return len(found_pairs), found_pairs
         elif len(found_pairs) == 1:
@@ -786,7 +807,7 @@ class RecogniseProcessorEuphoriaTrading(RecognsiseProcessorBase):
     @classmethod
     def get_message_type_from_message(cls, message):
         if not message['text']:
-            logger.error(f"Message(uuid={message.get_universal_id()}) is blank")
+            logger.error(f"Message(id_internal={cls.get_id_internal(message)}) is blank")
             return choices.MessageTypeChoices.SKIP
 
         is_signal, signal_type = cls.is_message_signal(message)
@@ -811,7 +832,7 @@ class RecogniseProcessorEuphoriaTrading(RecognsiseProcessorBase):
 
     @classmethod
     def is_message_signal(cls, message):
-        if getattr(message, 'reply_to_msg_id', None) is not None:
+        if cls.get_reply_to_msg_id(message) is not None:
             return False, None
 
         text = cls.get_text(message)
@@ -845,10 +866,7 @@ class RecogniseProcessorEuphoriaTrading(RecognsiseProcessorBase):
 
     @classmethod
     def get_amount_and_pairs_from_text(cls, message_text):
-        found_pairs = [
-            pair for pair in pairs.pairs_without_slash_lower
-            if pair in message_text.replace(' ', '').replace('/', '').lower()
-        ]
+        found_pairs = pair_matcher.get_pairs(message_text, ignore_characters=' /')
         if len(found_pairs) > 1:
             return len(found_pairs), found_pairs
         elif len(found_pairs) == 1:
@@ -933,7 +951,7 @@ class RecogniseProcessorPipsMeUp(RecognsiseProcessorBase):
     @classmethod
     def get_message_type_from_message(cls, message):
         if not message['text']:
-            logger.error(f"Message(uuid={message.get_universal_id()}) is blank")
+            logger.error(f"Message(id_internal={cls.get_id_internal(message)}) is blank")
             return choices.MessageTypeChoices.SKIP
 
         is_signal, signal_type = cls.is_message_signal(message)
@@ -958,7 +976,7 @@ class RecogniseProcessorPipsMeUp(RecognsiseProcessorBase):
 
     @classmethod
     def is_message_signal(cls, message):
-        if getattr(message, 'reply_to_msg_id', None) is not None:
+        if cls.get_reply_to_msg_id(message) is not None:
             return False, None
 
         text = cls.get_text(message)
@@ -992,10 +1010,7 @@ class RecogniseProcessorPipsMeUp(RecognsiseProcessorBase):
 
     @classmethod
     def get_amount_and_pairs_from_text(cls, message_text):
-        found_pairs = [
-            pair for pair in pairs.pairs_without_slash_lower
-            if pair in message_text.replace(' ', '').replace('/', '').lower()
-        ]
+        found_pairs = pair_matcher.get_pairs(message_text, ignore_characters=' /')
         if len(found_pairs) > 1:
             return len(found_pairs), found_pairs
         elif len(found_pairs) == 1:
@@ -1080,7 +1095,7 @@ class RecogniseProcessorFxScorpions(RecognsiseProcessorBase):
     @classmethod
     def get_message_type_from_message(cls, message):
         if not message['text']:
-            logger.error(f"Message(uuid={message.get_universal_id()}) is blank")
+            logger.error(f"Message(id_internal={cls.get_id_internal(message)}) is blank")
             return choices.MessageTypeChoices.SKIP
 
         is_signal, signal_type = cls.is_message_signal(message)
@@ -1105,7 +1120,7 @@ class RecogniseProcessorFxScorpions(RecognsiseProcessorBase):
 
     @classmethod
     def is_message_signal(cls, message):
-        if getattr(message, 'reply_to_msg_id', None) is not None:
+        if cls.get_reply_to_msg_id(message) is not None:
             return False, None
 
         text = cls.get_text(message)
@@ -1139,10 +1154,7 @@ class RecogniseProcessorFxScorpions(RecognsiseProcessorBase):
 
     @classmethod
     def get_amount_and_pairs_from_text(cls, message_text):
-        found_pairs = [
-            pair for pair in pairs.pairs_without_slash_lower
-            if pair in message_text.replace(' ', '').replace('/', '').lower()
-        ]
+        found_pairs = pair_matcher.get_pairs(message_text, ignore_characters=' /')
         if len(found_pairs) > 1:
             return len(found_pairs), found_pairs
         elif len(found_pairs) == 1:
@@ -1217,11 +1229,83 @@ MAPPING_RECOGNISE = {
 }
 
 
+class RecognitionContext:
+    """
+    Channels and recognised messages kept in memory, so messages are recognised without
+    any query or save (see RecogniseMessageManager.get_recognised_message_obj_in_memory).
+    Quoted message is the first message with quoted id_internal, as Message.objects.get
+    in get_quoted_message would return it. Recognised messages can be saved with one bulk insert.
+    """
+
+    def __init__(self, channels=(), messages=()):
+        self.channels = {channel.name: channel for channel in channels}
+        self.messages_by_id_internal = {}
+        self.messages = []
+        for message in messages:
+            self.messages_by_id_internal.setdefault(message.id_internal, message)
+
+    @classmethod
+    def preload(cls, channel_names, with_messages=True):
+        """ channels and (optionally) messages already saved for them, fetched with one query each """
+        channels = list(Channel.objects.filter(name__in=list(channel_names)))
+        messages = Message.objects.filter(channel__in=channels) if with_messages else ()
+        context = cls(channels, messages)
+        logger.info(f'Preloaded {len(channels)} channels and {len(context.messages_by_id_internal)} '
+                    f'messages for recognition')
+        return context
+
+    def get_channel(self, name):
+        try:
+            return self.channels[name]
+        except KeyError:
+            raise Channel.DoesNotExist(f'Channel(name={name}) has not been preloaded')
+
+    def get_quoted_message(self, reply_to_msg_id):
+        if reply_to_msg_id is None:
+            return None
+        return self.messages_by_id_internal.get(str(reply_to_msg_id))
+
+    def add_message(self, message):
+        self.messages.append(message)
+        self.messages_by_id_internal.setdefault(message.id_internal, message)
+
+    def save_messages(self):
+        """ saves messages recognised in this context """
+        Message.insert_many(self.messages)
+        logger.info(f'Saved {len(self.messages)} recognised messages')
+
+
 class RecogniseMessageManager:
 
     @classmethod
     def get_recognised_message_obj(cls, message) -> Message:
+        processor = cls.get_processor(message)
+        if processor:
+            return processor.get_recognised_message_type(message)
 
+    @classmethod
+    def get_recognised_message_obj_cached(cls, message) -> Message:
+        """ same as get_recognised_message_obj, but message recognised by previous run is reused """
+        processor = cls.get_processor(message)
+        if processor:
+            return recognise_cache.get_recognised_message(processor, message)
+
+    @classmethod
+    def get_recognised_message_obj_in_memory(cls, message, context, message_type=None) -> Message:
+        """ same as get_recognised_message_obj, but without database access, see RecognitionContext """
+        processor = cls.get_processor(message)
+        if processor:
+            return processor.get_recognised_message_in_memory(message, context, message_type)
+
+    @classmethod
+    def get_message_type(cls, message):
+        """ only type (MessageTypeChoices) of message, nothing is created """
+        processor = cls.get_processor(message)
+        if processor:
+            return processor.get_message_type_from_message(message)
+
+    @classmethod
+    def get_processor(cls, message):
         if 'chat_id' in message:
             message_channel_name = mappings.MAPPING_CHAT_ID_TO_NAME.get(message['chat_id'])
         else:
@@ -1230,7 +1314,6 @@ class RecogniseMessageManager:
             )
 
         processor = MAPPING_RECOGNISE.get(message_channel_name, None)
-        if processor:
-            return processor.get_recognised_message_type(message)
-        else:
-            logger.error("Processor for channel={} not found".format(message['chat_id']))
+        if processor is None:
+            logger.error("Processor for channel={} not found".format(message_channel_name))
+        return processor
@@ -0,0 +1,71 @@
+from functools import lru_cache
+
+from app.processing import patterns
+
+KEYWORDS = (
+    'buy', 'sell', 'now', 'tp', 'take', 't/p', 'sl', 'stop', 's/l', 'open', 'pips', 'gold', 'http', 'https'
+)
+
+
+class MessageTokens:
+    """
+    Message text split once into lines (original and lowercased), lines containing each of KEYWORDS
+    and numbers (prices) with their line positions. Processors read pair, type, take profits
+    and stop loss from it instead of splitting and lowercasing text for every extracted field.
+    Numbers of line are found on first use and kept for the following extractors.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.text_lower = text.lower()
+        self.lines = tuple(text.split('\n'))
+        self.lines_lower = tuple(self.text_lower.split('\n'))
+        # lines are scanned only for keywords occurring anywhere in text
+        self.keywords_lines = {}
+        for keyword in KEYWORDS:
+            if keyword in self.text_lower:
+                self.keywords_lines[keyword] = [
+                    index for index, line in enumerate(self.lines_lower) if keyword in line
+                ]
+        self.lines_numbers = {}
+
+    def get_lines(self, keyword):
+        """ :return: indexes of lines containing keyword """
+        return self.keywords_lines.get(keyword, ())
+
+    def has_keyword(self, keyword):
+        return keyword in self.text_lower
+
+    def get_keyword_lines(self, *keywords):
+        """ :return: indexes of lines containing any of keywords, in order of lines """
+        return sorted({index for keyword in keywords for index in self.get_lines(keyword)})
+
+    def get_line_numbers(self, line_index):
+        """ :return: list of (start in line, number text) of line """
+        numbers = self.lines_numbers.get(line_index)
+        if numbers is None:
+            numbers = [(match.start(), match[0])
+                       for match in patterns.PRICE_WITH_DOT.finditer(self.lines[line_index])]
+            self.lines_numbers[line_index] = numbers
+        return numbers
+
+    def get_first_number(self, line_index):
+        """ :return: first number of line as text, None if line doesn't have any """
+        numbers = self.lines_numbers.get(line_index)
+        if numbers is not None:
+            return numbers[0][1] if numbers else None
+        number = patterns.PRICE_WITH_DOT.search(self.lines[line_index])
+        return number[0] if number else None
+
+    @property
+    def numbers(self):
+        """ :return: list of (line index, start in line, number text) of whole text """
+        return [(index, start, number)
+                for index in range(len(self.lines))
+                for start, number in self.get_line_numbers(index)]
+
+
+@lru_cache(maxsize=1024)
+def get_message_tokens(text):
+    """ tokens of text, each extractor of the same message gets already tokenized text """
+    return MessageTokens(text)
@@ -3,4 +3,11 @@ def merge_files_into_one(files_to_merge, output_file):
         for fname in files_to_merge:
             with open(fname) as infile:
                 for line in infile:
-                    outfile.write(line)
\ No newline at end of file
+                    outfile.write(line)
+
+
+def merge_streams_into_one(streams, output_file):
+    with open(output_file, 'w') as outfile:
+        for stream in streams:
+            for line in stream:
+                outfile.write(line)
@@ -1,3 +1,4 @@
+import io
 import os
 import json
 import zipfile
@@ -64,6 +65,21 @@ def unzipfile(path_file, path_to_unzip):
     zip_ref.close()
 
 
+def open_zip_csv_members(path_file):
+    """ yields text streams of .csv files inside zip, nothing is extracted to disk """
+    try:
+        zip_ref = zipfile.ZipFile(path_file, 'r')
+    except (zipfile.BadZipFile, IsADirectoryError):
+        return
+
+    with zip_ref:
+        for name in sorted(zip_ref.namelist()):
+            if name.rsplit('.', 1)[-1].lower() != 'csv':
+                continue
+            with zip_ref.open(name) as member:
+                yield io.TextIOWrapper(member, encoding='utf-8')
+
+
 def get_all_directories_of_directory(dir_path, without_first=False):
     """
     :param dir_path:
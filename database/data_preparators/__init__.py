@@ -35,7 +35,7 @@ class DataDownloaderManager:
     TYPE_CANDLE = ''
 
     def __init__(self, pairs, year, month_from, month_to,
-                 download=False, group=False, fillup=False):
+                 download=False, group=False, fillup=False, extract=False):
         if self.is_params_valid(month_from, month_to):
             self.pairs = pairs
             self.year = year
@@ -66,14 +66,18 @@ class DataDownloaderManager:
                 logger.info("GroupFile().sort_file_into_directories(self.pairs)")
                 GroupFile().sort_file_into_directories(self.pairs)
 
-                logger.info("GroupFile().unzip_all_files()")
-                GroupFile().unzip_all_files()
+                if extract:
+                    logger.info("GroupFile().unzip_all_files()")
+                    GroupFile().unzip_all_files()
 
-                logger.info("GroupFile().validate_unziping()")
-                GroupFile().validate_unziping()
+                    logger.info("GroupFile().validate_unziping()")
+                    GroupFile().validate_unziping()
 
-                logger.info("GroupFile().merge_all_csv_files()")
-                GroupFile().merge_all_csv_files()
+                    logger.info("GroupFile().merge_all_csv_files()")
+                    GroupFile().merge_all_csv_files()
+                else:
+                    logger.info("GroupFile().merge_all_zip_files()")
+                    GroupFile().merge_all_zip_files()
 
                 logger.info("Ready to save to db")
             if fillup:
@@ -1,12 +1,18 @@
 import datetime
 import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 
 from mongoengine.errors import NotUniqueError
+from pymongo.errors import BulkWriteError
 
 from database import (
     connect_to_db,
     get_collection_for_database,
+    get_database_for_client,
+    get_mongoclient,
     COLLECTION_FILLED_PAIR,
     DB_BACKTEST
 )
@@ -17,24 +23,140 @@ logger = logging.getLogger(__file__)
 
 collection = get_collection_for_database(COLLECTION_FILLED_PAIR)
 
+DUPLICATE_KEY_ERROR_CODE = 11000
+
 
 class HistDataDbFill:
 
     col_names = ['DATE', 'TIME', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL']
+    date_format = '%Y.%m.%d %H:%M'
+    bulk_chunk_size = 10000
 
     def __init__(self):
         connect_to_db(alias=DB_BACKTEST)
 
-    def add_all_data_to_db_from_path(self, path, exclude=()):
-
+    def add_all_data_to_db_from_path(self, path, exclude=(), bulk=True, workers=1):
+        """
+        :param workers: amount of pairs added at once (each in its own process), used only with bulk=True
+        """
         directories = get_all_directories_of_directory(path, without_first=True)
-        for nr, dir in enumerate(directories):
-            pair = dir.rsplit('/', 1)[1]
-            if pair in exclude:
-                continue
-            df = pd.read_csv(dir+'/merged.csv', names=self.col_names)
-            self.add_df_to_db(pair, df)
+        pairs_directories = [
+            (dir.rsplit('/', 1)[1], dir) for dir in directories
+            if dir.rsplit('/', 1)[1] not in exclude
+        ]
+
+        if not bulk:
+            for pair, dir in pairs_directories:
+                df = pd.read_csv(dir+'/merged.csv', names=self.col_names)
+                self.add_df_to_db(pair, df)
+            print('end of job')
+            return
+
+        HistoricRow.ensure_indexes()
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(add_pair_directory_to_db, pairs_directories))
+        else:
+            historic_row_collection = HistoricRow._get_collection()
+            results = [
+                add_pair_directory_to_db(pair_directory, historic_row_collection)
+                for pair_directory in pairs_directories
+            ]
+
+        if results:
+            collection.insert_many(results)
         print('end of job')
+        return results
+
+    @classmethod
+    def add_df_to_db_bulk(cls, pair, df, historic_row_collection=None):
+        """
+        Dates are parsed for whole df at once and rows are written with unordered insert_many
+        in chunks of bulk_chunk_size. Rows already existing in db (duplicated pair+date)
+        are counted per chunk and skipped, rows with date or time which can't be parsed are logged and skipped.
+        """
+        if historic_row_collection is None:
+            HistoricRow.ensure_indexes()
+            historic_row_collection = HistoricRow._get_collection()
+
+        logger.info(f'Start bulk adding {len(df)} rows for pair={pair}')
+        time_start = time.time()
+        result = {
+            'pair': pair,
+            'amount': len(df),
+            'inserted': 0,
+            'duplicates': 0,
+            'errors': 0,
+            'invalid_dates': 0,
+        }
+
+        dates = cls.get_datetimes(df['DATE'], df['TIME'])
+        invalid_dates = dates.isna()
+        if invalid_dates.any():
+            result['invalid_dates'] = int(invalid_dates.sum())
+            first_invalid = df[invalid_dates].iloc[0]
+            logger.error(f'{result["invalid_dates"]} rows of pair={pair} skipped, date can\'t be parsed. '
+                         f'First row: date={first_invalid["DATE"]}, time={first_invalid["TIME"]}')
+            df, dates = df[~invalid_dates], dates[~invalid_dates]
+
+        for chunk_start in range(0, len(df), cls.bulk_chunk_size):
+            chunk_end = chunk_start + cls.bulk_chunk_size
+            documents = cls.get_historic_row_documents(
+                pair, df.iloc[chunk_start:chunk_end], dates.iloc[chunk_start:chunk_end]
+            )
+            inserted, duplicates, errors = cls.insert_documents(historic_row_collection, documents)
+            result['inserted'] += inserted
+            result['duplicates'] += duplicates
+            result['errors'] += errors
+
+            seconds = time.time() - time_start
+            logger.info(f'{pair}: {min(chunk_end, len(df))}/{len(df)} rows processed, '
+                        f'{int(min(chunk_end, len(df)) / seconds) if seconds else 0} rows/s')
+
+        result['seconds'] = time.time() - time_start
+        logger.info(f'added {result["inserted"]} elements for pair={pair} '
+                    f'(duplicates={result["duplicates"]}, errors={result["errors"]}, '
+                    f'invalid_dates={result["invalid_dates"]}) '
+                    f'in {result["seconds"]:.1f}s, '
+                    f'{int(len(df) / result["seconds"]) if result["seconds"] else 0} rows/s')
+        return result
+
+    @staticmethod
+    def get_historic_row_documents(pair, df, dates):
+        return [
+            {
+                'pair': pair,
+                'date': date,
+                'open': open,
+                'high': high,
+                'low': low,
+                'close': close,
+                'volume': volume
+            }
+            for date, open, high, low, close, volume in zip(
+                dates.dt.to_pydatetime().tolist(),
+                df['OPEN'].tolist(), df['HIGH'].tolist(), df['LOW'].tolist(),
+                df['CLOSE'].tolist(), df['VOL'].astype(float).tolist()
+            )
+        ]
+
+    @staticmethod
+    def insert_documents(historic_row_collection, documents):
+        """ returns amount of inserted, duplicated and failed documents """
+        if not documents:
+            return 0, 0, 0
+        try:
+            historic_row_collection.insert_many(documents, ordered=False)
+            return len(documents), 0, 0
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            duplicates = len([error for error in write_errors
+                              if error.get('code') == DUPLICATE_KEY_ERROR_CODE])
+            errors = len(write_errors) - duplicates
+            if errors:
+                logger.error(f'{errors} rows not inserted. First error: '
+                             f'{[error for error in write_errors if error.get("code") != DUPLICATE_KEY_ERROR_CODE][0]}')
+            return e.details.get('nInserted', 0), duplicates, errors
 
     def add_df_to_db(self, pair, df):
         print("Zaczynam dodawac dla pary: {}".format(pair))
@@ -73,3 +195,40 @@ class HistDataDbFill:
         except IndexError:
             print("error while converting date: {}, time: {}".format(date, time))
         return date
+
+    @classmethod
+    def get_datetimes(cls, dates, times):
+        """ NaT for date and time which don't match date_format """
+        return pd.to_datetime(dates.astype(str) + ' ' + times.astype(str), format=cls.date_format, errors='coerce')
+
+
+def add_pair_directory_to_db(pair_directory, historic_row_collection=None):
+    """
+    Adds merged.csv of single pair directory with HistDataDbFill.add_df_to_db_bulk.
+    Run in worker process it creates its own mongo client (clients must not be shared between processes).
+    Errors are returned in result so one broken pair doesn't stop others.
+    """
+    pair, dir = pair_directory
+    client = None
+    time_start = time.time()
+    try:
+        if historic_row_collection is None:
+            client = get_mongoclient()
+            historic_row_collection = get_database_for_client(client)[HistoricRow._get_collection_name()]
+        df = pd.read_csv(dir+'/merged.csv', names=HistDataDbFill.col_names)
+        return HistDataDbFill.add_df_to_db_bulk(pair, df, historic_row_collection)
+    except Exception as e:
+        logger.exception(f'Error occurred while adding pair={pair} from directory={dir}')
+        return {
+            'pair': pair,
+            'amount': 0,
+            'inserted': 0,
+            'duplicates': 0,
+            'errors': 1,
+            'invalid_dates': 0,
+            'error_message': str(e),
+            'seconds': time.time() - time_start,
+        }
+    finally:
+        if client is not None:
+            client.close()
@@ -0,0 +1,135 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.backtest.price_store import PriceStore
+from app.utils import utils_file
+from database.data_preparators.fillup_db import HistDataDbFill
+
+logger = logging.getLogger(__file__)
+
+
+class HistDataColumnarConverter:
+    """
+    Converts histdata monthly .csv files (or .zip files containing them) of each pair
+    into PriceStore files, one per pair and year.
+    Files are read in chunks of chunk_size rows, so whole year is never held in memory.
+    Sources are read in order of their names (histdata names contain year and month),
+    rows are sorted within chunk and rows not later than last written row are skipped as duplicates.
+    """
+
+    chunk_size = 100000
+    source_extensions = ('csv', 'zip')
+
+    def __init__(self, price_store=None, build_extremes_index=True):
+        self.price_store = price_store or PriceStore()
+        self.build_extremes_index = build_extremes_index
+
+    def convert_all_from_path(self, path, exclude=()):
+        results = []
+        directories = utils_file.get_all_directories_of_directory(path, without_first=True)
+        for nr, dir in enumerate(directories):
+            pair = dir.rsplit('/', 1)[1]
+            if pair in exclude:
+                continue
+            logger.info(f"|{nr+1}| converting pair={pair} in dir: {dir}")
+            results.append(self.convert_pair(pair, self.get_source_paths(dir)))
+        return results
+
+    def get_source_paths(self, directory):
+        return sorted(
+            f"{directory}/{file}" for file in utils_file.get_files_for_directory(directory)
+            if file.rsplit('.', 1)[-1].lower() in self.source_extensions and file != 'merged.csv'
+        )
+
+    def convert_pair(self, pair, sources):
+        """
+        :param sources: paths of .csv/.zip files or already opened text streams
+        Files of pair are replaced only when all sources were converted, on error nothing is written.
+        """
+        time_start = time.time()
+        result = {'pair': pair, 'rows': 0, 'skipped': 0, 'years': []}
+        writers = {}
+        last_timestamp = None
+
+        try:
+            for chunk in self.read_chunks(sources):
+                timestamps, columns = self.get_sorted_columns(chunk)
+
+                is_unique = np.ones(len(timestamps), dtype=bool)
+                is_unique[1:] = timestamps[1:] != timestamps[:-1]
+                if last_timestamp is not None:
+                    is_unique &= timestamps > last_timestamp
+                result['skipped'] += int(len(timestamps) - is_unique.sum())
+                if not is_unique.any():
+                    continue
+
+                columns = {name: column[is_unique] for name, column in columns.items()}
+                last_timestamp = columns['date'][-1]
+                result['rows'] += len(columns['date'])
+
+                years = columns['date'].astype('datetime64[s]').astype('datetime64[Y]').astype(int) + 1970
+                for year in np.unique(years):
+                    year = int(year)
+                    if year not in writers:
+                        writers[year] = self.price_store.get_file_writer(pair, year)
+                    in_year = years == year
+                    writers[year].append({name: column[in_year] for name, column in columns.items()})
+        except Exception:
+            for writer in writers.values():
+                writer.abort()
+            raise
+
+        for year, writer in sorted(writers.items()):
+            writer.close()
+            result['years'].append(year)
+            if self.build_extremes_index:
+                self.price_store.write_extremes_index(pair, year)
+
+        result['seconds'] = time.time() - time_start
+        logger.info(f"Converted {result['rows']} rows (skipped {result['skipped']}) for pair={pair}, "
+                    f"years={result['years']} in {result['seconds']:.1f}s")
+        return result
+
+    def read_chunks(self, sources):
+        for stream in self.open_sources(sources):
+            for chunk in pd.read_csv(stream, names=HistDataDbFill.col_names,
+                                     dtype={'DATE': str, 'TIME': str},
+                                     chunksize=self.chunk_size):
+                yield chunk
+
+    @staticmethod
+    def open_sources(sources):
+        for source in sources:
+            if not isinstance(source, str):
+                yield source
+            elif source.rsplit('.', 1)[-1].lower() == 'zip':
+                for stream in utils_file.open_zip_csv_members(source):
+                    yield stream
+            else:
+                with open(source, newline='') as stream:
+                    yield stream
+
+    @staticmethod
+    def get_sorted_columns(chunk):
+        dates = HistDataDbFill.get_datetimes(chunk['DATE'], chunk['TIME'])
+        invalid_dates = dates.isna()
+        if invalid_dates.any():
+            logger.error(f'{int(invalid_dates.sum())} rows skipped, date can\'t be parsed. '
+                         f'First row: date={chunk["DATE"][invalid_dates].iloc[0]}, '
+                         f'time={chunk["TIME"][invalid_dates].iloc[0]}')
+            chunk, dates = chunk[~invalid_dates], dates[~invalid_dates]
+        timestamps = dates.values.astype('datetime64[s]').astype(np.int64)
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        columns = {
+            'date': timestamps,
+            'open': chunk['OPEN'].values[order],
+            'high': chunk['HIGH'].values[order],
+            'low': chunk['LOW'].values[order],
+            'close': chunk['CLOSE'].values[order],
+            'volume': chunk['VOL'].values[order],
+        }
+        return timestamps, columns
@@ -73,6 +73,59 @@ class GroupFile:
                                'merged.csv already exists and this leads to endless loop'
                                'and disk overfill')
 
+    def get_zip_files_for_directory(self, dir):
+        return sorted(["{}/{}".format(dir, file)
+                       for file in utils_file.get_files_for_directory(dir)
+                       if file.rsplit('.', 1)[-1] == 'zip'])
+
+    def merge_all_zip_files(self):
+        """
+        Same result as unzip_all_files + merge_all_csv_files, but .csv files are read
+        straight from zip members so nothing is extracted to disk.
+        """
+        directories = utils_file.get_all_directories_of_directory(
+            self.path_target_csv_file, without_first=True
+        )
+        for nr, dir in enumerate(directories):
+            logging.info("|{}| merging zip files in dir: {}".format(nr+1, dir))
+            target_dir = "{}/{}".format(dir, "merged.csv")
+            if utils_file.is_file_exist(target_dir):
+                logger.warning('merged.csv already exists in directory: {}'.format(dir))
+                continue
+            streams = (
+                stream
+                for zip_file in self.get_zip_files_for_directory(dir)
+                for stream in utils_file.open_zip_csv_members(zip_file)
+            )
+            utils_csv.merge_streams_into_one(streams, target_dir)
+
+    def convert_all_zip_files_to_columnar(self, price_store=None):
+        """ creates price store files from zip members without extracting and merging them """
+        from database.data_preparators.histdata_columnar import HistDataColumnarConverter
+
+        converter = HistDataColumnarConverter(price_store)
+        directories = utils_file.get_all_directories_of_directory(
+            self.path_target_csv_file, without_first=True
+        )
+        for nr, dir in enumerate(directories):
+            pair = dir.rsplit('/', 1)[1]
+            logging.info("|{}| converting zip files of pair: {}".format(nr+1, pair))
+            converter.convert_pair(pair, self.get_zip_files_for_directory(dir))
+
+    def run_pipeline(self, extract=False, columnar=False):
+        """
+        :param extract: if True zip files are extracted to disk before merging (previous flow)
+        :param columnar: if True price store files are created too
+        """
+        if extract:
+            self.unzip_all_files()
+            self.validate_unziping()
+            self.merge_all_csv_files()
+        else:
+            self.merge_all_zip_files()
+        if columnar:
+            self.convert_all_zip_files_to_columnar()
+
     def check_if_not_merged_files(self):
         directories = utils_file.get_all_directories_of_directory(
             self.path_target_csv_file+'/', without_first=True
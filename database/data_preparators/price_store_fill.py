@@ -0,0 +1,47 @@
+import datetime
+import logging
+
+import numpy as np
+
+from app.backtest.price_store import PriceStore, datetime_to_timestamp
+from app.models.historic import HistoricRow
+from database import connect_to_db, DB_BACKTEST
+
+logger = logging.getLogger(__file__)
+
+
+class PriceStoreFill:
+    """ Exports HistoricRow documents into PriceStore files, one file per pair and year. """
+
+    def __init__(self, price_store=None):
+        connect_to_db(alias=DB_BACKTEST)
+        self.price_store = price_store or PriceStore()
+
+    def fill_pairs(self, pairs, year):
+        for pair in pairs:
+            self.fill_pair(pair, year)
+
+    def fill_pair(self, pair, year):
+        historic_rows = HistoricRow.objects.filter(
+            pair=pair,
+            date__gte=datetime.datetime(year, 1, 1),
+            date__lt=datetime.datetime(year + 1, 1, 1)
+        ).order_by('date').as_pymongo()
+
+        rows = list(historic_rows)
+        if not rows:
+            logger.warning(f'Any HistoricRow found for pair={pair} and year={year}')
+            return None
+
+        price_store_file = self.price_store.write(pair, year, {
+            'date': np.array([datetime_to_timestamp(row['date']) for row in rows], dtype=np.int64),
+            'open': np.array([row['open'] for row in rows], dtype=np.float64),
+            'high': np.array([row['high'] for row in rows], dtype=np.float64),
+            'low': np.array([row['low'] for row in rows], dtype=np.float64),
+            'close': np.array([row['close'] for row in rows], dtype=np.float64),
+            'volume': np.array([row['volume'] for row in rows], dtype=np.float32),
+        })
+        self.price_store.write_extremes_index(pair, year)
+        logger.info(f'Saved {len(price_store_file)} bars for pair={pair} and year={year} '
+                    f'to {price_store_file.path}')
+        return price_store_file
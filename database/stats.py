@@ -1,6 +1,15 @@
+import datetime
+import logging
+
+from app.backtest.position_close_detector import PositionCloseDetector
 from app.models.historic import HistoricRow
 from database import connect_to_db
 
+logger = logging.getLogger(__name__)
+
+STAGE_INDEX_SCAN = 'IXSCAN'
+STAGE_COLLECTION_SCAN = 'COLLSCAN'
+
 
 class DbStatistics:
 
@@ -18,3 +27,35 @@ class DbStatistics:
             if count(pair) > more_than
         }
         return dicttinct_pairs_count, len(dicttinct_pairs_count)
+
+    def check_historic_row_query_plan(self):
+        return check_historic_row_query_plan()
+
+
+def get_plan_stages(plan):
+    """ names of all stages of (nested) query plan from explain() """
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for key in ('inputStage', 'queryPlan'):
+            stages += get_plan_stages(plan.get(key))
+        for input_stage in plan.get('inputStages', []):
+            stages += get_plan_stages(input_stage)
+    return stages
+
+
+def check_historic_row_query_plan(pair='EURUSD', date_from=datetime.datetime(2018, 1, 1)):
+    """
+    Runs explain() on the same range query PositionCloseDetector uses and warns
+    if it is not served by index (e.g. fresh database without (pair, date) index).
+    """
+    query_filter, sort = PositionCloseDetector.get_price_window_query(pair, date_from)
+    explain = HistoricRow._get_collection().find(query_filter).sort(sort).explain()
+    stages = get_plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {}))
+
+    if STAGE_INDEX_SCAN not in stages:
+        logger.warning(f'HistoricRow price window query is not using index, winning plan stages: {stages}. '
+                       f'Run HistoricRow.ensure_indexes() to create (pair, date) index.')
+        return False
+    return True
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# app modules import each other both as `app.<module>` and as top-level `<module>` (e.g. models.choices)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'app')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,45 @@
+import datetime
+
+from bson import ObjectId
+
+from app.backtest.backtest import Backtest, BacktestConfig, BacktestMessagesFillerObjects
+from app.backtest.events import Event, EventCancel
+from app.models.positions import StopLoss, TakeProfit
+from app.models.transactions import Transaction
+
+DATE = datetime.datetime(2018, 3, 5)
+
+
+def get_backtest(wallet_initial_amount=1000):
+    backtest = Backtest(
+        messages_filler=BacktestMessagesFillerObjects([]),
+        config=BacktestConfig(amount_single_transaction=100, wallet_initial_amount=wallet_initial_amount,
+                              transactions_in_memory=True)
+    )
+    backtest.create_backtest_related_instances()
+    return backtest
+
+
+def test_wallet_opens_transaction_with_amount_of_backtest_config():
+    backtest = get_backtest()
+
+    assert backtest.wallet.on_transaction_open() == 100
+    assert backtest.wallet.get_state() == 900
+
+
+def test_event_cancel_removes_queued_events_of_open_take_profits():
+    backtest = get_backtest()
+    transaction = Transaction(id=ObjectId(), date_open=DATE)
+    transaction_id = str(transaction.id)
+    transaction.take_profits = [
+        TakeProfit(order_number=1, transaction_id=transaction_id, amount_invested=50, is_closed=True),
+        TakeProfit(order_number=2, transaction_id=transaction_id, amount_invested=50),
+    ]
+    transaction.stop_loss = StopLoss(transaction_id=transaction_id, amount_invested=100)
+    for event_id in (f'{transaction_id}_tp#2', f'{transaction_id}_sl'):
+        backtest.queue.add(Event(DATE + datetime.timedelta(days=1), event_id))
+
+    EventCancel(DATE, backtest, transaction).execute()
+
+    assert backtest.queue.get_length() == 0
+    assert backtest.wallet.get_state() == 1050
@@ -0,0 +1,157 @@
+import datetime
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.backtest.backtest import Backtest, BacktestConfig, BacktestMessagesFillerObjects
+from app.backtest.events import EventSignal
+from app.backtest.portfolio_simulator import PortfolioSimulator, cross_check_with_timeline, get_events_table
+from app.backtest.position_close_detector import PriceWindow, preloaded_prices
+from app.backtest.resolved_signals import signal_resolver
+from app.backtest.strategies import StrategyTakeProfit
+from app.models import choices
+from app.models.channels import Channel
+from app.models.decisions import DecisionSignal
+from app.models.messages import Message
+
+# signals of two pairs with hourly bars, GBPJPY bars have a gap longer than POSITION_DETECTOR_MAX_RETRIES
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'portfolio_simulator.json')
+CHANNEL_NAME = choices.ChannelNameChoices.GAFOREX
+PRICES_DATE_FROM = datetime.datetime(2018, 3, 1)
+PRICES_DATE_TO = datetime.datetime(2018, 4, 30)
+GENERATED_SIGNALS = 3000
+GENERATED_DAYS = 40
+SIMULATOR_MAX_SECONDS = 5
+
+
+def add_price_window(pair, bars):
+    price_window = PriceWindow.from_raw_rows(
+        {'date': datetime.datetime.fromisoformat(date), 'high': high, 'low': low} for date, high, low in bars
+    )
+    price_window.build_extremes_index()
+    preloaded_prices.add(pair, PRICES_DATE_FROM, PRICES_DATE_TO, price_window)
+
+
+@pytest.fixture
+def fixture_signals():
+    """ bars of fixture are preloaded, so signals are resolved without HistoricRow queries """
+    with open(FIXTURE_PATH) as f:
+        fixture = json.load(f)
+
+    for pair, bars in fixture['bars'].items():
+        add_price_window(pair, bars)
+    yield fixture['signals']
+    preloaded_prices.clear()
+    signal_resolver.clear()
+
+
+def get_backtest(signals, strategy_label, wallet_initial_amount):
+    backtest = Backtest(
+        messages_filler=BacktestMessagesFillerObjects([]),
+        config=BacktestConfig(
+            tag='fixture',
+            strategy=StrategyTakeProfit.mapping[strategy_label],
+            strategy_label=strategy_label,
+            amount_single_transaction=100,
+            wallet_initial_amount=wallet_initial_amount,
+            transactions_in_memory=True,
+        )
+    )
+    backtest.create_backtest_related_instances()
+    backtest.ledger.flush = lambda: None  # transactions of fixture runs are not saved to database
+
+    for signal in signals:
+        date = datetime.datetime.fromisoformat(signal['date'])
+        message = Message(
+            id_internal=signal['id_universal'], id_universal=signal['id_universal'],
+            channel=Channel(name=CHANNEL_NAME), date=date,
+            type=choices.MessageTypeChoices.SIGNAL, text=signal['id_universal']
+        )
+        signal_resolver.add(message, DecisionSignal(
+            date=date, pair=signal['pair'], type=signal['type'],
+            take_profits=signal['take_profits'], stop_loss=signal['stop_loss']
+        ))
+        backtest.queue.add(EventSignal(message, backtest, tag=backtest.config.tag))
+    return backtest
+
+
+@pytest.mark.parametrize('strategy_label', list(StrategyTakeProfit.mapping))
+@pytest.mark.parametrize('wallet_initial_amount', [10000, 250])
+def test_simulator_same_as_timeline(fixture_signals, strategy_label, wallet_initial_amount):
+    backtest = get_backtest(fixture_signals, strategy_label, wallet_initial_amount)
+
+    assert cross_check_with_timeline(backtest) == []
+
+
+def test_fixture_covers_all_outcomes(fixture_signals):
+    backtest = get_backtest(fixture_signals, StrategyTakeProfit.PRESET_GREEDY_LOW_LABEL, 250)
+
+    assert cross_check_with_timeline(backtest) == []
+    statistics = backtest.statistics
+    assert statistics.closed_by_type__ratio[choices.TransactionClosedByChoices.TAKE_PROFIT]
+    assert statistics.closed_by_type__ratio[choices.TransactionClosedByChoices.STOP_LOSS]
+    assert statistics.transaction_initial_pair_not_found
+    assert statistics.transaction_any_position_realisation_date_not_found
+    assert any(transaction.status == choices.TransactionStatusChoices.INSUFFICIENT_FUNDS
+               for transaction in backtest.ledger.transactions.values())
+
+
+@pytest.fixture
+def generated_signals():
+    """
+    Thousands of signals on hourly random walk bars, most of them never close,
+    so a small wallet rejects many of them for insufficient funds.
+    """
+    random = np.random.default_rng(18)
+    dates = [PRICES_DATE_FROM + datetime.timedelta(hours=hour) for hour in range(GENERATED_DAYS * 24)]
+    closes = 1.2 + np.cumsum(random.normal(0, 0.001, len(dates)))
+    spreads = np.abs(random.normal(0, 0.001, len(dates)))
+    add_price_window('EURUSD', [
+        [date.isoformat(), round(close + spread, 5), round(close - spread, 5)]
+        for date, close, spread in zip(dates, closes, spreads)
+    ])
+
+    signals = []
+    for nr, hour in enumerate(np.sort(random.integers(0, (GENERATED_DAYS - 10) * 24, GENERATED_SIGNALS))):
+        sign = random.choice([1, -1])
+        distances = np.cumsum(random.uniform(0.001, 0.01, random.integers(1, 5)))
+        signals.append({
+            'id_universal': f'generated_{nr}',
+            'date': (dates[hour] + datetime.timedelta(minutes=int(random.integers(0, 60)))).isoformat(),
+            'pair': 'EURUSD',
+            'type': 'long' if sign == 1 else 'short',
+            'take_profits': [{'order_number': number, 'price': round(closes[hour] + sign * distance, 5),
+                              'is_last': number == len(distances)}
+                             for number, distance in enumerate(distances, 1)],
+            'stop_loss': {'price': round(closes[hour] - sign * random.uniform(0.001, 0.02), 5)},
+        })
+    yield signals
+    preloaded_prices.clear()
+    signal_resolver.clear()
+
+
+def test_simulator_same_as_timeline_with_starved_wallet(generated_signals):
+    backtest = get_backtest(generated_signals, StrategyTakeProfit.PRESET_GREEDY_MEDIUM_LABEL, 2000)
+
+    assert cross_check_with_timeline(backtest) == []
+    insufficient_funds = [transaction for transaction in backtest.ledger.transactions.values()
+                          if transaction.status == choices.TransactionStatusChoices.INSUFFICIENT_FUNDS]
+    assert len(insufficient_funds) > len(generated_signals) // 2
+
+
+def test_simulator_presets_with_starved_wallet_time(generated_signals):
+    backtest = get_backtest(generated_signals, StrategyTakeProfit.PRESET_GREEDY_MEDIUM_LABEL, 2000)
+    simulator = PortfolioSimulator(
+        get_events_table([signal_resolver.get(event.message) for event in backtest.get_signals_events()]),
+        amount_single_transaction=100, wallet_initial_amount=2000
+    )
+
+    time_start = time.perf_counter()
+    summary, results = simulator.simulate_presets()
+    seconds = time.perf_counter() - time_start
+
+    assert all(result['transaction_insufficient_funds'] for result in results.values())
+    assert seconds < SIMULATOR_MAX_SECONDS
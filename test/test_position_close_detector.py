@@ -0,0 +1,26 @@
+import datetime
+
+from app.backtest import config
+from app.backtest.position_close_detector import PositionCloseDetector, PriceWindow, PriceWindowCache
+
+DATE = datetime.datetime(2018, 3, 5)
+
+
+def test_version_changes_with_initial_price_max_retries(monkeypatch):
+    version = PositionCloseDetector.get_version()
+
+    monkeypatch.setattr(config, 'POSITION_DETECTOR_MAX_RETRIES', config.POSITION_DETECTOR_MAX_RETRIES + 1)
+
+    assert PositionCloseDetector.get_version() != version
+
+
+def test_price_window_cache_clear_resets_stats():
+    cache = PriceWindowCache(max_bytes=1024)
+    price_window = PriceWindow.from_raw_rows([{'date': DATE, 'high': 1.2, 'low': 1.1}])
+    cache.add('EURUSD', DATE, DATE, price_window)
+    cache.get('EURUSD', DATE, DATE)
+    cache.get('GBPUSD', DATE, DATE)
+
+    cache.clear()
+
+    assert cache.get_stats() == {'hits': 0, 'misses': 0, 'windows': 0, 'size_bytes': 0}
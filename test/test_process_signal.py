@@ -0,0 +1,42 @@
+import re
+
+import pytest
+
+from app.models import choices
+from app.models.channels import Channel
+from app.models.messages import Message
+from app.processing.process_signal import MAPPING_PROCESS_SIGNAL
+
+# pattern the processors used for "sell/buy now" price before patterns were shared
+BASELINE_PRICE_WITH_DOT = re.compile(r'(\d*\.?\d+){2}')
+
+CHANNELS_WITH_INITIAL_PRICE = [
+    choices.ChannelNameChoices.EUPHORIA_TRADING,
+    choices.ChannelNameChoices.PIPSMEUP,
+    choices.ChannelNameChoices.FX_SCORPIONS,
+]
+
+
+def get_message(channel_name, text):
+    return Message(id_internal='1', channel=Channel(name=channel_name), text=text)
+
+
+@pytest.mark.parametrize('channel_name', CHANNELS_WITH_INITIAL_PRICE)
+@pytest.mark.parametrize('sell_now_line', [
+    'Sell now .3750 GBPUSD',
+    'Buy now @ .7420 AUDUSD',
+    'Sell now 1.3750 GBPUSD',
+    'Buy now 1790 XAUUSD',
+])
+def test_initial_price_same_as_baseline(channel_name, sell_now_line):
+    message = get_message(channel_name, f'{sell_now_line}\nTP 1.3720\nSL 1.3790')
+
+    initial_price = MAPPING_PROCESS_SIGNAL[channel_name].get_initial_price(message)
+
+    assert initial_price == float(BASELINE_PRICE_WITH_DOT.search(sell_now_line)[0])
+
+
+def test_initial_price_with_leading_dot():
+    message = get_message(choices.ChannelNameChoices.FX_SCORPIONS, 'Sell now .3750 GBPUSD\nTP .3720\nSL .3790')
+
+    assert MAPPING_PROCESS_SIGNAL[choices.ChannelNameChoices.FX_SCORPIONS].get_initial_price(message) == 0.375
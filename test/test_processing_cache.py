@@ -0,0 +1,64 @@
+import pytest
+from pymongo.errors import AutoReconnect
+
+from app.backtest import config
+from app.exceptions.process import DecisionSignalStopLossNotFound
+from app.models import choices
+from app.models.cache import ProcessingCacheEntry
+from app.models.decisions import DecisionSignal
+from app.models.messages import Message
+from app.processing.cache import ProcessCache
+
+
+class ProcessorRaising:
+    """ raises given errors on following calls of get_decision, then returns decision """
+    name = choices.ChannelNameChoices.GAFOREX
+    version = 1
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def get_decision(self, message):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return DecisionSignal(pair='EURUSD')
+
+
+@pytest.fixture
+def process_cache(monkeypatch):
+    """ cache entries are kept only in memory of cache """
+    monkeypatch.setattr(config, 'PROCESSING_CACHE_ENABLED', True)
+    monkeypatch.setattr(ProcessingCacheEntry, 'save', lambda self, *args, **kwargs: self)
+    cache = ProcessCache()
+    monkeypatch.setattr(cache, 'get', cache.entries.get)
+    return cache
+
+
+def get_message():
+    return Message(id_internal='1', text='EURUSD SELL 1.1850\nTP 1.1820\nSL 1.1900')
+
+
+def test_transient_error_is_not_cached(process_cache):
+    processor = ProcessorRaising(AutoReconnect('connection lost'))
+    message = get_message()
+
+    with pytest.raises(AutoReconnect):
+        process_cache.get_decision(processor, message)
+    assert not process_cache.entries
+
+    decision = process_cache.get_decision(processor, message)
+    assert decision.pair == 'EURUSD'
+    assert process_cache.get_decision(processor, message) is decision
+    assert processor.calls == 2
+
+
+def test_processing_error_is_cached(process_cache):
+    processor = ProcessorRaising(DecisionSignalStopLossNotFound('1', 'text'))
+    message = get_message()
+
+    for _ in range(2):
+        with pytest.raises(DecisionSignalStopLossNotFound):
+            process_cache.get_decision(processor, message)
+    assert processor.calls == 1
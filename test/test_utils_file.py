@@ -0,0 +1,43 @@
+import zipfile
+
+import pytest
+
+from app.utils import utils_csv, utils_file
+
+CSV_MEMBERS = {
+    'DAT_MT_EURUSD_M1_202001.csv': '2020.01.01,17:00,1.12,1.121,1.119,1.1205,0\r\n'
+                                   '2020.01.01,17:01,1.1205,1.121,1.12,1.1208,0\r\n',
+    'DAT_MT_EURUSD_M1_202002.csv': '2020.02.02,17:00,1.11,1.111,1.109,1.1105,0\n'
+                                   '2020.02.02,17:01,1.1105,1.111,1.11,1.1101,0\n',
+}
+
+
+@pytest.fixture
+def zip_files(tmp_path):
+    paths = []
+    for nr, (name, content) in enumerate(sorted(CSV_MEMBERS.items())):
+        path = tmp_path / f'HISTDATA_COM_MT_EURUSD_M1{nr}.zip'
+        with zipfile.ZipFile(path, 'w') as zip_ref:
+            zip_ref.writestr(name, content.encode('utf-8'))
+            zip_ref.writestr(f'{name[:-4]}.txt', 'histdata status file')
+        paths.append(str(path))
+    return paths
+
+
+def test_merged_zip_members_same_as_extracted_and_merged(tmp_path, zip_files):
+    extracted_dir = tmp_path / 'extracted'
+    extracted_dir.mkdir()
+    for zip_file in zip_files:
+        utils_file.unzipfile(zip_file, str(extracted_dir))
+    extracted_merged = tmp_path / 'extracted_merged.csv'
+    utils_csv.merge_files_into_one(
+        sorted(str(path) for path in extracted_dir.iterdir() if path.suffix == '.csv'), str(extracted_merged)
+    )
+
+    zip_merged = tmp_path / 'zip_merged.csv'
+    utils_csv.merge_streams_into_one(
+        (stream for zip_file in zip_files for stream in utils_file.open_zip_csv_members(zip_file)),
+        str(zip_merged)
+    )
+
+    assert zip_merged.read_bytes() == extracted_merged.read_bytes()